@@ -0,0 +1,28 @@
+"""
+Benchmarks of the model engines of the steps.
+
+Each engine is the hot model module of a step, run in its own interpreter
+(they share the module names, and the older steps are Python 2 only):
+
+    python -m bench run [--count N] [--engines step05,step07] [--out FILE]
+    python -m bench compare BASE.json NEW.json [--threshold 0.1]
+    python -m bench importtime [--budget-ms 50]
+
+See bench.workloads for the workloads, bench.importtime for the import time
+check.
+"""
+import os
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name: (the directory, True if it runs on Python 2 only)
+ENGINES = {
+    "step01": ("step01", True),
+    "step04": ("step04", True),
+    "step05": ("step05", True),
+    "step07": ("step07", False),
+    "examples": ("examples", False),
+}
+
+ENGINE_ORDER = ["step01", "step04", "step05", "step07", "examples"]
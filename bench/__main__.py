@@ -0,0 +1,187 @@
+"""
+    python -m bench run [--count N] [--repeat N] [--engines a,b] [--out FILE]
+                        [--python PATH] [--python2 PATH]
+    python -m bench compare BASE.json NEW.json [--threshold 0.1]
+    python -m bench importtime [--budget-ms 50] [--engines a,b] [--repeat N]
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+
+from bench import ENGINES, ENGINE_ORDER, ROOT
+from bench import importtime
+
+
+def machine_metadata():
+    """
+        Returns the description of the machine and of the checkout.
+    """
+    metadata = {
+        "date": datetime.datetime.utcnow().isoformat(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": multiprocessing.cpu_count(),
+        "node": platform.node(),
+    }
+    try:
+        metadata["commit"] = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT,
+        ).decode("ascii").strip()
+    except (OSError, subprocess.CalledProcessError):
+        metadata["commit"] = None
+    return metadata
+
+
+def run_engine(engine, python, count, repeat):
+    """
+        Runs the workloads of the engine in a new interpreter, returns its
+        result dict, or {"skipped": reason}.
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.path.join(ROOT, ENGINES[engine][0])
+    try:
+        output = subprocess.check_output(
+            [
+                python, "-m", "bench.workloads",
+                engine, str(count), str(repeat),
+            ],
+            cwd=ROOT, env=env,
+        )
+    except OSError as e:
+        return {"skipped": "cannot run %s: %s" % (python, e)}
+    except subprocess.CalledProcessError as e:
+        return {"skipped": "failed with the exit code %s" % e.returncode}
+    return json.loads(output.decode("utf-8"))
+
+
+def run(args):
+    engines = args.engines.split(",") if args.engines else ENGINE_ORDER
+    unknown = [i for i in engines if i not in ENGINES]
+    if unknown:
+        sys.stderr.write("unknown engines: %s\n" % ", ".join(unknown))
+        return 2
+    report = {
+        "metadata": machine_metadata(),
+        "count": args.count,
+        "repeat": args.repeat,
+        "engines": {},
+    }
+    for engine in engines:
+        python = args.python2 if ENGINES[engine][1] else args.python
+        result = report["engines"][engine] = run_engine(
+            engine, python, args.count, args.repeat,
+        )
+        if "skipped" in result:
+            print("%-10s skipped: %s" % (engine, result["skipped"]))
+            continue
+        for (workload, rate) in sorted(result["results"].items()):
+            print("%-10s %-12s %12.0f ops/s" % (engine, workload, rate))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    return 0
+
+
+def compare(base, new, threshold):
+    """
+        Returns [(engine, workload, base rate, new rate, is regression)] for
+        the results in both reports. A regression is a rate lower than the
+        base by more than the threshold (a fraction).
+    """
+    rows = []
+    for engine in ENGINE_ORDER:
+        base_results = base["engines"].get(engine, {}).get("results", {})
+        new_results = new["engines"].get(engine, {}).get("results", {})
+        for workload in sorted(set(base_results) & set(new_results)):
+            (old_rate, new_rate) = (
+                base_results[workload], new_results[workload],
+            )
+            rows.append((
+                engine, workload, old_rate, new_rate,
+                new_rate < old_rate * (1.0 - threshold),
+            ))
+    return rows
+
+
+def compare_command(args):
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    rows = compare(base, new, args.threshold)
+    for (engine, workload, old_rate, new_rate, regression) in rows:
+        print("%-10s %-12s %12.0f %12.0f %+7.1f%%%s" % (
+            engine, workload, old_rate, new_rate,
+            (new_rate / old_rate - 1.0) * 100.0 if old_rate else 0.0,
+            "  REGRESSION" if regression else "",
+        ))
+    return 1 if any(i[4] for i in rows) else 0
+
+
+def importtime_command(args):
+    engines = (
+        args.engines.split(",") if args.engines
+        else sorted(importtime.MODULES)
+    )
+    rows = importtime.check(
+        engines, args.python, args.repeat, args.budget_ms * 1000,
+    )
+    for (engine, module, us, problems) in rows:
+        print("%-10s %-12s %8.1f ms  %s" % (
+            engine, module, us / 1000.0, ", ".join(problems),
+        ))
+    return 1 if any(i[3] for i in rows) else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench")
+    commands = parser.add_subparsers(dest="command")
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--count", type=int, default=100000)
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--engines",
+                            help="comma separated, all by default: %s"
+                            % ",".join(ENGINE_ORDER))
+    run_parser.add_argument("--out", metavar="FILE",
+                            help="write the results as JSON to the file")
+    run_parser.add_argument("--python", default=sys.executable,
+                            help="the interpreter of step07 and examples")
+    run_parser.add_argument("--python2", default="python2",
+                            help="the interpreter of the older steps")
+    compare_parser = commands.add_parser(
+        "compare", help="compare two results, fail on a regression",
+    )
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="the allowed slow-down, 0.1 is 10%%")
+    importtime_parser = commands.add_parser(
+        "importtime", help="check the import time of the model modules",
+    )
+    importtime_parser.add_argument("--budget-ms", type=float, default=50.0,
+                                   help="the allowed cumulative import time")
+    importtime_parser.add_argument("--engines",
+                                   help="comma separated, all by default: %s"
+                                   % ",".join(sorted(importtime.MODULES)))
+    importtime_parser.add_argument("--repeat", type=int, default=5)
+    importtime_parser.add_argument("--python", default=sys.executable,
+                                   help="Python 3.7 or newer")
+    args = parser.parse_args(argv)
+    if "compare" == args.command:
+        return compare_command(args)
+    if "importtime" == args.command:
+        return importtime_command(args)
+    if "run" == args.command:
+        return run(args)
+    parser.print_help()
+    return 2
+
+
+if "__main__" == __name__:
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+The import time of the modules of an engine, by python -X importtime
+(Python 3.7+):
+
+    python -m bench importtime [--budget-ms 50] [--engines step07,examples]
+
+Each module is imported in a new interpreter, the best cumulative time of
+the repeats is reported (after a first import writing the bytecode). A
+module over the budget, or importing a forbidden module (the GUI toolkit),
+fails the check.
+"""
+import os
+import subprocess
+
+from bench import ENGINES, ROOT
+
+
+MODULES = {
+    "step07": ["hotmodel", "hotwidgets"],
+    "examples": ["hotmodel", "hotwidgets"],
+}
+
+FORBIDDEN = ("wx", )
+
+
+def parse(stderr):
+    """
+        Returns {module: cumulative microseconds} of the -X importtime
+        output.
+    """
+    ret = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            cumulative = int(fields[1])
+        except ValueError:
+            # the header
+            continue
+        ret[fields[2].strip()] = cumulative
+    return ret
+
+
+def measure(engine, module, python, repeat):
+    """
+        Returns (the best cumulative microseconds, the imported modules) of
+        importing the module of the engine.
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.path.join(ROOT, ENGINES[engine][0])
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    best = None
+    imported = {}
+    # the first import writes the bytecode
+    for attempt in range(repeat + 1):
+        process = subprocess.Popen(
+            [python, "-X", "importtime", "-c", "import %s" % module],
+            cwd=ROOT, env=env,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        )
+        stderr = process.communicate()[1].decode("utf-8", "replace")
+        if process.returncode:
+            raise RuntimeError(stderr)
+        imported = parse(stderr)
+        if attempt and (best is None or imported[module] < best):
+            best = imported[module]
+    return (best, sorted(imported))
+
+
+def check(engines, python, repeat, budget_us):
+    """
+        Returns [(engine, module, microseconds, [the problems])].
+    """
+    ret = []
+    for engine in engines:
+        for module in MODULES.get(engine, ()):
+            (us, imported) = measure(engine, module, python, repeat)
+            problems = []
+            if us > budget_us:
+                problems.append("over the budget")
+            for name in FORBIDDEN:
+                if name in imported:
+                    problems.append("imports %s" % name)
+            ret.append((engine, module, us, problems))
+    return ret
@@ -0,0 +1,259 @@
+"""
+The workloads, run against one engine (whose directory is on sys.path):
+
+    python -m bench.workloads ENGINE COUNT REPEAT
+
+Prints {"python": ..., "results": {workload: operations per second}} as
+JSON. Each workload is a function of the count returning the callable to
+time, which makes count operations; the setup is not timed. The workloads
+an engine does not support are left out.
+
+    construct       creating a model with two hot properties
+    assign          assigning a hot property (one listener)
+    list_append     appending to a hot list (one listener)
+    list_extend     extending a hot list by 100 items at a time
+    list_update     assigning to an index of a hot list
+    dict_churn      inserting and deleting keys of a hot dict
+    mapper          dispatching through a Mapper with ROUTES other routes
+    fan_out         assigning a hot property with FAN_OUT listeners
+"""
+import json
+import logging
+import platform
+import sys
+import time
+
+
+ROUTES = 100
+FAN_OUT = 10
+
+_clock = getattr(time, "perf_counter", time.time)
+
+
+def noop(*args):
+    pass
+
+
+def _quiet(module):
+    module.LOGGER.setLevel(logging.WARNING)
+
+
+def _list_workloads(make_list):
+    """
+        The list workloads of an engine; make_list(items) returns a hot
+        list with a listener.
+    """
+    def list_append(count):
+        lst = make_list([])
+        return lambda: [lst.append(i) for i in range(count)]
+
+    def list_extend(count):
+        lst = make_list([])
+        chunk = list(range(100))
+        return lambda: [lst.extend(chunk) for i in range(count // 100)]
+
+    def list_update(count):
+        lst = make_list(list(range(count)))
+
+        def run():
+            for i in range(count):
+                lst[i] = -i
+        return run
+    return {
+        "list_append": list_append,
+        "list_extend": list_extend,
+        "list_update": list_update,
+    }
+
+
+def _assign_workloads(make_object, add_listener):
+    """
+        The property workloads of an engine; make_object() returns a model
+        with the int property a.
+    """
+    def construct(count):
+        return lambda: [make_object() for i in range(count)]
+
+    def assign(count):
+        obj = make_object()
+        add_listener(obj, noop)
+
+        def run():
+            for i in range(1, count + 1):
+                obj.a = i
+        return run
+
+    def fan_out(count):
+        obj = make_object()
+        for i in range(FAN_OUT):
+            add_listener(obj, noop)
+
+        def run():
+            for i in range(1, count + 1):
+                obj.a = i
+        return run
+    return {"construct": construct, "assign": assign, "fan_out": fan_out}
+
+
+def _mapper_workload(make_object, hotmodel, route):
+    """
+        make_object() returns a model with the int property a, whose change
+        is dispatched by route (fqname, event_name).
+    """
+    def mapper(count):
+        obj = make_object()
+        mapper = hotmodel.Mapper()
+        for i in range(ROUTES):
+            mapper.add_route("other%d" % i, "", noop)
+        mapper.add_route(route[0], route[1], noop)
+        obj.add_listener(mapper)
+
+        def run():
+            for i in range(1, count + 1):
+                obj.a = i
+        return run
+    return {"mapper": mapper}
+
+
+def step01():
+    import hotlist
+    _quiet(hotlist)
+
+    def make_list(items):
+        lst = hotlist.HotList(items)
+        lst.add_listener(noop)
+        return lst
+    workloads = _list_workloads(make_list)
+    # step01 has no extend
+    del workloads["list_extend"]
+    workloads["construct"] = lambda count: lambda: [
+        hotlist.HotList() for i in range(count)
+    ]
+
+    def fan_out(count):
+        lst = make_list([])
+        for i in range(FAN_OUT - 1):
+            lst.add_listener(noop)
+        return lambda: [lst.append(i) for i in range(count)]
+    workloads["fan_out"] = fan_out
+    return workloads
+
+
+def step04():
+    import hotmodel
+    _quiet(hotmodel)
+
+    class Model(hotmodel.HotObject):
+        def __init__(self):
+            super(Model, self).__init__()
+            self.make_hot_property("a", int, False, 0)
+            self.make_hot_property("b", str, True, None)
+
+    def make_list(items):
+        lst = hotmodel.HotList(items)
+        lst.add_listener(noop)
+        return lst
+    workloads = _list_workloads(make_list)
+    workloads.update(_assign_workloads(Model, lambda o, l: o.add_listener(l)))
+    return workloads
+
+
+def step05():
+    import hotmodel
+    _quiet(hotmodel)
+
+    class Model(hotmodel.HotObject):
+        a = hotmodel.HotField(int, False, 0)
+        b = hotmodel.HotField(str, True, None)
+
+        def __init__(self):
+            super(Model, self).__init__("", None)
+
+    def make_list(items):
+        lst = hotmodel.HotList(items)
+        lst.add_listener(noop)
+        return lst
+    workloads = _list_workloads(make_list)
+    workloads.update(_assign_workloads(Model, lambda o, l: o.add_listener(l)))
+    workloads.update(_mapper_workload(Model, hotmodel, ("/", "update")))
+    return workloads
+
+
+def descriptors():
+    """
+        The engine of step07 and examples.
+    """
+    import hotmodel
+    _quiet(hotmodel)
+
+    class Model(hotmodel.HotContainer):
+        a = hotmodel.HotProperty()
+        b = hotmodel.HotProperty()
+        lst = hotmodel.HotTypedProperty(hotmodel.HotList)
+        dct = hotmodel.HotTypedProperty(hotmodel.HotDict)
+
+        def __init__(self):
+            super(Model, self).__init__()
+            self.a = 0
+
+    def make_list(items):
+        model = Model()
+        model.lst = items
+        model.add_listener(noop)
+        return model.lst
+
+    def dict_churn(count):
+        model = Model()
+        model.dct = []
+        model.add_listener(noop)
+        dct = model.dct
+
+        def run():
+            for i in range(count // 2):
+                dct[i] = i
+                del dct[i]
+        return run
+    workloads = _list_workloads(make_list)
+    workloads.update(_assign_workloads(Model, lambda o, l: o.add_listener(l)))
+    workloads.update(_mapper_workload(Model, hotmodel, ("a", "reset")))
+    workloads["dict_churn"] = dict_churn
+    return workloads
+
+
+ENGINE_WORKLOADS = {
+    "step01": step01,
+    "step04": step04,
+    "step05": step05,
+    "step07": descriptors,
+    "examples": descriptors,
+}
+
+
+def run(engine, count, repeat):
+    """
+        Returns {workload: the best operations per second of the repeats}.
+    """
+    results = {}
+    for (name, workload) in sorted(ENGINE_WORKLOADS[engine]().items()):
+        best = None
+        for dummy in range(repeat):
+            func = workload(count)
+            started = _clock()
+            func()
+            elapsed = _clock() - started
+            if best is None or elapsed < best:
+                best = elapsed
+        results[name] = count / best if best else 0.0
+    return results
+
+
+if "__main__" == __name__:
+    (ENGINE, COUNT, REPEAT) = (sys.argv[1], int(sys.argv[2]), int(sys.argv[3]))
+    json.dump(
+        {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "results": run(ENGINE, COUNT, REPEAT),
+        },
+        sys.stdout,
+    )
@@ -6,14 +6,22 @@ import logging
 
 
 LOGGER = logging.getLogger("hotmodel")
-LOGGER.setLevel(logging.DEBUG)
-ch = logging.StreamHandler()
-ch.setLevel(logging.DEBUG)
-# create formatter and add it to the handlers
-formatter = logging.Formatter('[%(name)s]%(levelname)s: %(message)s')
-ch.setFormatter(formatter)
-# add the handlers to the logger
-LOGGER.addHandler(ch)
+
+
+def log_to_stderr(level=logging.DEBUG):
+    """
+        Logs the messages of this module to stderr (the events fired on the
+        DEBUG level). Importing the module configures no logging.
+    """
+    handler = logging.StreamHandler()
+    handler.setLevel(level)
+    handler.setFormatter(
+        logging.Formatter('[%(name)s]%(levelname)s: %(message)s'),
+    )
+    LOGGER.setLevel(level)
+    LOGGER.addHandler(handler)
+    return handler
+
 
 IMMUTABLE_TYPES = set([
     int, float, str,
@@ -27,6 +35,12 @@ try:
 except:
     pass
 
+# type: comparator(old, new) returning True when assigning new over old (of
+# the same type) is no change. The other immutable types are compared by ==.
+COMPARATORS = {}
+
+# The value of a hot property never assigned.
+_UNSET = object()
 
 
 def add_immutable_type(type_name):
@@ -37,6 +51,35 @@ def add_immutable_type(type_name):
     IMMUTABLE_TYPES.add(type_name)
 
 
+def set_comparator(type_name, comparator):
+    """
+        Sets the comparator(old, new) of the values of the type, which
+        returns True if assigning new over old is no change (and fires no
+        event), e.g. to compare floats with a tolerance. None restores ==.
+    """
+    if comparator is None:
+        COMPARATORS.pop(type_name, None)
+    else:
+        COMPARATORS[type_name] = comparator
+
+
+def is_unchanged(old, new):
+    """
+        Returns True if assigning new to a hot property holding old is no
+        change: the same object, or an equal immutable value of the same
+        type (by its comparator, see set_comparator).
+    """
+    if old is new:
+        return True
+    tp = type(new)
+    if type(old) is not tp:
+        return False
+    comparator = COMPARATORS.get(tp)
+    if comparator is not None:
+        return comparator(old, new)
+    return tp in IMMUTABLE_TYPES and old == new
+
+
 class HotContainer(object):
     """
         HotContainer can maintain listerners and fire events.
@@ -48,6 +91,10 @@ class HotContainer(object):
         These properties can be assigned only immutable values and whenever
         the property is assigned into, an event is fired.
     """
+    # The fqnames of the events fired since the last take_dirty(), None
+    # unless tracked.
+    _dirty = None
+
     def __init__(self):
         self._listeners = []
 
@@ -62,6 +109,25 @@ class HotContainer(object):
     def listeners(self):
         return self._listeners
 
+    def track_dirty(self, enabled=True):
+        """
+            Starts (or stops) collecting the fqnames of the events fired, see
+            take_dirty.
+        """
+        self._dirty = set() if enabled else None
+
+    def take_dirty(self):
+        """
+            Returns the set of the fqnames of the events fired since the last
+            call (or since track_dirty), and starts a new one. A view can
+            pull the changes once per frame instead of listening.
+        """
+        dirty = self._dirty
+        if dirty is None:
+            raise ValueError("Dirty tracking is not enabled.")
+        self._dirty = set()
+        return dirty
+
     def _fire(self, model, fqname, event_name, key):
         """
             Fire an event.
@@ -70,6 +136,8 @@ class HotContainer(object):
             "FIRE: from=%s event=%s key=%s",
             fqname, event_name, key,
         )
+        if self._dirty is not None:
+            self._dirty.add(fqname)
         for listener in self.listeners:
             try:
                 listener(model, fqname, event_name, key)
@@ -125,7 +193,10 @@ class HotProperty(object):
         """
             Checks that the new value for the property is immutable.
             Checks that we are called on an object, not a class.
+            Assigning the current value (see is_unchanged) fires no event.
         """
+        if is_unchanged(getattr(obj, self.key, _UNSET), val):
+            return
         if val is None:
             pass
         elif type(val) in IMMUTABLE_TYPES:
@@ -3,19 +3,53 @@ Widgets handling events from hotmodel objects.
 """
 import logging
 
-import wx
-
 LOGGER = logging.getLogger("hotwidgets")
-LOGGER.setLevel(logging.DEBUG)
-ch = logging.StreamHandler()
-ch.setLevel(logging.DEBUG)
-# create formatter and add it to the handlers
-formatter = logging.Formatter('[%(name)s]%(levelname)s: %(message)s')
-ch.setFormatter(formatter)
-# add the handlers to the logger
-LOGGER.addHandler(ch)
-
-class MVCList(wx.ListView):
+
+
+# imported by the first widget created, see LazyWidget
+wx = None
+
+
+def import_toolkit():
+    """
+        Returns the wx module, importing it on the first call.
+    """
+    global wx
+    if wx is None:
+        import wx as toolkit
+        wx = toolkit
+    return wx
+
+
+class LazyWidget(object):
+    """
+        The base of the widgets, so that importing this module does not
+        import wx: a widget class derives from its wx base class (named by
+        wx_base) only when first instantiated, by creating (once) a subclass
+        of both, whose instance is returned. The instances are wx windows,
+        but issubclass(MVCList, wx.ListView) is False.
+    """
+    wx_base = "ListView"
+
+    def __new__(cls, *args, **kwargs):
+        try:
+            wx_class = cls.__dict__["_wx_class"]
+        except KeyError:
+            wx_class = cls._wx_class = type(
+                cls.__name__,
+                (cls, getattr(import_toolkit(), cls.wx_base)),
+                {
+                    "_wx_class": None,
+                    "__doc__": cls.__doc__,
+                    "__module__": cls.__module__,
+                },
+            )
+        if wx_class is None:
+            wx_class = cls
+        return super(LazyWidget, wx_class).__new__(wx_class)
+
+
+class MVCList(LazyWidget):
     """
         A list that takes a list of column names as a parameter. The value
         updates are not set directly, instead the view responds to event
@@ -127,7 +161,7 @@ class MVCPlainList(MVCList):
         self.SetStringItem(index, 0, str(data))
 
 
-class MVCDict(wx.ListView):
+class MVCDict(LazyWidget):
     """
         A table view that shows content of an underlying HotDict. The value
         updates are not set directly, instead the view responds to event
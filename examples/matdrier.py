@@ -252,6 +252,7 @@ class MatDrierView(wx.Dialog):
 
 
 if "__main__" == __name__:
+    hotmodel.log_to_stderr()
     MODEL = Model()
     APP = wx.App(redirect=False)
     FRAME = MatDrierView(None, APP, "Material Drier", MODEL)
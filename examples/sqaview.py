@@ -242,6 +242,7 @@ class DBView(wx.Frame):
         self.row_view.handle_reset(model, fqname, event_name, key)
 
 if "__main__" == __name__:
+    hotmodel.log_to_stderr()
     URI = None
 
     if len(sys.argv) > 1:
@@ -0,0 +1,60 @@
+"""
+    Measures the construction and assignment throughput of HotObjects
+    declared by HotField class attributes and by make_hot_property.
+
+    Usage: python bench_hotobject.py [count]
+"""
+import logging
+import sys
+import time
+
+import hotmodel
+
+
+class Declared(hotmodel.HotObject):
+    " Hot properties declared on the class. "
+    a = hotmodel.HotField(int, False, 0)
+    b = hotmodel.HotField(str, True, None)
+
+    def __init__(self):
+        super(Declared, self).__init__("", None)
+
+
+class Registered(hotmodel.HotObject):
+    " Hot properties registered in __init__. "
+    def __init__(self):
+        super(Registered, self).__init__("", None)
+        self.make_hot_property("a", int, False, 0)
+        self.make_hot_property("b", str, True, None)
+
+
+def measure(label, func, count):
+    """
+        Runs func and prints the number of operations per second.
+    """
+    start = time.time()
+    result = func()
+    elapsed = time.time() - start
+    print "%-32s %10.0f ops/s" % (label, count / elapsed)
+    return result
+
+
+def run(clazz, count):
+    objs = measure(
+        "%s construction" % clazz.__name__,
+        lambda: [clazz() for dummy in xrange(count)],
+        count,
+    )
+
+    def assign():
+        for obj in objs:
+            obj.a += 1
+    measure("%s assignment" % clazz.__name__, assign, count)
+    measure("%s reassignment" % clazz.__name__, assign, count)
+
+
+if "__main__" == __name__:
+    COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    hotmodel.LOGGER.setLevel(logging.WARNING)
+    run(Declared, COUNT)
+    run(Registered, COUNT)
@@ -6,42 +6,30 @@ import hotmodel
 
 class SecondMember(hotmodel.HotObject):
     " A data type with 2 primitive members. "
+    second1 = hotmodel.HotField(str)
+    second2 = hotmodel.HotField(str)
+
     def __init__(self, data=None, name=None, parent=None):
         super(SecondMember, self).__init__(name, parent)
-        self.make_hot_property("second1", str, True, None)
-        self.make_hot_property("second2", str, True, None)
         self.data = data
 
 class FirstMember(hotmodel.HotObject):
     " A data type with a primitive member and a sub-container. "
+    first1 = hotmodel.HotField(str)
+    first2 = hotmodel.HotField(SecondMember, False)
+
     def __init__(self, data=None, name=None, parent=None):
         super(FirstMember, self).__init__(name, parent)
-        self.make_hot_property("first1", str, True, None)
-        self.make_hot_property(
-            "first2",
-            SecondMember,
-            False,
-            SecondMember(),
-        )
         self.data = data
 
 
 class Container(hotmodel.HotObject):
     " A container with 2 members of the same type. "
+    member1 = hotmodel.HotField(FirstMember, False)
+    member2 = hotmodel.HotField(FirstMember, False)
+
     def __init__(self):
         super(Container, self).__init__("", None)
-        self.make_hot_property(
-            "member1",
-            FirstMember,
-            False,
-            FirstMember(),
-        )
-        self.make_hot_property(
-            "member2",
-            FirstMember,
-            False,
-            FirstMember(),
-        )
 
 
 if "__main__" == __name__:
@@ -1,7 +1,8 @@
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import datetime
 import itertools
 import logging
+import sys
 
 
 LOGGER = logging.getLogger("hotlist")
@@ -27,7 +28,20 @@ def add_immutable_type(tp):
     """
     IMMUTABLE_TYPES.add(tp)
 
+# A listener returning STOP_PROPAGATION stops the event from bubbling
+# further up to the parents.
+STOP_PROPAGATION = object()
+
+
 class HotBase(object):
+    # While a patch is being applied, the root collects the events here.
+    _pending_events = None
+    # Cached (generation, fqname, root, nodes with listeners on the path).
+    _route = None
+    # Incremented whenever the hierarchy or the listeners change, which
+    # invalidates all the cached routes.
+    _generation = 0
+
     def __init__(self, name=None, parent=None):
         self._listeners = []
         if parent:
@@ -36,10 +50,13 @@ class HotBase(object):
             assert not name, "For root object, you may not set a name"
         self._parent = parent
         self._name = name
+        if parent:
+            HotBase._generation += 1
 
     def set_relation(self, name, parent):
         self._name = name
         self._parent = parent
+        HotBase._generation += 1
 
     def get_fqname(self):
         """
@@ -58,38 +75,102 @@ class HotBase(object):
     def add_listener(self, listener):
         """
             Appends a listener to the listener list. The listeners are called
-            in the order in which they were added. Listeners can be only added
-            to the top-most object in the model's hierarchy.
+            in the order in which they were added. The events fired by this
+            object or any of its descendants bubble up from the source to
+            the root, calling the listeners of each object on the way.
         """
-        assert self._parent is None
         self._listeners.append(listener)
+        HotBase._generation += 1
+
+    def remove_listener(self, listener):
+        """
+            Removes the listener from the listener list.
+        """
+        self._listeners.remove(listener)
+        HotBase._generation += 1
+
+    def get_root(self):
+        """
+            Returns the top-most object in the model's hierarchy.
+        """
+        obj = self
+        while obj._parent is not None:
+            obj = obj._parent
+        return obj
 
     def get_listeners(self):
         """
-            If this object does not have a parent, returns it's list of
-            listeners. Otherwise returns parent's get_listeners.
+            Returns the listeners the events fired by this object are
+            delivered to, in the order of delivery: own listeners first,
+            the root's listeners last.
         """
-        if self._parent is None:
-            return self._listeners
-        return self._parent.get_listeners()
+        return [
+            listener
+            for node in self._get_route()[3]
+            for listener in node._listeners
+        ]
+
+    def _get_route(self):
+        """
+            Returns the cached (generation, fqname, root, nodes), where nodes
+            are the objects on the path from self to the root which have
+            some listeners. Rebuilds it if the hierarchy or any listeners
+            have changed since.
+        """
+        route = self._route
+        if route is not None and route[0] == HotBase._generation:
+            return route
+        nodes = []
+        obj = self
+        while True:
+            if obj._listeners:
+                nodes.append(obj)
+            if obj._parent is None:
+                break
+            obj = obj._parent
+        route = (HotBase._generation, self.get_fqname(), obj, tuple(nodes))
+        self.__dict__["_route"] = route
+        return route
 
     def _fire(self, event_name, key):
         """
             Called to fire an event with the given name and given key.
+            The event bubbles from self to the root, until some listener
+            returns STOP_PROPAGATION; the listeners of that object are still
+            all called.
+            When a patch is being applied, the event is only recorded
+            (once) and fired after the whole patch has been applied.
         """
-        fqname = self.get_fqname()
+        (dummy, fqname, root, nodes) = self._get_route()
+        pending = root._pending_events
+        if pending is not None:
+            marker = key
+            if type(key) is slice:
+                marker = (key.start, key.stop, key.step)
+            pending.setdefault(
+                (id(self), event_name, marker),
+                (self, event_name, key),
+            )
+            return
         LOGGER.debug(
             "FIRE: from=%s event=%s key=%s",
             fqname, event_name, key,
         )
-        for listener in self.get_listeners():
-            try:
-                listener(self, fqname, event_name, key)
-            except Exception, dummy:
-                LOGGER.exception(
-                    "Error firing %s to %s",
-                    event_name, listener,
-                )
+        for node in nodes:
+            stop = False
+            for listener in node._listeners:
+                try:
+                    if STOP_PROPAGATION is listener(
+                        self, fqname, event_name, key,
+                    ):
+                        stop = True
+                except Exception, dummy:
+                    LOGGER.exception(
+                        "Error firing %s to %s",
+                        event_name, listener,
+                    )
+            if stop:
+                break
 
     def _copy(self, the_other):
         """
@@ -102,14 +183,95 @@ class HotBase(object):
         assert False, """_copy "constructor" not implemented"""
 
 
+class HotField(object):
+    """
+        A declaration of a hot property on the class level. The fields of
+        a HotObject subclass are compiled into the class' schema once, when
+        the class is created:
+
+            class Point(HotObject):
+                x = HotField(int, False, 0)
+                y = HotField(int, False, 0)
+
+        For a HotBase type_info, each instance gets its own value created
+        by the factory (type_info itself by default).
+    """
+    def __init__(self, type_info, allow_none=True, initial_value=None,
+                 factory=None):
+        self.type_info = type_info
+        self.allow_none = allow_none
+        self.initial_value = initial_value
+        self.factory = factory
+
+
+def _check_hot_type(name, type_info, allow_none):
+    """
+        Checks the declaration of a hot property, returns True if the
+        property holds a HotBase.
+    """
+    if type_info in IMMUTABLE_TYPES:
+        return False
+    if isinstance(type_info, type) and issubclass(type_info, HotBase):
+        assert not allow_none, "%s: HotBase may not be None" % name
+        return True
+    raise TypeError(
+        "Type not allowed as a hot property: %s" % type_info,
+    )
+
+
+class HotObjectMeta(type):
+    """
+        Compiles the HotField declarations of a HotObject class (and its
+        bases) into the class' _hot_schema, which maps
+        name -> (type_info, allow_none, is_hot_base), and into _hot_fields,
+        a tuple of (name, HotField) used to initialize new instances.
+        The schemas extended by make_hot_property are cached in
+        _hot_extensions.
+    """
+    def __init__(cls, name, bases, dct):
+        super(HotObjectMeta, cls).__init__(name, bases, dct)
+        schema = {}
+        fields = {}
+        for base in reversed(cls.__mro__[1:]):
+            schema.update(base.__dict__.get("_hot_schema", {}))
+            fields.update(base.__dict__.get("_hot_fields", ()))
+        for (attr, field) in dct.items():
+            if isinstance(field, HotField):
+                schema[attr] = (
+                    field.type_info,
+                    field.allow_none,
+                    _check_hot_type(attr, field.type_info, field.allow_none),
+                )
+                fields[attr] = field
+        cls._hot_schema = schema
+        cls._hot_fields = tuple(sorted(fields.items()))
+        cls._hot_extensions = {}
+
+
 class HotObject(HotBase):
     """
         HotObject can mark some of it's properties hot, meaning when their
         content is changed, the object "fires" an event.
+
+        The hot properties are either declared by HotField class attributes,
+        or registered by make_hot_property. The declared ones are kept in
+        the class-wide _hot_schema. An instance registering a property gets
+        a schema extended by it, shared with the other instances registering
+        the same properties, so that they do not carry their own copy.
     """
+    __metaclass__ = HotObjectMeta
+
     def __init__(self, name, parent):
         super(HotObject, self).__init__(name, parent)
-        self._hot_properties = {}
+        for (attr, field) in self._hot_fields:
+            if field.factory is not None:
+                value = field.factory()
+            elif field.initial_value is None and \
+                    self._hot_schema[attr][2]:
+                value = field.type_info()
+            else:
+                value = field.initial_value
+            self._init_hot_value(attr, value)
 
     def make_hot_property(self, name, type_info, allow_none, initial_value):
         """
@@ -118,6 +280,10 @@ class HotObject(HotBase):
             things can be assigned. If the type is a HotBase, the property
             itself will be readonly, but it's contents will be modifiable.
             Other values are not allowed.
+
+            The property is registered for this instance only. The
+            instances registering the same properties share their schema,
+            a property registered again must be declared the same.
         Params:
             name            The name of the property to be created.
             type_info       The allowed type for the property.
@@ -127,29 +293,41 @@ class HotObject(HotBase):
         Returns:
             The value of the newly made property.
         """
-        assert not name in self._hot_properties
-        if type_info in IMMUTABLE_TYPES or issubclass(type_info, HotBase):
-            pass
+        schema = self._hot_schema
+        if name in schema:
+            assert schema[name][:2] == (type_info, allow_none), \
+                "%s already declared differently" % name
         else:
-            raise TypeError(
-                "Type not allowed as a hot property: %s" % type_info,
-            )
+            extensions = type(self)._hot_extensions
+            key = (id(schema), name, type_info, allow_none)
+            if key not in extensions:
+                extended = dict(schema)
+                extended[name] = (
+                    type_info,
+                    allow_none,
+                    _check_hot_type(name, type_info, allow_none),
+                )
+                # keeps schema, so that its id is not reused
+                extensions[key] = (schema, extended)
+            self.__dict__["_hot_schema"] = extensions[key][1]
+        return self._init_hot_value(name, initial_value)
 
-        self._hot_properties[name] = (type_info, allow_none, )
-        if issubclass(type_info, HotBase):
-            assert not allow_none
-        else:
-            if not allow_none and initial_value is None:
-                raise ValueError("None not allowed for %s" % name)
+    def _init_hot_value(self, name, initial_value):
+        """
+            Checks the initial value of the hot property and sets it.
+        """
+        (type_info, allow_none, is_hot_base) = self._hot_schema[name]
+        if not is_hot_base and not allow_none and initial_value is None:
+            raise ValueError("None not allowed for %s" % name)
         if not initial_value is None and not isinstance(
             initial_value, type_info,
         ):
             raise TypeError(
                 "Only %s allowed for %s" % (type_info.__name__, name),
             )
-        if isinstance(initial_value, HotBase):
+        if is_hot_base:
             initial_value.set_relation(name, self,)
-        super(HotObject, self).__setattr__(name, initial_value)
+        self.__dict__[name] = initial_value
         return initial_value
 
     def __setattr__(self, name, val):
@@ -157,33 +335,133 @@ class HotObject(HotBase):
             If setting one of the hot properties, check the type. Otherwise
             just assign the value.
         """
-        if name.startswith("_"):
+        entry = self._hot_schema.get(name)
+        if entry is None:
+            # normal (not hot) properties
             return super(HotObject, self).__setattr__(name, val)
 
-        if name in self._hot_properties:
-            (type_info, allow_none) = self._hot_properties[name]
+        (type_info, allow_none, is_hot_base) = entry
+        if is_hot_base:
+            self.__dict__[name]._copy(val)
+            return
 
-            if issubclass(type_info, HotBase):
-                target = getattr(self, name)
-                target._copy(val)
-                return
+        # check if the value has changed
+        if self.__dict__[name] == val:
+            return
 
-            # check if the value has changed
-            if getattr(self, name) == val:
-                return
+        if not val is None and not isinstance(val, type_info):
+            raise TypeError(
+                "Only %s allowed for %s" % (type_info.__name__, name),
+            )
+        if val is None and not allow_none:
+            raise ValueError("None not allowed for %s" % name)
 
-            if not val is None and not isinstance(val, type_info):
-                raise TypeError(
-                    "Only %s allowed for %s" % (type_info.__name__, name),
-                )
-            if val is None and not allow_none:
-                raise ValueError("None not allowed for %s" % name)
+        self.__dict__[name] = val
+        self._fire("update", name)
 
-            ret = super(HotObject, self).__setattr__(name, val)
-            self._fire("update", name)
-            return ret
-        # normal (not hot) properties
-        return super(HotObject, self).__setattr__(name, val)
+    def _compile_path(self, path):
+        """
+            Translates the path (relative to self) to (owner, key), where
+            owner is the HotObject or HotList holding the value under the key.
+            The translations are cached, the hierarchy of HotBase objects
+            does not change (assigning to HotBase properties copies the
+            content).
+        """
+        index = self.__dict__.get("_path_index")
+        if index is None:
+            index = self._path_index = {}
+        if path in index:
+            return index[path]
+
+        parts = [i for i in path.split("/") if i]
+        if not parts:
+            raise KeyError(path)
+        owner = self
+        for (pos, part) in enumerate(parts):
+            try:
+                if isinstance(owner, HotList):
+                    key = int(part)
+                    if pos < len(parts) - 1:
+                        owner = owner[key]
+                elif isinstance(owner, HotObject) and \
+                        part in owner._hot_schema:
+                    key = part
+                    if pos < len(parts) - 1:
+                        owner = getattr(owner, key)
+                else:
+                    raise KeyError(path)
+            except (ValueError, IndexError):
+                raise KeyError(path)
+        index[path] = (owner, key)
+        return (owner, key)
+
+    def resolve(self, path):
+        """
+            Returns the value on the path, such as "/member1/first2/second1"
+            or "/operations/3". The path is relative to self.
+        """
+        return _read_path_value(*self._compile_path(path))
+
+    def set_path(self, path, value):
+        """
+            Assigns the value to the property (or list item) on the path.
+            Fires the same events as the assignment would.
+        """
+        (owner, key) = self._compile_path(path)
+        _write_path_value(owner, key, value)
+
+    def apply_patch(self, changes):
+        """
+            Applies a list of (path, value) changes atomically: if any of the
+            changes fails, the already applied ones are reverted and no event
+            is fired. Otherwise the events are fired after the whole patch
+            has been applied, each (source, event, key) only once.
+        """
+        targets = [
+            (self._compile_path(path), value)
+            for (path, value) in changes
+        ]
+        root = self.get_root()
+        assert root._pending_events is None, "Patches cannot be nested"
+        root._pending_events = OrderedDict()
+        undo = []
+        try:
+            for ((owner, key), value) in targets:
+                undo.append((owner, key, _read_path_value(owner, key)))
+                _write_path_value(owner, key, value)
+        except Exception, dummy:
+            exc_info = sys.exc_info()
+            for (owner, key, value) in reversed(undo):
+                _write_path_value(owner, key, value)
+            root._pending_events = None
+            raise exc_info[0], exc_info[1], exc_info[2]
+        pending = root._pending_events
+        root._pending_events = None
+        for (source, event_name, key) in pending.values():
+            source._fire(event_name, key)
+
+
+def _read_path_value(owner, key):
+    """
+        Returns the value under the key in the owner. The content of
+        a HotList property is returned as a plain list.
+    """
+    if isinstance(owner, HotList):
+        return owner[key]
+    value = getattr(owner, key)
+    if isinstance(value, HotList):
+        return list(value.data)
+    return value
+
+
+def _write_path_value(owner, key, value):
+    """
+        Assigns the value under the key in the owner.
+    """
+    if isinstance(owner, HotList):
+        owner[key] = value
+    else:
+        setattr(owner, key, value)
 
 
 class HotList(HotBase):
@@ -339,7 +617,9 @@ class Mapper(object):
     def __call__(self, model, fqname, event_name, key):
         """
             Finds the callable for the (fqname, event_name) and calls them.
+            Returns STOP_PROPAGATION if any of the callables did.
         """
+        ret = None
         for callable in itertools.chain(
             self._routes[(fqname, event_name)],
             self._routes[(fqname, "")],
@@ -347,12 +627,16 @@ class Mapper(object):
             self._routes[("", "")],
         ):
             try:
-                callable(model, fqname, event_name, key)
+                if STOP_PROPAGATION is callable(
+                    model, fqname, event_name, key,
+                ):
+                    ret = STOP_PROPAGATION
             except:
                 logging.exception("Error calling %s", callable)
+        return ret
 
     def listener(self, model, fqname, event_name, key):
-        self(model, fqname, event_name, key)
+        return self(model, fqname, event_name, key)
 
     def add_route(self, fqname, event_name, callable):
         """
@@ -0,0 +1,241 @@
+import pytest
+
+import hotmodel
+
+
+def get_gather_func(l):
+    def gather_firing(*args):
+        l.append((args[1:]))
+    return gather_firing
+
+
+class Leaf(hotmodel.HotObject):
+    value = hotmodel.HotField(int, False, 0)
+    label = hotmodel.HotField(str)
+
+    def __init__(self, name=None, parent=None):
+        super(Leaf, self).__init__(name, parent)
+
+
+class Root(hotmodel.HotObject):
+    leaf = hotmodel.HotField(Leaf, False)
+    items = hotmodel.HotField(
+        hotmodel.TypedHotList,
+        False,
+        factory=lambda: hotmodel.TypedHotList(int),
+    )
+
+    def __init__(self):
+        super(Root, self).__init__("", None)
+
+
+class Registered(hotmodel.HotObject):
+    def __init__(self):
+        super(Registered, self).__init__("", None)
+        self.make_hot_property("value", int, False, 0)
+
+
+def test_schema_01():
+    " The schema is compiled once per class, not per instance. "
+    assert Leaf._hot_schema == {
+        "value": (int, False, False),
+        "label": (str, True, False),
+    }
+    assert Root._hot_schema["leaf"] == (Leaf, False, True)
+    leaf = Leaf()
+    assert not "_hot_properties" in leaf.__dict__
+    assert 0 == leaf.value
+    assert leaf.label is None
+
+
+def test_schema_02():
+    " HotBase members get their own instance and relation. "
+    (r1, r2) = (Root(), Root())
+    assert r1.leaf is not r2.leaf
+    assert "/leaf" == r1.leaf.get_fqname()
+    assert "/items" == r1.items.get_fqname()
+    assert int == r1.items.type_constraint
+
+
+def test_schema_03():
+    " Assignment fires only on change and checks types. "
+    l = []
+    r = Root()
+    r.add_listener(get_gather_func(l))
+    r.leaf.value = 3
+    r.leaf.value = 3
+    assert l == [("/leaf", "update", "value")]
+    with pytest.raises(TypeError):
+        r.leaf.value = "3"
+    with pytest.raises(ValueError):
+        r.leaf.value = None
+    r.leaf.label = None
+
+
+def test_schema_04():
+    " make_hot_property registers per instance, sharing the schema. "
+    (o1, o2) = (Registered(), Registered())
+    assert o1._hot_schema == {"value": (int, False, False)}
+    assert o1._hot_schema is o2._hot_schema
+    assert {} == Registered._hot_schema
+    assert not "value" in hotmodel.HotObject._hot_schema
+    o2.value = 5
+    assert 0 == o1.value
+
+
+def test_schema_05():
+    " Only immutable types and HotBase are allowed. "
+    with pytest.raises(TypeError):
+        class Wrong(hotmodel.HotObject):
+            value = hotmodel.HotField(list)
+
+
+def test_schema_06():
+    " A property registered by one instance is not hot in the others. "
+    class Sometimes(hotmodel.HotObject):
+        def __init__(self, hot):
+            super(Sometimes, self).__init__("", None)
+            if hot:
+                self.make_hot_property("value", int, False, 0)
+    (hot, plain) = (Sometimes(True), Sometimes(False))
+    plain.value = "anything"
+    assert "anything" == plain.value
+    with pytest.raises(TypeError):
+        hot.value = "anything"
+    assert 0 == hot.value
+
+
+def test_path_01():
+    " resolve and set_path "
+    l = []
+    r = Root()
+    r.add_listener(get_gather_func(l))
+    r.items.append(7)
+    assert 0 == r.resolve("/leaf/value")
+    assert 7 == r.resolve("/items/0")
+    assert r.leaf is r.resolve("/leaf")
+    assert 0 == r.leaf.resolve("value")
+    r.set_path("/leaf/value", 3)
+    r.set_path("/items/-1", 8)
+    assert 3 == r.leaf.value
+    assert [8] == r.items.data
+    assert l[1:] == [
+        ("/leaf", "update", "value"),
+        ("/items", "update", 0),
+    ]
+    for path in ("/", "/nothing", "/leaf/nothing", "/items/x", "/items/0/a"):
+        with pytest.raises(KeyError):
+            r.resolve(path)
+
+
+def test_path_02():
+    " The paths are compiled once. "
+    r = Root()
+    r.resolve("/leaf/value")
+    assert r._path_index["/leaf/value"] == (r.leaf, "value")
+
+
+def test_patch_01():
+    " A patch fires the consolidated events after it is applied. "
+    l = []
+    r = Root()
+    r.items.extend([1, 2])
+    r.add_listener(get_gather_func(l))
+
+    def check(*args):
+        assert 5 == r.leaf.value
+        assert [3, 4] == r.items.data
+    r.add_listener(check)
+
+    r.apply_patch([
+        ("/leaf/value", 1),
+        ("/items/0", 3),
+        ("/leaf/value", 5),
+        ("/items/1", 4),
+        ("/items/0", 3),
+    ])
+    assert l == [
+        ("/leaf", "update", "value"),
+        ("/items", "update", 0),
+        ("/items", "update", 1),
+    ]
+
+
+def test_patch_02():
+    " A failed patch is reverted and fires nothing. "
+    l = []
+    r = Root()
+    r.items.extend([1, 2])
+    r.add_listener(get_gather_func(l))
+    with pytest.raises(TypeError):
+        r.apply_patch([
+            ("/leaf/value", 1),
+            ("/items", [5, 6, 7]),
+            ("/leaf/label", 12),
+        ])
+    assert 0 == r.leaf.value
+    assert [1, 2] == r.items.data
+    assert [] == l
+    with pytest.raises(KeyError):
+        r.apply_patch([("/leaf/value", 1), ("/bad", 1)])
+    assert 0 == r.leaf.value
+    r.leaf.value = 2
+    assert [("/leaf", "update", "value")] == l
+
+
+def test_bubbling_01():
+    " Listeners on any node, events bubble from the source to the root. "
+    l = []
+    r = Root()
+    r.add_listener(lambda *args: l.append(("root",) + args[1:]))
+    r.leaf.add_listener(lambda *args: l.append(("leaf",) + args[1:]))
+    r.items.append(1)
+    r.leaf.value = 1
+    assert l == [
+        ("root", "/items", "insert", 0),
+        ("leaf", "/leaf", "update", "value"),
+        ("root", "/leaf", "update", "value"),
+    ]
+
+
+def test_bubbling_02():
+    " STOP_PROPAGATION stops bubbling after the node's listeners. "
+    l = []
+    r = Root()
+    r.add_listener(get_gather_func(l))
+    mapper = hotmodel.Mapper()
+    mapper.add_route("/leaf", "update", lambda *args: l.append("mapped"))
+    mapper.add_route(
+        "/leaf", "update", lambda *args: hotmodel.STOP_PROPAGATION,
+    )
+    r.leaf.add_listener(mapper.listener)
+    r.leaf.add_listener(get_gather_func(l))
+    r.leaf.value = 1
+    assert l == ["mapped", ("/leaf", "update", "value")]
+    r.leaf.label = "a"
+    assert l[2:] == ["mapped", ("/leaf", "update", "label")]
+    r.items.append(1)
+    assert l[4:] == [("/items", "insert", 0)]
+
+
+def test_bubbling_03():
+    " The route is cached and rebuilt when the listeners change. "
+    l = []
+    r = Root()
+    r.add_listener(get_gather_func(l))
+    r.leaf.value = 1
+    route = r.leaf._route
+    assert route[1:] == ("/leaf", r, (r,))
+    r.leaf.value = 2
+    assert route is r.leaf._route
+    listener = get_gather_func(l)
+    r.leaf.add_listener(listener)
+    assert [listener] + r._listeners == r.leaf.get_listeners()
+    r.leaf.remove_listener(listener)
+    r.leaf.value = 3
+    assert r.leaf._route[3] == (r,)
+    assert 3 == len(l)
+
+
+if "__main__" == __name__:
+    pytest.main()
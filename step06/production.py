@@ -135,6 +135,110 @@ class ProductModel(hotmodel.HotObject):
         self.process_selection = index
         self._fire("select", index)
 
+
+class ProcessDoneJoin(hotmodel.HotObject):
+    """
+        A live join of the process and the performed operations of a
+        ProductModel on the operation. Keeps the number of the performed
+        operations per operation, and done, a HotList with 1 for each process
+        row whose operation has been performed (0 otherwise).
+
+        The done list follows the process list (inserts, deletes and resets),
+        and an "update" is fired only for the rows whose status has flipped.
+        The join should be added after the views of the process rows, so that
+        they have the rows when the done events come.
+    """
+    def __init__(self, model):
+        super(ProcessDoneJoin, self).__init__("", None)
+        self.model = model
+        self.make_hot_property("done", hotmodel.HotList, False,
+                               hotmodel.HotList())
+        self._reset_operations()
+        self._reset_process()
+        model.add_listener(self.on_model_event)
+
+    def on_model_event(self, model, fqname, event_name, key):
+        if "/operations" == fqname:
+            self.on_operations_event(event_name, key)
+        elif "/process" == fqname:
+            self.on_process_event(event_name, key)
+
+    def on_operations_event(self, event_name, key):
+        operations = self.model.operations
+        if "insert" == event_name:
+            operation = operations[key].operation
+            self._operations.insert(key, operation)
+            self._count(operation, 1)
+        elif "delete" == event_name:
+            self._count(self._operations.pop(key), -1)
+        elif "update" == event_name:
+            old = self._operations[key]
+            new = self._operations[key] = operations[key].operation
+            if old != new:
+                self._count(old, -1)
+                self._count(new, 1)
+        else:
+            self._reset_operations()
+            for (row, operation) in enumerate(self._process):
+                self._set_done(row, operation)
+
+    def on_process_event(self, event_name, key):
+        process = self.model.process
+        if "insert" == event_name:
+            operation = process[key].operation
+            self._process.insert(key, operation)
+            self.done.insert(key, self._is_done(operation))
+        elif "delete" == event_name:
+            del self._process[key]
+            del self.done[key]
+        elif "update" == event_name:
+            self._process[key] = process[key].operation
+            self._set_done(key, self._process[key])
+        else:
+            self._reset_process()
+            return
+        self._rows = None
+
+    def _reset_operations(self):
+        self._operations = [i.operation for i in self.model.operations]
+        self.done_counts = {}
+        for operation in self._operations:
+            self.done_counts[operation] = \
+                self.done_counts.get(operation, 0) + 1
+
+    def _reset_process(self):
+        self._process = [i.operation for i in self.model.process]
+        self._rows = None
+        self.done = [self._is_done(i) for i in self._process]
+
+    def _is_done(self, operation):
+        return 1 if self.done_counts.get(operation) else 0
+
+    def _set_done(self, row, operation):
+        status = self._is_done(operation)
+        if self.done[row] != status:
+            self.done[row] = status
+
+    def _count(self, operation, delta):
+        """
+            Changes the count of the operation, updates the rows of the
+            process with the operation if it has become done or not done.
+        """
+        count = self.done_counts.get(operation, 0) + delta
+        if count:
+            self.done_counts[operation] = count
+        else:
+            del self.done_counts[operation]
+        if count - delta and count:
+            return
+        if self._rows is None:
+            self._rows = {}
+            for (row, i) in enumerate(self._process):
+                self._rows.setdefault(i, []).append(row)
+        for row in self._rows.get(operation, ()):
+            self._set_done(row, operation)
+
+
 def sample_handler(handler_name, model, fqname, event_name, key):
     print handler_name, "-->", fqname, event_name, key
 
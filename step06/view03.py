@@ -31,17 +31,28 @@ class ProcView(hotwidgets.MVCList):
     def indicate_operation_status(self, row, status):
         self.SetStringItem(row, 2, "YES" if status else "NO",)
 
+    def add_done_routes(self, mapper):
+        """
+            Map the events of a production.ProcessDoneJoin's done list to
+            the "Done" column. The deleted rows need no update.
+        """
+        mapper.add_route("/done", "reset", self.update_indication)
+        mapper.add_route("/done", "update", self.update_row_indication)
+        mapper.add_route("/done", "insert", self.update_row_indication)
+
     def update_indication(self, model, fqname, event_name, key):
         """
             Marks those operations that have been done as done and those that
             have not been done as not done.
         """
-        done_ops = set([i.operation for i in self.model.operations])
-        for (i, op) in enumerate(self.model.process):
-            self.indicate_operation_status(
-                i,
-                op.operation in done_ops,
-            )
+        for (i, status) in enumerate(model):
+            self.indicate_operation_status(i, status)
+
+    def update_row_indication(self, model, fqname, event_name, key):
+        """
+            Marks the row as done or not done.
+        """
+        self.indicate_operation_status(key, model[key])
 
 
 class ProductionView(wx.Frame):
@@ -76,20 +87,16 @@ class ProductionView(wx.Frame):
         self.model = model
         self.mapper = hotmodel.Mapper()
         self.proc_view.add_routes(self.mapper, "/process")
-        self.mapper.add_route(
-            "/process",
-            "",
-            self.proc_view.update_indication,
-        )
-        self.mapper.add_route(
-            "/operations",
-            "",
-            self.proc_view.update_indication,
-        )
 
         self.mapper.add_route("/", "", self.on_product,)
         self.model.add_listener(self.mapper)
 
+        # after the mapper, so that the process rows exist when it fires
+        self.join = production.ProcessDoneJoin(self.model)
+        self.join_mapper = hotmodel.Mapper()
+        self.proc_view.add_done_routes(self.join_mapper)
+        self.join.add_listener(self.join_mapper)
+
         wx.CallAfter(lambda: self.model.set_product("FIRST8", 1))
 
     def on_product(self, model, fqname, event_name, key):
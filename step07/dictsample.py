@@ -75,6 +75,7 @@ class DView(wx.Frame):
 
 
 if "__main__" == __name__:
+    hotmodel.log_to_stderr()
     MODEL = MyModel()
     APP = wx.App(redirect=False)
     FRAME = DView(None, APP, "Sample Frame", MODEL)
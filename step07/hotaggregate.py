@@ -0,0 +1,277 @@
+"""
+Aggregates (count, sum, min, max, group count) over a HotList or a HotDict,
+maintained incrementally from the containee's events.
+"""
+from collections import defaultdict
+import heapq
+
+import hotmodel
+
+
+class Aggregate(hotmodel.HotContainer):
+    """
+        A base class for the aggregates. Listens to the source containee,
+        keeps the extracted value of each item (so that the old value is
+        known when an item is updated or deleted) and publishes the result
+        in the hot property value, which fires only when the result has
+        actually changed.
+
+        A subclass implements:
+            _clear(): forgets all the values,
+            _add(value): accounts for a (not None) value,
+            _remove(value): stops accounting for a previously added value,
+            _result(): returns the aggregated result.
+        Creating an aggregate without them raises TypeError.
+
+        Expected use:
+            drying = CountAggregate(model.material, lambda i: "DRYING" == i.status)
+            drying.add_listener(...)
+    """
+    value = hotmodel.HotProperty()
+    _hooks = ("_clear", "_add", "_remove", "_result", )
+
+    def __init__(self, source, key=None):
+        """
+        Params:
+            source  The HotList or HotDict to aggregate.
+            key     Extracts the aggregated value from an item. Items for
+                    which the key returns None are skipped.
+        """
+        missing = [i for i in self._hooks if not hasattr(self, i)]
+        if missing:
+            raise TypeError("%s does not implement %s" % (
+                type(self).__name__, ", ".join(missing),
+            ))
+        super(Aggregate, self).__init__()
+        self.source = source
+        self.key = key if key is not None else (lambda item: item)
+        self._published = False
+        self._rebuild()
+        source.add_listener(self._on_source_event)
+
+    def detach(self):
+        """
+            Stops following the source.
+        """
+        self.source.remove_listener(self._on_source_event)
+
+    def _rebuild(self):
+        self._clear()
+        key = self.key
+        if isinstance(self.source, hotmodel.HotDict):
+            self._values = dict(
+                (k, key(v)) for (k, v) in self.source.items()
+            )
+            values = self._values.values()
+        else:
+            self._values = [key(i) for i in self.source]
+            values = self._values
+        for i in values:
+            if i is not None:
+                self._add(i)
+        self._publish()
+
+    def _on_source_event(self, model, fqname, event_name, key):
+        if "move" == event_name:
+            # a list item moved from key[0] to key[1] (and maybe changed)
+            self._apply("delete", key[0])
+            self._apply("insert", key[1])
+        elif "permute" == event_name:
+            # the same items, only the shadow values must follow the order
+            self._values = [self._values[i] for i in key]
+            return
+        elif event_name in ("insert", "update", "delete"):
+            self._apply(event_name, key)
+        else:
+            self._rebuild()
+            return
+        self._publish()
+
+    def _apply(self, event_name, key):
+        """
+            Accounts for a single insert/update/delete of the source.
+        """
+        if "insert" != event_name:
+            old = self._values[key]
+            if old is not None:
+                self._remove(old)
+        if "delete" == event_name:
+            del self._values[key]
+        else:
+            new = self.key(self.source[key])
+            if "insert" == event_name and isinstance(self._values, list):
+                self._values.insert(key, new)
+            else:
+                self._values[key] = new
+            if new is not None:
+                self._add(new)
+
+    def _publish(self):
+        result = self._result()
+        if self._published and result == self.value:
+            return
+        self._published = True
+        self.value = result
+
+
+class SumAggregate(Aggregate):
+    """
+        The sum of the values. O(1) per event.
+    """
+    def _clear(self):
+        self._sum = 0
+
+    def _add(self, value):
+        self._sum += value
+
+    def _remove(self, value):
+        self._sum -= value
+
+    def _result(self):
+        return self._sum
+
+
+class CountAggregate(SumAggregate):
+    """
+        The number of items for which the predicate is true (all the items
+        if there is no predicate). O(1) per event.
+    """
+    def __init__(self, source, predicate=None):
+        if predicate is None:
+            key = lambda item: 1
+        else:
+            key = lambda item: 1 if predicate(item) else 0
+        super(CountAggregate, self).__init__(source, key)
+
+
+class _Reversed(object):
+    """
+        Wraps a value so that the heap orders it descending.
+    """
+    __slots__ = ("value", )
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __hash__(self):
+        return hash(self.value)
+
+
+class MinAggregate(Aggregate):
+    """
+        The smallest of the values, or None. Keeps a heap with lazy deletion:
+        the removed values are only counted, and popped when they get to
+        the top. O(log n) per event.
+    """
+    def _clear(self):
+        self._heap = []
+        self._removed = defaultdict(int)
+        self._count = 0
+
+    def _wrap(self, value):
+        return value
+
+    def _add(self, value):
+        heapq.heappush(self._heap, self._wrap(value))
+        self._count += 1
+
+    def _remove(self, value):
+        self._removed[self._wrap(value)] += 1
+        self._count -= 1
+        if len(self._heap) > 2 * self._count + 32:
+            self._compact()
+
+    def _compact(self):
+        """
+            Drops the removed values from the heap.
+        """
+        heap = []
+        for i in self._heap:
+            if self._removed.get(i):
+                self._removed[i] -= 1
+            else:
+                heap.append(i)
+        heapq.heapify(heap)
+        self._heap = heap
+        self._removed.clear()
+
+    def _result(self):
+        heap = self._heap
+        removed = self._removed
+        while heap and removed.get(heap[0]):
+            removed[heap[0]] -= 1
+            heapq.heappop(heap)
+        if not heap:
+            return None
+        return heap[0]
+
+
+class MaxAggregate(MinAggregate):
+    """
+        The largest of the values, or None. O(log n) per event.
+    """
+    def _wrap(self, value):
+        return _Reversed(value)
+
+    def _result(self):
+        top = super(MaxAggregate, self)._result()
+        return None if top is None else top.value
+
+
+class GroupCountAggregate(Aggregate):
+    """
+        Counts the items by the group the key returns for them. The counts
+        are kept in the HotDict counts, where a group is deleted when its
+        count drops to zero; only the groups whose count has changed fire.
+        The value is the number of groups. O(1) per event.
+    """
+    counts = hotmodel.HotTypedProperty(hotmodel.HotDict)
+
+    def _rebuild(self):
+        self._touched = None
+        super(GroupCountAggregate, self)._rebuild()
+
+    def _clear(self):
+        self._counts = defaultdict(int)
+
+    def _add(self, value):
+        self._counts[value] += 1
+        if self._touched is not None:
+            self._touched.append(value)
+
+    def _remove(self, value):
+        self._counts[value] -= 1
+        if self._touched is not None:
+            self._touched.append(value)
+
+    def _publish(self):
+        if self._touched is None:
+            # after a rebuild
+            if self.counts is None:
+                self.counts = list(self._counts.items())
+            else:
+                self.counts.data = dict(self._counts)
+                self.counts._fire("reset", None)
+        else:
+            counts = self.counts
+            for group in self._touched:
+                if group not in self._counts:
+                    continue
+                count = self._counts[group]
+                if not count:
+                    del self._counts[group]
+                    if group in counts.data:
+                        del counts[group]
+                elif counts.data.get(group) != count:
+                    counts[group] = count
+        self._touched = []
+        super(GroupCountAggregate, self)._publish()
+
+    def _result(self):
+        return len(self._counts)
@@ -0,0 +1,259 @@
+"""
+Call counts, error counts and latency histograms of the listeners.
+
+An enabled Instrumentation times every listener call of the HotContainers
+and HotContainees, and every route callable of the Mappers, keyed by the
+listener (and the route). It is switched on and off at runtime, the
+listeners do not have to be re-added.
+
+Expected use:
+    instrumentation = Instrumentation()
+    instrumentation.enable()
+    instrumentation.start_dump(60.0)
+    ...
+    print(instrumentation.report())
+"""
+import logging
+import threading
+import time
+
+import hotmodel
+
+
+LOGGER = logging.getLogger("hotinstrument")
+
+_clock = getattr(time, "perf_counter", time.time)
+
+
+class LatencyHistogram(object):
+    """
+        A histogram of latencies in microseconds, with log-linear buckets
+        (HDR-style): each power of two is split into SUB_BUCKETS buckets,
+        so the relative error of a percentile is at most 1 / SUB_BUCKETS.
+    """
+    SUB_BITS = 4
+    SUB_BUCKETS = 1 << SUB_BITS
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def _index(self, value):
+        shift = max(0, value.bit_length() - self.SUB_BITS - 1)
+        return shift * self.SUB_BUCKETS + (value >> shift)
+
+    def _bounds(self, index):
+        """
+            Returns the (lowest, highest) value of the bucket.
+        """
+        if index < 2 * self.SUB_BUCKETS:
+            return (index, index)
+        shift = index // self.SUB_BUCKETS - 1
+        mantissa = index - shift * self.SUB_BUCKETS
+        return (mantissa << shift, ((mantissa + 1) << shift) - 1)
+
+    def record(self, value):
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for (index, count) in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def mean(self):
+        return float(self.total) / self.count if self.count else 0.0
+
+    def percentile(self, percent):
+        """
+            Returns the highest value of the bucket holding the percentile,
+            but at most the recorded maximum.
+        """
+        if not self.count:
+            return 0
+        rank = max(1, int(round(self.count * percent / 100.0)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._bounds(index)[1], self.max)
+        return self.max
+
+
+class CallStats(object):
+    """
+        The statistics of the calls of one listener (or route callable).
+    """
+    def __init__(self, label):
+        self.label = label
+        self.errors = 0
+        self.histogram = LatencyHistogram()
+
+    @property
+    def count(self):
+        return self.histogram.count
+
+    def as_dict(self):
+        histogram = self.histogram
+        return {
+            "label": self.label,
+            "count": histogram.count,
+            "errors": self.errors,
+            "total_us": histogram.total,
+            "mean_us": histogram.mean(),
+            "p50_us": histogram.percentile(50),
+            "p99_us": histogram.percentile(99),
+            "max_us": histogram.max,
+        }
+
+
+def label_of(callable_):
+    """
+        Returns a readable name of a listener.
+    """
+    func = getattr(callable_, "__func__", None)
+    owner = getattr(callable_, "__self__", None)
+    if func is not None and owner is not None:
+        return "%s.%s" % (type(owner).__name__, func.__name__)
+    name = getattr(callable_, "__name__", None)
+    if name is not None:
+        return name
+    return type(callable_).__name__
+
+
+class Instrumentation(object):
+    """
+        Collects CallStats per listener and per Mapper route. See
+        hotmodel.set_instrumentation.
+    """
+    def __init__(self):
+        self.listeners = {}
+        self.routes = {}
+        self._dump_timer = None
+
+    def enable(self):
+        hotmodel.set_instrumentation(self)
+
+    def disable(self):
+        if hotmodel._instrumentation is self:
+            hotmodel.set_instrumentation(None)
+
+    @property
+    def enabled(self):
+        return hotmodel._instrumentation is self
+
+    def call(self, listener, model, fqname, event_name, key):
+        """
+            Calls the listener, recording the time and the exception (which
+            is re-raised).
+        """
+        stats = self.listeners.get(listener)
+        if stats is None:
+            stats = self.listeners[listener] = CallStats(label_of(listener))
+        self._timed(stats, listener, model, fqname, event_name, key)
+
+    def call_route(self, route, callable_, model, fqname, event_name, key):
+        """
+            Calls the callable mapped to the route (fqname, event_name).
+        """
+        stats = self.routes.get((route, callable_))
+        if stats is None:
+            stats = self.routes[(route, callable_)] = CallStats(
+                "%s:%s -> %s" % (route[0], route[1], label_of(callable_)),
+            )
+        self._timed(stats, callable_, model, fqname, event_name, key)
+
+    def _timed(self, stats, callable_, model, fqname, event_name, key):
+        started = _clock()
+        try:
+            callable_(model, fqname, event_name, key)
+        except:
+            stats.errors += 1
+            raise
+        finally:
+            stats.histogram.record(int((_clock() - started) * 1000000))
+
+    def reset(self):
+        """
+            Forgets the collected statistics.
+        """
+        self.listeners = {}
+        self.routes = {}
+
+    def stats(self):
+        """
+            Returns {"listeners": [...], "routes": [...]}, the dicts of the
+            CallStats, the slowest (by the total time) first.
+        """
+        def as_list(stats):
+            return sorted(
+                [i.as_dict() for i in list(stats.values())],
+                key=lambda i: -i["total_us"],
+            )
+        return {
+            "listeners": as_list(self.listeners),
+            "routes": as_list(self.routes),
+        }
+
+    def report(self, limit=20):
+        """
+            Returns the statistics as a text table.
+        """
+        lines = []
+        stats = self.stats()
+        for section in ("listeners", "routes"):
+            lines.append(
+                "%-48s %8s %6s %10s %8s %8s %8s" % (
+                    section, "count", "errors", "total_us",
+                    "p50_us", "p99_us", "max_us",
+                ),
+            )
+            for i in stats[section][:limit]:
+                lines.append(
+                    "%-48s %8d %6d %10d %8d %8d %8d" % (
+                        i["label"][:48], i["count"], i["errors"],
+                        i["total_us"], i["p50_us"], i["p99_us"], i["max_us"],
+                    ),
+                )
+        return "\n".join(lines)
+
+    def start_dump(self, interval, dump=None):
+        """
+            Calls dump(report) every interval seconds (from a daemon thread),
+            logging the report by default.
+        """
+        self.stop_dump()
+        if dump is None:
+            dump = LOGGER.info
+
+        current = [None]
+
+        def tick():
+            try:
+                dump(self.report())
+            except Exception as dummy:
+                LOGGER.exception("Error dumping the instrumentation")
+            if self._dump_timer is current[0]:
+                schedule()
+
+        def schedule():
+            current[0] = threading.Timer(interval, tick)
+            current[0].daemon = True
+            self._dump_timer = current[0]
+            current[0].start()
+
+        schedule()
+
+    def stop_dump(self):
+        timer = self._dump_timer
+        self._dump_timer = None
+        if timer is not None:
+            timer.cancel()
@@ -0,0 +1,383 @@
+"""
+An append-only journal of the events of a HotContainer, and its replay.
+
+The Journal is a listener writing every event as (fqname, event_name, key,
+payload) to a binary file, with a snapshot of the whole model at the start
+and then every snapshot_every events. The Replayer reads the file and
+rebuilds a model to any point (the number of events), starting from the
+closest preceding snapshot. It replays at full speed, or paced by the
+recorded times.
+
+A DerivedHotList (a live view) is neither in the snapshots nor in the
+events: the replayed model's own views follow their sources.
+
+Expected use:
+    journal = Journal(model, "session.journal")
+    ...
+    journal.close()
+
+    replayer = Replayer("session.journal")
+    replayer.replay(ProductModel(server), until=1200)
+"""
+import codecs
+import io
+import marshal
+import os
+import pickle
+import struct
+import sys
+import time
+
+import hotmodel
+
+
+MAGIC = b"HOTJ\x01"
+
+# The record header: the codec and the length of the body.
+HEADER = struct.Struct("<BI")
+CODEC_MARSHAL = 0
+CODEC_PICKLE = 1
+
+# The record kinds, the first item of the record.
+EVENT = 0
+SNAPSHOT = 1
+
+# The globals a restricted record may refer to, besides the immutable types
+# of hotmodel and the namedtuples (codecs.encode rebuilds the datetimes
+# pickled by python 3).
+SAFE_GLOBALS = set([set, frozenset, codecs.encode])
+
+
+def dumps_record(record):
+    """
+        Returns the encoded record with its header. The records of primitive
+        values are marshalled, the rest (namedtuples, datetimes) pickled.
+    """
+    try:
+        body = marshal.dumps(record, 2)
+        codec = CODEC_MARSHAL
+    except ValueError:
+        body = pickle.dumps(record, 2)
+        codec = CODEC_PICKLE
+    return HEADER.pack(codec, len(body)) + body
+
+
+def read_journal(path):
+    """
+        Yields the records of the journal file: (EVENT, seq, time, fqname,
+        event_name, key, payload) and (SNAPSHOT, seq, time, state). A
+        truncated last record (the writer did not finish it) is ignored.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("%s is not a journal" % path)
+        while True:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            (codec, length) = HEADER.unpack(header)
+            body = f.read(length)
+            if len(body) < length:
+                return
+            yield loads_record(codec, body)
+
+
+def loads_record(codec, body, restricted=False):
+    """
+        Returns the record decoded from the body following its header.
+        A restricted record (e.g. received from the network) may refer only
+        to the SAFE_GLOBALS, the hotmodel.IMMUTABLE_TYPES and the namedtuples
+        of the modules already imported, so that unpickling it cannot call
+        anything else.
+    """
+    if CODEC_MARSHAL == codec:
+        return marshal.loads(body)
+    if restricted:
+        return _RestrictedUnpickler(io.BytesIO(body)).load()
+    return pickle.loads(body)
+
+
+class _RestrictedUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if "__builtin__" == module and not module in sys.modules:
+            module = "builtins"
+        found = getattr(sys.modules.get(module), name, None)
+        for allowed in (SAFE_GLOBALS, hotmodel.IMMUTABLE_TYPES):
+            if any(found is i for i in allowed):
+                return found
+        if isinstance(found, type) and issubclass(found, tuple) \
+                and hasattr(found, "_fields"):
+            return found
+        raise pickle.UnpicklingError(
+            "%s.%s is not allowed in a record" % (module, name),
+        )
+
+
+def _state_of(value):
+    """
+        Returns (kind, data) for a value of a hot property.
+    """
+    if isinstance(value, hotmodel.DerivedHotList):
+        return ("derived", None)
+    if isinstance(value, hotmodel.HotList):
+        return ("list", list(value.data))
+    if isinstance(value, hotmodel.HotDict):
+        return ("dict", list(value.data.items()))
+    if isinstance(value, hotmodel.HotSet):
+        return ("set", list(value.data))
+    return ("value", value)
+
+
+def _restore(model, fqname, kind, data):
+    """
+        Sets the hot property of the model to the (kind, data) state. The
+        HotTypedProperties are assigned (the views of the replaced containee
+        follow the new one), the other containees are changed in place. The
+        derived lists are left as they are.
+    """
+    descriptor = getattr(type(model), fqname)
+    target = getattr(model, fqname)
+    if "derived" == kind or isinstance(target, hotmodel.DerivedHotList):
+        return
+    if "value" == kind or isinstance(descriptor, hotmodel.HotTypedProperty):
+        setattr(model, fqname, data)
+        value = getattr(model, fqname)
+        if isinstance(target, hotmodel.HotContainee) and value is not target:
+            hotmodel.rebind_views(model, {id(target): (target, value)})
+    elif isinstance(target, hotmodel.SortedHotList):
+        del target[:]
+        target.extend(data)
+    elif isinstance(target, hotmodel.HotList):
+        target[:] = data
+    elif isinstance(target, hotmodel.HotDict):
+        target.clear()
+        target.update(dict(data))
+    elif isinstance(target, hotmodel.HotSet):
+        target.intersection_update(data)
+        target.update(data)
+    else:
+        setattr(model, fqname, {
+            "list": hotmodel.HotList,
+            "dict": hotmodel.HotDict,
+            "set": hotmodel.HotSet,
+        }[kind](data))
+
+
+def model_state(model):
+    """
+        Returns the state of all the hot properties of the model but the
+        derived lists, as [(name, kind, data)].
+    """
+    ret = []
+    for name in hotmodel.hot_property_names(model):
+        value = getattr(model, name)
+        if not isinstance(value, hotmodel.DerivedHotList):
+            ret.append((name, ) + _state_of(value))
+    return ret
+
+
+def restore_state(model, state):
+    """
+        Sets the hot properties of the model to the state of model_state.
+    """
+    for (name, kind, data) in state:
+        _restore(model, name, kind, data)
+
+
+def is_derived(model):
+    """
+        Returns True for a derived list, whose events are not recorded: they
+        are fired while its source's event is, before the model has fired
+        that one.
+    """
+    return isinstance(model, hotmodel.DerivedHotList)
+
+
+def event_delta(model, event_name, key):
+    """
+        Returns (key, payload) to record for the event: the payload is the
+        data needed to make the change again (see apply_event).
+    """
+    if "reset" == event_name:
+        # a property assignment, or the whole containee has changed
+        payload = _state_of(model)
+        if key is not None:
+            key = ""
+    elif event_name in ("insert", "update") \
+            and isinstance(model, (hotmodel.HotList, hotmodel.HotDict)):
+        payload = model[key]
+    elif "move" == event_name:
+        payload = model[key[1]]
+    else:
+        payload = None
+    return (key, payload)
+
+
+def apply_event(model, fqname, event_name, key, payload):
+    """
+        Makes the recorded change, so that the model fires the event. The
+        events of a derived list are ignored.
+    """
+    if "reset" == event_name:
+        _restore(model, fqname, *payload)
+        return
+    target = getattr(model, fqname)
+    if isinstance(target, hotmodel.DerivedHotList):
+        return
+    if isinstance(target, hotmodel.HotSet):
+        if "insert" == event_name:
+            target.update(key)
+        else:
+            target.difference_update(key)
+    elif "insert" == event_name and \
+            isinstance(target, hotmodel.SortedHotList):
+        target.add(payload)
+    elif "insert" == event_name and isinstance(target, hotmodel.HotList):
+        target.insert(key, payload)
+    elif event_name in ("insert", "update"):
+        target[key] = payload
+    elif "delete" == event_name:
+        del target[key]
+    elif "move" == event_name and \
+            isinstance(target, hotmodel.SortedHotList):
+        target[key[0]] = payload
+    elif "move" == event_name:
+        target.move(*key)
+    elif "permute" == event_name:
+        target._permute(key)
+    else:
+        raise ValueError("Cannot replay %s of %s" % (event_name, fqname))
+
+
+class Journal(object):
+    """
+        A listener writing the events of a model to a journal file. Appends
+        to an existing journal, continuing its numbering of the events.
+    """
+    def __init__(self, model, path, snapshot_every=1000):
+        """
+            Params:
+                model: the HotContainer to record
+                path: the journal file
+                snapshot_every: the number of events between the snapshots
+        """
+        self.model = model
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.seq = 0
+        if os.path.exists(path) and os.path.getsize(path):
+            for record in read_journal(path):
+                if EVENT == record[0]:
+                    self.seq = record[1] + 1
+            self._file = open(path, "ab")
+        else:
+            self._file = open(path, "wb")
+            self._file.write(MAGIC)
+        self._since_snapshot = 0
+        self.snapshot()
+        model.add_listener(self)
+
+    def __call__(self, model, fqname, event_name, key):
+        if is_derived(model):
+            return
+        (key, payload) = event_delta(model, event_name, key)
+        self._file.write(dumps_record((
+            EVENT, self.seq, time.time(), fqname, event_name, key, payload,
+        )))
+        self.seq += 1
+        self._since_snapshot += 1
+        if self._since_snapshot >= self.snapshot_every:
+            self.snapshot()
+
+    def snapshot(self):
+        """
+            Writes the state of all the hot properties of the model.
+        """
+        self._file.write(dumps_record((
+            SNAPSHOT, self.seq, time.time(), model_state(self.model),
+        )))
+        self._since_snapshot = 0
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        """
+            Stops recording and closes the file.
+        """
+        if self in self.model.listeners:
+            self.model.listeners.remove(self)
+        self._file.close()
+
+
+class Replayer(object):
+    """
+        Rebuilds a model from a journal file.
+    """
+    def __init__(self, path):
+        self.events = []
+        self.snapshots = []
+        for record in read_journal(path):
+            if EVENT == record[0]:
+                self.events.append(record)
+            else:
+                self.snapshots.append(record)
+        self._first_seq = self.events[0][1] if self.events else 0
+
+    def __len__(self):
+        """
+            Returns the number of the events in the journal.
+        """
+        return len(self.events)
+
+    def replay(self, model, until=None, speed=None):
+        """
+            Restores the last snapshot before the point and replays the events
+            from it. Returns the number of the replayed events.
+
+            Params:
+                model: a HotContainer of the recorded type
+                until: the number of the events (from the start of the
+                    journal) to get to, None for all of them
+                speed: None to replay at full speed, otherwise the factor of
+                    the recorded pace (2.0 replays twice as fast)
+        """
+        if until is None:
+            until = self._first_seq + len(self.events)
+        else:
+            until += self._first_seq
+        snapshot = None
+        for i in self.snapshots:
+            if i[1] > until:
+                break
+            snapshot = i
+        if snapshot is None:
+            raise ValueError("No snapshot before the event %s" % until)
+        (dummy, seq, tm, state) = snapshot
+        restore_state(model, state)
+        events = self.events[seq - self._first_seq:until - self._first_seq]
+        if speed is not None:
+            started = time.time()
+        for (dummy, dummy, tm2, fqname, event_name, key, payload) in events:
+            if speed is not None:
+                delay = (tm2 - tm) / speed - (time.time() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            apply_event(model, fqname, event_name, key, payload)
+        return len(events)
+
+    def benchmark(self, model_factory, repeat=3):
+        """
+            Replays the whole journal into the models returned by
+            model_factory() at full speed. Returns the best rate in events
+            per second.
+        """
+        best = 0.0
+        for dummy in range(repeat):
+            model = model_factory()
+            started = time.time()
+            count = self.replay(model)
+            elapsed = time.time() - started
+            if elapsed > 0:
+                best = max(best, count / elapsed)
+        return best
@@ -1,18 +1,27 @@
+import bisect
 from collections import defaultdict
 import datetime
-import itertools
 import logging
+import time
 
 
 LOGGER = logging.getLogger("hotlist")
-LOGGER.setLevel(logging.DEBUG)
-ch = logging.StreamHandler()
-ch.setLevel(logging.DEBUG)
-# create formatter and add it to the handlers
-formatter = logging.Formatter('[%(name)s]%(levelname)s: %(message)s')
-ch.setFormatter(formatter)
-# add the handlers to the logger
-LOGGER.addHandler(ch)
+
+
+def log_to_stderr(level=logging.DEBUG):
+    """
+        Logs the messages of this module to stderr (the events fired on the
+        DEBUG level). Importing the module configures no logging.
+    """
+    handler = logging.StreamHandler()
+    handler.setLevel(level)
+    handler.setFormatter(
+        logging.Formatter('[%(name)s]%(levelname)s: %(message)s'),
+    )
+    LOGGER.setLevel(level)
+    LOGGER.addHandler(handler)
+    return handler
+
 
 IMMUTABLE_TYPES = set([
     int, float, str,
@@ -25,6 +34,15 @@ try:
 except:
     pass
 
+# type: comparator(old, new) returning True when assigning new over old (of
+# the same type) is no change. The other immutable types are compared by ==.
+COMPARATORS = {}
+
+# The Instrumentation timing the listener calls (see hotinstrument), or None.
+_instrumentation = None
+
+# The value of a hot property never assigned.
+_UNSET = object()
 
 
 def add_immutable_type(type_name):
@@ -35,6 +53,75 @@ def add_immutable_type(type_name):
     IMMUTABLE_TYPES.add(type_name)
 
 
+def set_comparator(type_name, comparator):
+    """
+        Sets the comparator(old, new) of the values of the type, which
+        returns True if assigning new over old is no change (and fires no
+        event), e.g. to compare floats with a tolerance. None restores ==.
+    """
+    if comparator is None:
+        COMPARATORS.pop(type_name, None)
+    else:
+        COMPARATORS[type_name] = comparator
+
+
+def is_unchanged(old, new):
+    """
+        Returns True if assigning new to a hot property holding old is no
+        change: the same object, or an equal immutable value of the same
+        type (by its comparator, see set_comparator).
+    """
+    if old is new:
+        return True
+    tp = type(new)
+    if type(old) is not tp:
+        return False
+    comparator = COMPARATORS.get(tp)
+    if comparator is not None:
+        return comparator(old, new)
+    return tp in IMMUTABLE_TYPES and old == new
+
+
+def set_instrumentation(instrumentation):
+    """
+        Sets the Instrumentation which the listeners and the Mapper routes
+        are called through, None to call them directly. Takes effect for the
+        next event, the listeners need not be re-added.
+    """
+    global _instrumentation
+    _instrumentation = instrumentation
+
+
+def hot_property_names(container):
+    """
+        Returns the names of the hot properties of the container (or its
+        class), the base classes' ones first.
+    """
+    klass = container if isinstance(container, type) else type(container)
+    names = []
+    for base in reversed(klass.__mro__):
+        for (name, value) in base.__dict__.items():
+            if isinstance(value, HotProperty) and not name in names:
+                names.append(name)
+    return names
+
+
+def rebind_views(container, replaced):
+    """
+        Makes the derived lists held by the hot properties of the container
+        follow the containees which replaced their sources (replaced maps
+        id(old) to (old, new)). A view of a view follows the reset of its
+        source.
+    """
+    for name in hot_property_names(container):
+        view = getattr(container, name)
+        while isinstance(view, DerivedHotList):
+            if id(view.source) in replaced:
+                view.set_source(replaced[id(view.source)][1])
+                break
+            view = view.source
+
+
 class HotContainer(object):
     """
         HotContainer can maintain listerners and fire events.
@@ -46,9 +133,32 @@ class HotContainer(object):
         These properties can be assigned only immutable values and whenever
         the property is assigned into, an event is fired.
     """
+    # An UndoManager recording the changes of this container, see hotundo.
+    _undo = None
+    # True while the container refuses the changes, see set_read_only.
+    _read_only = False
+    # The fqnames of the events fired since the last take_dirty(), None
+    # unless tracked.
+    _dirty = None
+
     def __init__(self):
         self._listeners = []
 
+    def set_read_only(self, read_only=True):
+        """
+            Makes the hot properties and the containees of the container
+            refuse every change with TypeError (e.g. of a mirror of another
+            model, see hotreplica), or accept them again.
+        """
+        self._read_only = read_only
+
+    def _check_writable(self):
+        """
+            Called before every change of the container or its containees.
+        """
+        if self._read_only:
+            raise TypeError("%s is read-only." % type(self).__name__)
+
     def add_listener(self, listener):
         """
             Appends a listener to the listener list. The listeners are called
@@ -60,6 +170,25 @@ class HotContainer(object):
     def listeners(self):
         return self._listeners
 
+    def track_dirty(self, enabled=True):
+        """
+            Starts (or stops) collecting the fqnames of the events fired, see
+            take_dirty.
+        """
+        self._dirty = set() if enabled else None
+
+    def take_dirty(self):
+        """
+            Returns the set of the fqnames of the events fired since the last
+            call (or since track_dirty), and starts a new one. A view can
+            pull the changes once per frame instead of listening.
+        """
+        dirty = self._dirty
+        if dirty is None:
+            raise ValueError("Dirty tracking is not enabled.")
+        self._dirty = set()
+        return dirty
+
     def _fire(self, model, fqname, event_name, key):
         """
             Fire an event.
@@ -68,9 +197,17 @@ class HotContainer(object):
             "FIRE: from=%s event=%s key=%s",
             fqname, event_name, key,
         )
+        if self._dirty is not None:
+            self._dirty.add(fqname)
+        instrumentation = _instrumentation
         for listener in self.listeners:
             try:
-                listener(model, fqname, event_name, key)
+                if instrumentation is None:
+                    listener(model, fqname, event_name, key)
+                else:
+                    instrumentation.call(
+                        listener, model, fqname, event_name, key,
+                    )
             except Exception as dummy:
                 LOGGER.exception(
                     "Error firing %s to %s",
@@ -82,18 +219,155 @@ class HotContainee(object):
     """
         A base class for the data structures assignable to HotProperty.
         A Containee knows its container and uses it to fire events.
+
+        Listeners can also be added directly to a containee. They are called
+        (with the containee as the model) before the container's listeners.
+
+        snapshot() returns an immutable view of the data in O(1). The data
+        are shared with the view until the next change, which first copies
+        them (copy-on-write). The snapshot should be taken on the thread
+        which changes the containee; it can then be read from any thread.
     """
+    # True when self.data is shared with a snapshot.
+    _shared = False
+
     def __init__(self, name=None, container=None):
+        self._listeners = []
         self.set_rel(name, container)
 
+    def add_listener(self, listener):
+        """
+            Appends a listener to the containee's own listener list.
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """
+            Removes a listener from the containee's own listener list.
+        """
+        self._listeners.remove(listener)
+
+    @property
+    def listeners(self):
+        return self._listeners
+
+    def snapshot(self):
+        """
+            Returns an immutable view of the current data.
+        """
+        self._shared = True
+        return self.snapshot_type(self.data)
+
+    def _get_undo(self):
+        """
+            Returns the UndoManager recording the changes of the container,
+            or None. The changes are recorded (before they are made) as the
+            calls which revert them. Called before every change, it checks
+            that the container is not read-only.
+        """
+        if self._container is None:
+            return None
+        self._container._check_writable()
+        return self._container._undo
+
+    def _check_writable(self):
+        if self._container is not None:
+            self._container._check_writable()
+
+    def _unshare(self):
+        """
+            Must be called before self.data is changed in place. If the data
+            are shared (with a snapshot, or a file they are loaded from),
+            replaces them with a copy of the data_type.
+        """
+        if self._shared:
+            self.data = self.data_type(self.data)
+            self._shared = False
+
     def _fire(self, event_name, key):
-        self._container._fire(self, self._name, event_name, key)
+        instrumentation = _instrumentation
+        for listener in self._listeners:
+            try:
+                if instrumentation is None:
+                    listener(self, self._name, event_name, key)
+                else:
+                    instrumentation.call(
+                        listener, self, self._name, event_name, key,
+                    )
+            except Exception as dummy:
+                LOGGER.exception(
+                    "Error firing %s to %s",
+                    event_name, listener,
+                )
+        if self._container is not None:
+            self._container._fire(self, self._name, event_name, key)
 
     def set_rel(self, name, container):
         self._name = name
         self._container = container
 
 
+class Snapshot(object):
+    """
+        An immutable view of the data of a HotContainee. See
+        HotContainee.snapshot.
+    """
+    __slots__ = ("_data", )
+
+    def __init__(self, data):
+        self._data = data
+
+    def __len__(self):
+        return len(self._data)
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __contains__(self, value):
+        return value in self._data
+
+    def __str__(self):
+        return str(self._data)
+
+
+class ListSnapshot(Snapshot):
+    """
+        An immutable view of the data of a HotList.
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def index(self, value):
+        return self._data.index(value)
+
+    def count(self, value):
+        return self._data.count(value)
+
+
+class DictSnapshot(Snapshot):
+    """
+        An immutable view of the data of a HotDict.
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def items(self):
+        return self._data.items()
+
+    def keys(self):
+        return self._data.keys()
+
+    def values(self):
+        return self._data.values()
+
+
 class HotProperty(object):
     """
         A descriptor class for controlling a property, which fires an event
@@ -121,10 +395,25 @@ class HotProperty(object):
 
     def __set__(self, obj, val):
         """
-            Checks that the new value for the property is immutable.
-            Checks that we are called on an object, not a class.
+            Checks that the new value for the property is immutable, or None
+            (the value of a property never assigned, which clears it, e.g.
+            when its first assignment is undone). Checks that we are called
+            on an object, not a class. Assigning the current value (see
+            is_unchanged) fires no event.
         """
-        if type(val) in IMMUTABLE_TYPES:
+        if is_unchanged(getattr(obj, self.key, _UNSET), val):
+            return
+        name = self._assign(obj, val)
+        obj._fire(val, name, "reset", None)
+
+    def _assign(self, obj, val):
+        """
+            Validates and sets the value, without firing the event. Returns
+            the name of the property.
+        """
+        if val is None:
+            pass
+        elif type(val) in IMMUTABLE_TYPES:
             pass
         elif isinstance(val, HotContainee):
             pass
@@ -134,11 +423,15 @@ class HotProperty(object):
             )
 
         name = self._get_name_within_parent(obj)
+        obj._check_writable()
+        if obj._undo is not None:
+            obj._undo.record(
+                obj, "__setattr__", name, getattr(obj, self.key, None),
+            )
         if isinstance(val, HotContainee):
             val.set_rel(name, obj)
-
         setattr(obj, self.key, val)
-        obj._fire(val, name, "reset", None)
+        return name
 
     def _get_name_within_parent(self, obj):
         """
@@ -148,10 +441,11 @@ class HotProperty(object):
         if (self.key + "_rel") in obj.__dict__:
             return obj.__dict__[self.key + "_rel"]
 
-        for (k, v) in type(obj).__dict__.items():
-            if v == self:
-                setattr(obj, self.key + "_rel", k)
-                return k
+        for klass in type(obj).__mro__:
+            for (k, v) in klass.__dict__.items():
+                if v is self:
+                    setattr(obj, self.key + "_rel", k)
+                    return k
         raise Exception("Could not find parent")
 
 
@@ -171,16 +465,197 @@ class HotTypedProperty(HotProperty):
             type.
         """
         name = self._get_name_within_parent(obj)
+        obj._check_writable()
         if not isinstance(val, self.target_type):
             val = self.target_type(val, name=name, container=obj)
+        if obj._undo is not None:
+            obj._undo.record(
+                obj, "__setattr__", name, getattr(obj, self.key, None),
+            )
         setattr(obj, self.key, val)
         obj._fire(val, name, "reset", None)
 
 
+class _RateState(object):
+    __slots__ = ("last", "deadline", "pending", "scheduled", )
+
+    def __init__(self):
+        self.last = None
+        self.deadline = None
+        self.pending = False
+        self.scheduled = False
+
+
+class RateLimitedHotProperty(HotProperty):
+    """
+        A base of the hot properties that fire the "reset" event later than
+        assigned, or not at all. The value is always assigned at once (the
+        getter returns it), only the event is held back; a held back event is
+        fired with the value current then.
+
+        The times are read from clock() (in seconds). Without a scheduler,
+        the held back ("trailing") events are fired by poll(obj) once due;
+        with it, schedule(delay, callback) is called to run callback after
+        delay seconds, e.g. wx.CallLater. Useful for the sensor-driven
+        properties assigned many times a second, like the oven temperature
+        of examples/matdrier.
+
+        A subclass implements:
+            _on_assign(state, val, now): returns True if the event of the
+                assignment is fired at once,
+            _is_due(state, now): returns True if the held back event is due,
+            _delay(state, now): returns the seconds until the held back
+                event is due, None if it is not to be scheduled.
+        Creating a property without them raises TypeError.
+    """
+    _hooks = ("_on_assign", "_is_due", "_delay", )
+
+    def __init__(self, clock=None, schedule=None, **kw):
+        missing = [i for i in self._hooks if not hasattr(self, i)]
+        if missing:
+            raise TypeError("%s does not implement %s" % (
+                type(self).__name__, ", ".join(missing),
+            ))
+        super(RateLimitedHotProperty, self).__init__(**kw)
+        self.clock = clock or getattr(time, "monotonic", time.time)
+        self.schedule = schedule
+
+    def __set__(self, obj, val):
+        if is_unchanged(getattr(obj, self.key, _UNSET), val):
+            return
+        name = self._assign(obj, val)
+        state = self._state(obj)
+        if self._on_assign(state, val, self.clock()):
+            self._fire_now(obj, name, state)
+        else:
+            state.pending = True
+            self._schedule(obj, state)
+
+    def poll(self, obj):
+        """
+            Fires the held back event of obj if it is due. Returns True if
+            fired.
+        """
+        state = self._state(obj)
+        if not state.pending or not self._is_due(state, self.clock()):
+            return False
+        self._fire_now(obj, self._get_name_within_parent(obj), state)
+        return True
+
+    def flush(self, obj):
+        """
+            Fires the held back event of obj at once, if there is one.
+        """
+        state = self._state(obj)
+        if state.pending:
+            self._fire_now(obj, self._get_name_within_parent(obj), state)
+
+    def pending(self, obj):
+        """
+            Returns True if an event of obj is held back.
+        """
+        return self._state(obj).pending
+
+    def _state(self, obj):
+        state = obj.__dict__.get(self.key + "_rate")
+        if state is None:
+            state = obj.__dict__[self.key + "_rate"] = _RateState()
+        return state
+
+    def _fire_now(self, obj, name, state):
+        state.pending = False
+        state.last = self.clock()
+        val = getattr(obj, self.key, None)
+        obj._fire(val, name, "reset", None)
+
+    def _schedule(self, obj, state):
+        if self.schedule is None or state.scheduled:
+            return
+        delay = self._delay(state, self.clock())
+        if delay is None:
+            return
+        state.scheduled = True
+
+        def callback():
+            state.scheduled = False
+            if not self.poll(obj) and state.pending:
+                self._schedule(obj, state)
+        self.schedule(max(delay, 0), callback)
+
+
+class ThrottledHotProperty(RateLimitedHotProperty):
+    """
+        Fires at most one event per interval seconds: the first assignment
+        fires at once, the following ones within the interval are fired as
+        one trailing event at its end.
+    """
+    def __init__(self, interval, **kw):
+        super(ThrottledHotProperty, self).__init__(**kw)
+        self.interval = interval
+
+    def _on_assign(self, state, val, now):
+        return self._is_due(state, now)
+
+    def _is_due(self, state, now):
+        return state.last is None or now - state.last >= self.interval
+
+    def _delay(self, state, now):
+        return state.last + self.interval - now
+
+
+class DebouncedHotProperty(RateLimitedHotProperty):
+    """
+        Fires the event once the value has not been assigned for wait
+        seconds.
+    """
+    def __init__(self, wait, **kw):
+        super(DebouncedHotProperty, self).__init__(**kw)
+        self.wait = wait
+
+    def _on_assign(self, state, val, now):
+        state.deadline = now + self.wait
+        return False
+
+    def _is_due(self, state, now):
+        return now >= state.deadline
+
+    def _delay(self, state, now):
+        return state.deadline - now
+
+
+class DeadbandHotProperty(HotProperty):
+    """
+        Fires the event only when the numeric value has changed by more than
+        threshold since the last event (None and the non-numeric values
+        always fire). The value is always assigned.
+    """
+    def __init__(self, threshold, **kw):
+        super(DeadbandHotProperty, self).__init__(**kw)
+        self.threshold = threshold
+
+    def __set__(self, obj, val):
+        if is_unchanged(getattr(obj, self.key, _UNSET), val):
+            return
+        name = self._assign(obj, val)
+        last_key = self.key + "_fired"
+        if last_key in obj.__dict__:
+            last = obj.__dict__[last_key]
+            try:
+                if abs(val - last) <= self.threshold:
+                    return
+            except TypeError:
+                pass
+        obj.__dict__[last_key] = val
+        obj._fire(val, name, "reset", None)
+
+
 class HotList(HotContainee):
     """
         A list that fires when changed.
     """
+    data_type = list
+    snapshot_type = ListSnapshot
+
     def __init__(self, init_iterable=None, name=None, container=None, ):
         super(HotList, self).__init__(name=name, container=container)
         if init_iterable is None:
@@ -199,36 +674,163 @@ class HotList(HotContainee):
         return self.data[key]
 
     def __delitem__(self, key):
+        undo = self._get_undo()
         if type(key) is slice:
+            if undo is not None:
+                self._record_delete(undo, key, self.data[key])
+            self._unshare()
             del self.data[key]
             self._fire("reset", key)
         else:
             key = self._natural_index(key)
+            if undo is not None:
+                self._record_delete(undo, key, self.data[key])
+            self._unshare()
             del self.data[key]
             self._fire("delete", key)
 
     def __setitem__(self, key, value):
+        undo = self._get_undo()
         if type(key) is slice:
+            value = list(value)
             for i in value:
                 self._validate_value(i)
+            if undo is not None:
+                (start, dummy, step) = key.indices(len(self.data))
+                if 1 == step:
+                    undo.record(
+                        self, "__setitem__",
+                        slice(start, start + len(value)), self.data[key],
+                    )
+                else:
+                    undo.record(self, "__setitem__", key, self.data[key])
+            self._unshare()
             self.data[key] = value
             self._fire("reset", key)
         else:
-            self.data[key] = self._validate_value(value)
+            value = self._validate_value(value)
+            if undo is not None:
+                undo.record(self, "__setitem__", key, self.data[key])
+            self._unshare()
+            self.data[key] = value
             self._fire("update", self._natural_index(key))
 
     def insert(self, key, value):
-        self.data.insert(key, self._validate_value(value))
-        self._fire("insert", self._natural_index(key))
+        key = min(max(self._natural_index(key), 0), len(self.data))
+        value = self._validate_value(value)
+        undo = self._get_undo()
+        if undo is not None:
+            undo.record(self, "__delitem__", key)
+        self._unshare()
+        self.data.insert(key, value)
+        self._fire("insert", key)
 
     def append(self, value):
-        self.data.append(self._validate_value(value))
+        value = self._validate_value(value)
+        undo = self._get_undo()
+        if undo is not None:
+            undo.record(self, "__delitem__", len(self.data))
+        self._unshare()
+        self.data.append(value)
         self._fire("insert", len(self.data) - 1)
 
     def extend(self, iterable):
         for i in iterable:
             self.append(i)
 
+    def move(self, src, dst):
+        """
+            Moves the item from the index src so that it ends up on the index
+            dst. Fires "move" with (src, dst) as the key.
+        """
+        src = self._natural_index(src)
+        dst = self._natural_index(dst)
+        if not (0 <= src < len(self.data) and 0 <= dst < len(self.data)):
+            raise IndexError("list index out of range")
+        if src == dst:
+            return
+        undo = self._get_undo()
+        if undo is not None:
+            undo.record(self, "move", dst, src)
+        self._unshare()
+        self.data.insert(dst, self.data.pop(src))
+        self._fire("move", (src, dst))
+
+    def sort(self, key=None, reverse=False):
+        """
+            Sorts the list in place (stable). Fires a single "permute" event
+            if the order has changed.
+        """
+        data = self.data
+        if key is None:
+            order = sorted(
+                range(len(data)), key=data.__getitem__, reverse=reverse,
+            )
+        else:
+            order = sorted(
+                range(len(data)), key=lambda i: key(data[i]),
+                reverse=reverse,
+            )
+        self._permute(order)
+
+    def reverse(self):
+        """
+            Reverses the list in place. Fires a single "permute" event.
+        """
+        self._permute(range(len(self.data) - 1, -1, -1))
+
+    def _permute(self, order):
+        """
+            Reorders the items, so that the new i-th item is the one which
+            was on the index order[i], and fires "permute" with the order
+            (as a tuple) as the key. Does nothing for the identity.
+        """
+        order = tuple(order)
+        if order == tuple(range(len(order))):
+            return
+        undo = self._get_undo()
+        if undo is not None:
+            inverse = [0] * len(order)
+            for (new, old) in enumerate(order):
+                inverse[old] = new
+            undo.record(self, "_permute", inverse)
+        self._apply_permute(order)
+
+    def _apply_permute(self, order):
+        """
+            Reorders the items as _permute does, without recording the undo
+            (for the lists following another one).
+        """
+        order = tuple(order)
+        if order == tuple(range(len(order))):
+            return
+        self.data = [self.data[i] for i in order]
+        self._fire("permute", order)
+
+    def _record_delete(self, undo, key, old):
+        """
+            Records the reverting of deleting the key (an index or a slice),
+            which held old.
+        """
+        if type(key) is not slice:
+            undo.record(self, "insert", key, old)
+            return
+        (start, stop, step) = key.indices(len(self.data))
+        if 1 == step:
+            undo.record(self, "__setitem__", slice(start, start), old)
+        else:
+            undo.record(
+                self, "_insert_all",
+                sorted(zip(range(start, stop, step), old)),
+            )
+
+    def _insert_all(self, items):
+        """
+            Inserts the (index, value) items in the given order.
+        """
+        for (index, value) in items:
+            self.insert(index, value)
+
     def _validate_value(self, val):
         """
             The members may only be "primitive" types (int, str and such),
@@ -257,11 +859,38 @@ class HotList(HotContainee):
     def __unicode__(self):
         return unicode(self.data)
 
+    def filtered(self, predicate):
+        """
+            Returns a read-only FilteredHotList of the items for which
+            predicate(item) is true, kept up to date with this list.
+        """
+        return FilteredHotList(self, predicate)
+
+    def mapped(self, func):
+        """
+            Returns a read-only MappedHotList of func(item) for each item,
+            kept up to date with this list.
+        """
+        return MappedHotList(self, func)
+
 class TypedHotList(HotList):
     """
         TypedHotList is a HotList variant that can restrict it's items to
         the provided type.
+
+        When the items are namedtuples, a subclass can declare secondary
+        indexes on their fields, which are kept up to date on every change:
+
+            class OperationsList(TypedHotList):
+                hash_indexes = ("operation", )
+                sorted_indexes = ("tm", )
+
+            lst.find_by("operation", 30)
+            lst.range_by("tm", since, till)
     """
+    hash_indexes = ()
+    sorted_indexes = ()
+
     def __init__(self, type_constraint, init_iterable=None,
                  name=None, container=None,):
         """
@@ -276,8 +905,154 @@ class TypedHotList(HotList):
                 or \
                 issubclass(type_constraint, HotProperty)
         self.type_constraint = type_constraint
+        for field in self.hash_indexes + self.sorted_indexes:
+            assert field in getattr(type_constraint, "_fields", ()), \
+                "Cannot index %s on %s" % (field, type_constraint)
+        self._indexed = bool(self.hash_indexes or self.sorted_indexes)
 
         super(TypedHotList, self).__init__(init_iterable, name, container,)
+        self._rebuild_indexes()
+
+    def _rebuild_indexes(self):
+        """
+            Builds the indexes from scratch. A hash index maps the field value
+            to the list of items, a sorted index is a pair of lists, the
+            sorted field values and the items in the same order.
+        """
+        self._hash_index = dict((f, {}) for f in self.hash_indexes)
+        self._sorted_index = dict(
+            (f, ([], [])) for f in self.sorted_indexes
+        )
+        if self._indexed:
+            for i in self.data:
+                self._index_add(i)
+
+    def _invalidate_indexes(self):
+        """
+            Drops the indexes, they are built on their next use (e.g. after
+            the data have been replaced by lazily loaded ones).
+        """
+        self._hash_index = self._sorted_index = None
+
+    def _ensure_indexes(self):
+        if self._hash_index is None:
+            self._rebuild_indexes()
+
+    def _index_add(self, item):
+        for (field, index) in self._hash_index.items():
+            index.setdefault(getattr(item, field), []).append(item)
+        for (field, (keys, items)) in self._sorted_index.items():
+            value = getattr(item, field)
+            if value is None:
+                continue
+            pos = bisect.bisect_right(keys, value)
+            keys.insert(pos, value)
+            items.insert(pos, item)
+
+    def _index_remove(self, item):
+        for (field, index) in self._hash_index.items():
+            value = getattr(item, field)
+            bucket = index[value]
+            bucket.remove(item)
+            if not bucket:
+                del index[value]
+        for (field, (keys, items)) in self._sorted_index.items():
+            value = getattr(item, field)
+            if value is None:
+                continue
+            pos = items.index(
+                item,
+                bisect.bisect_left(keys, value),
+                bisect.bisect_right(keys, value),
+            )
+            del keys[pos]
+            del items[pos]
+
+    def _indexed_change(self, old_items, new_items, change, *args):
+        """
+            Updates the indexes (so that the listeners already see the
+            updated ones) and calls the change. Rebuilds the indexes if the
+            change fails.
+        """
+        self._check_writable()
+        self._ensure_indexes()
+        for i in old_items:
+            self._index_remove(i)
+        for i in new_items:
+            self._index_add(i)
+        try:
+            return change(*args)
+        except:
+            self._rebuild_indexes()
+            raise
+
+    def __delitem__(self, key):
+        if not self._indexed:
+            return super(TypedHotList, self).__delitem__(key)
+        old = self.data[key] if type(key) is slice else [self.data[key]]
+        self._indexed_change(
+            old, [], super(TypedHotList, self).__delitem__, key,
+        )
+
+    def __setitem__(self, key, value):
+        if not self._indexed:
+            return super(TypedHotList, self).__setitem__(key, value)
+        if type(key) is slice:
+            old = self.data[key]
+            value = [self._validate_value(i) for i in value]
+            new = value
+        else:
+            old = [self.data[key]]
+            new = [self._validate_value(value)]
+        self._indexed_change(
+            old, new, super(TypedHotList, self).__setitem__, key, value,
+        )
+
+    def insert(self, key, value):
+        if not self._indexed:
+            return super(TypedHotList, self).insert(key, value)
+        self._indexed_change(
+            [], [self._validate_value(value)],
+            super(TypedHotList, self).insert, key, value,
+        )
+
+    def append(self, value):
+        if not self._indexed:
+            return super(TypedHotList, self).append(value)
+        self._indexed_change(
+            [], [self._validate_value(value)],
+            super(TypedHotList, self).append, value,
+        )
+
+    def find_by(self, field, value):
+        """
+            Returns the list of items whose field equals the value, using
+            a hash or a sorted index on the field.
+        """
+        self._ensure_indexes()
+        if field in self._hash_index:
+            return list(self._hash_index[field].get(value, ()))
+        if field in self._sorted_index:
+            (keys, items) = self._sorted_index[field]
+            return items[
+                bisect.bisect_left(keys, value):
+                bisect.bisect_right(keys, value)
+            ]
+        raise KeyError("No index on %s" % field)
+
+    def range_by(self, field, low=None, high=None):
+        """
+            Returns the items with low <= field < high, ordered by the field,
+            using a sorted index on the field. Either bound can be None.
+            The items with None in the field are not indexed.
+        """
+        self._ensure_indexes()
+        if not field in self._sorted_index:
+            raise KeyError("No sorted index on %s" % field)
+        (keys, items) = self._sorted_index[field]
+        start = 0 if low is None else bisect.bisect_left(keys, low)
+        end = len(keys) if high is None else bisect.bisect_left(keys, high)
+        return items[start:end]
 
     def _validate_value(self, val):
         """
@@ -297,8 +1072,11 @@ class TypedHotList(HotList):
     def _validate_sub_value(self, val):
         """
             Called from _validate_value, checks that the supplied value
-            is immutable.
+            is immutable. None is allowed, a field with no value (e.g. the
+            tm of an operation not done yet), which the sorted indexes skip.
         """
+        if val is None:
+            return val
         if type(val) in IMMUTABLE_TYPES:
             return val
         if isinstance(val, tuple) or isinstance(val, frozenset):
@@ -309,10 +1087,292 @@ class TypedHotList(HotList):
             "Only number/strings and tuples/frozensets allowed here.",
         )
 
+class SortedHotList(HotList):
+    """
+        A HotList which keeps its items sorted by key(item). Adding an item
+        finds its position by bisection and fires "insert" there; items with
+        equal keys keep the order in which they were added. Replacing an item
+        so that it has to move fires a single "move" event with
+        (old_index, new_index) as the key, the item at new_index being the
+        new value.
+
+        The key is either passed to the constructor, or a subclass can
+        override the sort_key method (so that it can be used with
+        HotTypedProperty).
+    """
+    def __init__(self, init_iterable=None, name=None, container=None,
+                 key=None, ):
+        self.key = key if key is not None else self.sort_key
+        super(SortedHotList, self).__init__(init_iterable, name, container)
+        self.data.sort(key=self.key)
+        self._keys = [self.key(i) for i in self.data]
+
+    def _invalidate_keys(self):
+        """
+            Drops the keys of the items, they are computed on their next use
+            (e.g. after the data have been replaced by lazily loaded ones).
+        """
+        self._keys = None
+
+    def _get_keys(self):
+        if self._keys is None:
+            self._keys = [self.key(i) for i in self.data]
+        return self._keys
+
+    def add(self, value):
+        """
+            Adds the value on its sorted position, returns the position.
+        """
+        value = self._validate_value(value)
+        item_key = self.key(value)
+        keys = self._get_keys()
+        pos = bisect.bisect_right(keys, item_key)
+        undo = self._get_undo()
+        if undo is not None:
+            undo.record(self, "__delitem__", pos)
+        keys.insert(pos, item_key)
+        self._unshare()
+        self.data.insert(pos, value)
+        self._fire("insert", pos)
+        return pos
+
+    def append(self, value):
+        self.add(value)
+
+    def insert(self, key, value):
+        raise TypeError("Cannot insert to a position of a SortedHotList.")
+
+    def _permute(self, order):
+        raise TypeError("Cannot reorder a SortedHotList.")
+
+    def move(self, src, dst):
+        raise TypeError("Cannot reorder a SortedHotList.")
+
+    def __setitem__(self, key, value):
+        if type(key) is slice:
+            raise TypeError("Cannot assign a slice of a SortedHotList.")
+        key = self._natural_index(key)
+        value = self._validate_value(value)
+        item_key = self.key(value)
+        old = self.data[key]
+        undo = self._get_undo()
+        keys = self._get_keys()
+        del keys[key]
+        self._unshare()
+        del self.data[key]
+        # the closest position to the original one among the equal keys
+        pos = min(
+            max(key, bisect.bisect_left(keys, item_key)),
+            bisect.bisect_right(keys, item_key),
+        )
+        if undo is not None:
+            undo.record(self, "__setitem__", pos, old)
+        keys.insert(pos, item_key)
+        self.data.insert(pos, value)
+        if pos == key:
+            self._fire("update", key)
+        else:
+            self._fire("move", (key, pos))
+
+    def __delitem__(self, key):
+        if type(key) is not slice:
+            key = self._natural_index(key)
+        self._check_writable()
+        del self._get_keys()[key]
+        super(SortedHotList, self).__delitem__(key)
+
+    def _record_delete(self, undo, key, old):
+        undo.record(self, "extend", old if type(key) is slice else [old])
+
+    def index_of_key(self, item_key):
+        """
+            Returns the index of the first item with the key, or of the place
+            it would be inserted to.
+        """
+        return bisect.bisect_left(self._get_keys(), item_key)
+
+    def sort_key(self, item):
+        return item
+
+
+class DerivedHotList(HotList):
+    """
+        A read-only HotList derived from a source HotList. Listens to the
+        source's events and updates its data incrementally, firing its own
+        insert/update/delete events. Can be assigned to a HotProperty (or
+        bound to a view directly) like any other HotList.
+    """
+    def __init__(self, source, name=None, container=None):
+        super(DerivedHotList, self).__init__(name=name, container=container)
+        self.source = source
+        self._rebuild()
+        source.add_listener(self._on_source_event)
+
+    def detach(self):
+        """
+            Stops following the source list.
+        """
+        self.source.remove_listener(self._on_source_event)
+
+    def set_source(self, source):
+        """
+            Follows another source list instead, fires "reset".
+        """
+        self.detach()
+        self.source = source
+        self._rebuild()
+        source.add_listener(self._on_source_event)
+        self._fire("reset", None)
+
+    def _on_source_event(self, model, fqname, event_name, key):
+        if "insert" == event_name:
+            self._source_insert(key)
+        elif "update" == event_name:
+            self._source_update(key)
+        elif "delete" == event_name:
+            self._source_delete(key)
+        elif "move" == event_name:
+            self._source_move(*key)
+        elif "permute" == event_name:
+            self._source_permute(key)
+        else:
+            self._rebuild()
+            self._fire("reset", None)
+
+    def _source_move(self, src, dst):
+        """
+            The item from src is now (possibly changed) on dst.
+        """
+        self._source_delete(src)
+        self._source_insert(dst)
+
+    def _read_only(self, *args, **kw):
+        raise TypeError("%s is read-only." % type(self).__name__)
+
+    __setitem__ = __delitem__ = insert = append = extend = _read_only
+    move = sort = reverse = _read_only
+
+
+class FilteredHotList(DerivedHotList):
+    """
+        The items of the source for which the predicate is true, in the
+        source's order. source_index[i] is the index in the source of the
+        i-th item.
+    """
+    def __init__(self, source, predicate, name=None, container=None):
+        self.predicate = predicate
+        super(FilteredHotList, self).__init__(source, name, container)
+
+    def _rebuild(self):
+        predicate = self.predicate
+        self.source_index = [
+            i for (i, item) in enumerate(self.source.data) if predicate(item)
+        ]
+        self.data = [self.source.data[i] for i in self.source_index]
+
+    def _shift(self, pos, delta):
+        """
+            Moves the source indexes from pos on by delta.
+        """
+        index = self.source_index
+        for i in range(pos, len(index)):
+            index[i] += delta
+
+    def _source_insert(self, key):
+        pos = bisect.bisect_left(self.source_index, key)
+        self._shift(pos, 1)
+        item = self.source.data[key]
+        if self.predicate(item):
+            self.source_index.insert(pos, key)
+            self._unshare()
+            self.data.insert(pos, item)
+            self._fire("insert", pos)
+
+    def _source_update(self, key):
+        pos = bisect.bisect_left(self.source_index, key)
+        was_in = pos < len(self.source_index) and \
+            self.source_index[pos] == key
+        item = self.source.data[key]
+        is_in = self.predicate(item)
+        if was_in and is_in:
+            self._unshare()
+            self.data[pos] = item
+            self._fire("update", pos)
+        elif was_in:
+            del self.source_index[pos]
+            self._unshare()
+            del self.data[pos]
+            self._fire("delete", pos)
+        elif is_in:
+            self.source_index.insert(pos, key)
+            self._unshare()
+            self.data.insert(pos, item)
+            self._fire("insert", pos)
+
+    def _source_permute(self, order):
+        new_index = [0] * len(order)
+        for (new, old) in enumerate(order):
+            new_index[old] = new
+        moved = sorted(
+            (new_index[src], pos)
+            for (pos, src) in enumerate(self.source_index)
+        )
+        self.source_index = [i[0] for i in moved]
+        self._apply_permute([i[1] for i in moved])
+
+    def _source_delete(self, key):
+        pos = bisect.bisect_left(self.source_index, key)
+        if pos < len(self.source_index) and self.source_index[pos] == key:
+            del self.source_index[pos]
+            self._unshare()
+            del self.data[pos]
+            self._shift(pos, -1)
+            self._fire("delete", pos)
+        else:
+            self._shift(pos, -1)
+
+
+class MappedHotList(DerivedHotList):
+    """
+        func(item) for each item of the source, index by index.
+    """
+    def __init__(self, source, func, name=None, container=None):
+        self.func = func
+        super(MappedHotList, self).__init__(source, name, container)
+
+    def _rebuild(self):
+        self.data = [
+            self._validate_value(self.func(i)) for i in self.source.data
+        ]
+
+    def _source_insert(self, key):
+        self._unshare()
+        self.data.insert(
+            key, self._validate_value(self.func(self.source.data[key])),
+        )
+        self._fire("insert", key)
+
+    def _source_update(self, key):
+        self._unshare()
+        self.data[key] = self._validate_value(self.func(self.source.data[key]))
+        self._fire("update", key)
+
+    def _source_delete(self, key):
+        self._unshare()
+        del self.data[key]
+        self._fire("delete", key)
+
+    def _source_permute(self, order):
+        self._apply_permute(order)
+
+
 class HotDict(HotContainee):
     """
         A dict that fires when changed.
     """
+    data_type = dict
+    snapshot_type = DictSnapshot
+
     def __init__(self, init_iterable=None, name=None, container=None, ):
         super(HotDict, self).__init__(name=name, container=container)
         if init_iterable is None:
@@ -334,7 +1394,10 @@ class HotDict(HotContainee):
         return self.data[key]
 
     def __delitem__(self, key):
-        del self.data[key]
+        undo = self._get_undo()
+        if undo is not None:
+            undo.record(self, "__setitem__", key, self.data[key])
+        self._remove(key)
         self._fire("delete", key)
 
     def items(self):
@@ -345,18 +1408,50 @@ class HotDict(HotContainee):
         return self.data.values()
 
     def __setitem__(self, key, value):
+        value = self._validate_value(value)
         event = "update" if key in self.data else "insert"
-        self.data[key] = self._validate_value(value)
+        undo = self._get_undo()
+        if undo is None:
+            pass
+        elif "update" == event:
+            undo.record(self, "__setitem__", key, self.data[key])
+        else:
+            undo.record(self, "__delitem__", key)
+        self._store(key, value)
         self._fire(event, key)
 
     def clear(self):
-        self.data.clear()
+        undo = self._get_undo()
+        if undo is not None:
+            undo.record(self, "update", dict(self.data.items()))
+        self._clear()
         self._fire("reset", "")
 
     def update(self, other):
         for (k, v) in other.items():
             self[k] = v
 
+    def _store(self, key, value):
+        """
+            Stores the (validated) value in self.data.
+        """
+        self._unshare()
+        self.data[key] = value
+
+    def _remove(self, key):
+        """
+            Removes the key from self.data.
+        """
+        self._unshare()
+        del self.data[key]
+
+    def _clear(self):
+        """
+            Removes everything from self.data.
+        """
+        self._unshare()
+        self.data.clear()
+
     def _validate_value(self, val):
         """
             The members may only be "primitive" types (int, str and such),
@@ -379,6 +1474,127 @@ class HotDict(HotContainee):
 
 
 
+class HotSet(HotContainee):
+    """
+        A set that fires when changed. The events carry frozensets of the
+        elements: "insert" with the added ones, "delete" with the removed
+        ones. A bulk operation fires at most one event of each kind, and
+        nothing if the set has not changed.
+    """
+    data_type = set
+    snapshot_type = Snapshot
+
+    def __init__(self, init_iterable=None, name=None, container=None, ):
+        super(HotSet, self).__init__(name=name, container=container)
+        self.data = set()
+        if init_iterable:
+            self.data = set(self._validate_value(i) for i in init_iterable)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        return self.data.__iter__()
+
+    def __contains__(self, value):
+        return value in self.data
+
+    def add(self, value):
+        if value in self.data:
+            return
+        value = self._validate_value(value)
+        undo = self._get_undo()
+        if undo is not None:
+            undo.record(self, "discard", value)
+        self._unshare()
+        self.data.add(value)
+        self._fire("insert", frozenset([value]))
+
+    def discard(self, value):
+        if not value in self.data:
+            return
+        undo = self._get_undo()
+        if undo is not None:
+            undo.record(self, "add", value)
+        self._unshare()
+        self.data.discard(value)
+        self._fire("delete", frozenset([value]))
+
+    def remove(self, value):
+        if not value in self.data:
+            raise KeyError(value)
+        self.discard(value)
+
+    def update(self, *iterables):
+        added = set()
+        for iterable in iterables:
+            for i in iterable:
+                if not i in self.data:
+                    added.add(self._validate_value(i))
+        self._change(added, ())
+
+    def difference_update(self, *iterables):
+        removed = set()
+        for iterable in iterables:
+            removed.update(i for i in iterable if i in self.data)
+        self._change((), removed)
+
+    def intersection_update(self, *iterables):
+        kept = self.data.intersection(*iterables)
+        self._change((), self.data - kept)
+
+    def symmetric_difference_update(self, iterable):
+        other = set(iterable)
+        self._change(
+            [self._validate_value(i) for i in other - self.data],
+            other & self.data,
+        )
+
+    def clear(self):
+        self._change((), set(self.data))
+
+    def _change(self, added, removed):
+        """
+            Removes and adds the elements, then fires "delete" and "insert"
+            for the non-empty ones.
+        """
+        removed = frozenset(removed)
+        added = frozenset(added)
+        undo = self._get_undo()
+        if undo is not None and (added or removed):
+            undo.record(
+                self, "_change",
+                removed & self.data, added - self.data,
+            )
+        self._unshare()
+        self.data.difference_update(removed)
+        self.data.update(added)
+        if removed:
+            self._fire("delete", removed)
+        if added:
+            self._fire("insert", added)
+
+    def _validate_value(self, val):
+        """
+            The members may only be "primitive" types (int, str and such),
+            or tuples of primitive types.
+        """
+        if type(val) in IMMUTABLE_TYPES:
+            return val
+        if isinstance(val, tuple) or isinstance(val, frozenset):
+            for i in val:
+                self._validate_value(i)
+            return val
+        raise TypeError(
+            "Only number/strings and tuples/frozensets allowed here.",
+        )
+
+    def __str__(self):
+        return str(self.data)
+    def __unicode__(self):
+        return unicode(self.data)
+
+
 class Mapper(object):
     """
         Mapper holds and resolves the mapping of the hot object's fqname
@@ -393,16 +1609,23 @@ class Mapper(object):
         """
             Finds the callable for the (fqname, event_name) and calls them.
         """
-        for callable_ in itertools.chain(
-            self._routes[(fqname, event_name)],
-            self._routes[(fqname, "")],
-            self._routes[("", event_name)],
-            self._routes[("", "")],
+        instrumentation = _instrumentation
+        for route in (
+            (fqname, event_name),
+            (fqname, ""),
+            ("", event_name),
+            ("", ""),
         ):
-            try:
-                callable_(model, fqname, event_name, key)
-            except:
-                logging.exception("Error calling %s", callable_)
+            for callable_ in self._routes[route]:
+                try:
+                    if instrumentation is None:
+                        callable_(model, fqname, event_name, key)
+                    else:
+                        instrumentation.call_route(
+                            route, callable_, model, fqname, event_name, key,
+                        )
+                except:
+                    logging.exception("Error calling %s", callable_)
 
     def listener(self, model, fqname, event_name, key):
         self(model, fqname, event_name, key)
@@ -0,0 +1,364 @@
+"""
+A persistent (immutable, structurally shared) map and a HotDict using it.
+
+PersistentMap is a hash array mapped trie: a change copies only the nodes
+on the path to the changed entry, the rest of the trie is shared with the
+previous version. Two versions derived from each other can be compared
+in time proportional to the changed entries, as the shared subtrees are
+skipped by identity.
+"""
+import hotmodel
+
+
+SHIFT = 5
+MASK = (1 << SHIFT) - 1
+HASH_BITS = 32
+
+
+def _hash(key):
+    return hash(key) & 0xFFFFFFFF
+
+
+def _popcount(value):
+    return bin(value).count("1")
+
+
+class _Leaf(object):
+    """
+        A single entry.
+    """
+    __slots__ = ("hash", "key", "value", )
+
+    def __init__(self, key_hash, key, value):
+        self.hash = key_hash
+        self.key = key
+        self.value = value
+
+
+class _Collision(object):
+    """
+        Entries whose keys have the same (32 bit) hash. A tuple of leaves.
+    """
+    __slots__ = ("hash", "leaves", )
+
+    def __init__(self, key_hash, leaves):
+        self.hash = key_hash
+        self.leaves = leaves
+
+
+class _Branch(object):
+    """
+        Up to 32 children, indexed by SHIFT bits of the hash. The bitmap
+        marks the present ones, the children tuple holds only those.
+    """
+    __slots__ = ("bitmap", "children", )
+
+    def __init__(self, bitmap, children):
+        self.bitmap = bitmap
+        self.children = children
+
+
+_EMPTY = _Branch(0, ())
+
+
+def _merge(leaf1, leaf2, shift):
+    """
+        Returns a node holding two leaves with different keys.
+    """
+    if shift >= HASH_BITS:
+        return _Collision(leaf1.hash, (leaf1, leaf2))
+    bit1 = 1 << ((leaf1.hash >> shift) & MASK)
+    bit2 = 1 << ((leaf2.hash >> shift) & MASK)
+    if bit1 == bit2:
+        return _Branch(bit1, (_merge(leaf1, leaf2, shift + SHIFT), ))
+    if bit1 < bit2:
+        return _Branch(bit1 | bit2, (leaf1, leaf2))
+    return _Branch(bit1 | bit2, (leaf2, leaf1))
+
+
+def _set(node, shift, leaf):
+    """
+        Returns (new node, True if the key was added).
+    """
+    if isinstance(node, _Collision):
+        for (pos, i) in enumerate(node.leaves):
+            if i.key == leaf.key:
+                leaves = node.leaves[:pos] + (leaf, ) + node.leaves[pos + 1:]
+                return (_Collision(node.hash, leaves), False)
+        return (_Collision(node.hash, node.leaves + (leaf, )), True)
+
+    bit = 1 << ((leaf.hash >> shift) & MASK)
+    pos = _popcount(node.bitmap & (bit - 1))
+    children = node.children
+    if not node.bitmap & bit:
+        return (
+            _Branch(
+                node.bitmap | bit,
+                children[:pos] + (leaf, ) + children[pos:],
+            ),
+            True,
+        )
+    child = children[pos]
+    if isinstance(child, _Leaf):
+        if child.key == leaf.key:
+            (new_child, added) = (leaf, False)
+        else:
+            (new_child, added) = (_merge(child, leaf, shift + SHIFT), True)
+    else:
+        (new_child, added) = _set(child, shift + SHIFT, leaf)
+    return (
+        _Branch(
+            node.bitmap,
+            children[:pos] + (new_child, ) + children[pos + 1:],
+        ),
+        added,
+    )
+
+
+def _delete(node, shift, key_hash, key):
+    """
+        Returns the new node (None if it is empty, or a leaf if it is the
+        only entry left). Raises KeyError if the key is not present.
+    """
+    if isinstance(node, _Collision):
+        leaves = tuple(i for i in node.leaves if i.key != key)
+        if len(leaves) == len(node.leaves):
+            raise KeyError(key)
+        if 1 == len(leaves):
+            return leaves[0]
+        return _Collision(node.hash, leaves)
+
+    bit = 1 << ((key_hash >> shift) & MASK)
+    if not node.bitmap & bit:
+        raise KeyError(key)
+    pos = _popcount(node.bitmap & (bit - 1))
+    children = node.children
+    child = children[pos]
+    if isinstance(child, _Leaf):
+        if child.key != key:
+            raise KeyError(key)
+        new_child = None
+    else:
+        new_child = _delete(child, shift + SHIFT, key_hash, key)
+    if new_child is None:
+        if 1 == len(children):
+            return None
+        rest = children[:pos] + children[pos + 1:]
+        if 1 == len(rest) and isinstance(rest[0], _Leaf) and shift:
+            # a single leaf moves up to the parent
+            return rest[0]
+        return _Branch(node.bitmap & ~bit, rest)
+    if isinstance(new_child, _Leaf) and 1 == len(children) and shift:
+        return new_child
+    return _Branch(
+        node.bitmap,
+        children[:pos] + (new_child, ) + children[pos + 1:],
+    )
+
+
+def _leaves(node):
+    """
+        Yields all the leaves under the node.
+    """
+    if isinstance(node, _Leaf):
+        yield node
+    elif isinstance(node, _Collision):
+        for i in node.leaves:
+            yield i
+    else:
+        for child in node.children:
+            for i in _leaves(child):
+                yield i
+
+
+def _diff(node1, node2, shift):
+    """
+        Yields (event_name, key) changing node1 to node2, where the event
+        is "insert", "update" or "delete". Skips the identical subtrees.
+    """
+    if node1 is node2:
+        return
+    if isinstance(node1, _Branch) and isinstance(node2, _Branch):
+        bitmap = node1.bitmap | node2.bitmap
+        while bitmap:
+            bit = bitmap & -bitmap
+            bitmap ^= bit
+            child1 = child2 = None
+            if node1.bitmap & bit:
+                child1 = node1.children[_popcount(node1.bitmap & (bit - 1))]
+            if node2.bitmap & bit:
+                child2 = node2.children[_popcount(node2.bitmap & (bit - 1))]
+            if child1 is None:
+                for i in _leaves(child2):
+                    yield ("insert", i.key)
+            elif child2 is None:
+                for i in _leaves(child1):
+                    yield ("delete", i.key)
+            else:
+                for i in _diff(child1, child2, shift + SHIFT):
+                    yield i
+        return
+    # a leaf or a collision on either side: compare the (few) entries
+    old = dict((i.key, i) for i in _leaves(node1))
+    for i in _leaves(node2):
+        if not i.key in old:
+            yield ("insert", i.key)
+            continue
+        old_leaf = old.pop(i.key)
+        if old_leaf is not i and old_leaf.value != i.value:
+            yield ("update", i.key)
+    for key in old:
+        yield ("delete", key)
+
+
+class PersistentMap(object):
+    """
+        An immutable map. set() and delete() return a new map sharing most
+        of the structure with this one.
+    """
+    __slots__ = ("_root", "_len", )
+
+    def __init__(self, items=(), _root=_EMPTY, _len=0):
+        self._root = _root
+        self._len = _len
+        for (key, value) in items:
+            (self._root, added) = _set(
+                self._root, 0, _Leaf(_hash(key), key, value),
+            )
+            self._len += added
+
+    def __len__(self):
+        return self._len
+
+    def _find(self, key):
+        key_hash = _hash(key)
+        node = self._root
+        shift = 0
+        while True:
+            if isinstance(node, _Branch):
+                bit = 1 << ((key_hash >> shift) & MASK)
+                if not node.bitmap & bit:
+                    return None
+                node = node.children[_popcount(node.bitmap & (bit - 1))]
+                shift += SHIFT
+            elif isinstance(node, _Leaf):
+                return node if node.key == key else None
+            else:
+                for i in node.leaves:
+                    if i.key == key:
+                        return i
+                return None
+
+    def __getitem__(self, key):
+        leaf = self._find(key)
+        if leaf is None:
+            raise KeyError(key)
+        return leaf.value
+
+    def get(self, key, default=None):
+        leaf = self._find(key)
+        return default if leaf is None else leaf.value
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def __iter__(self):
+        return (i.key for i in _leaves(self._root))
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return [i.value for i in _leaves(self._root)]
+
+    def items(self):
+        return [(i.key, i.value) for i in _leaves(self._root)]
+
+    def set(self, key, value):
+        """
+            Returns a new map with the key set to the value.
+        """
+        (root, added) = _set(self._root, 0, _Leaf(_hash(key), key, value))
+        return PersistentMap(_root=root, _len=self._len + added)
+
+    def delete(self, key):
+        """
+            Returns a new map without the key. Raises KeyError if the key is
+            not present.
+        """
+        root = _delete(self._root, 0, _hash(key), key)
+        if root is None:
+            root = _EMPTY
+        return PersistentMap(_root=root, _len=self._len - 1)
+
+    def diff(self, other):
+        """
+            Yields the (event_name, key) changes from this map to the other
+            one; the event is "insert", "update" or "delete".
+        """
+        return _diff(self._root, other._root, 0)
+
+    def __str__(self):
+        return str(dict(self.items()))
+
+
+class PersistentHotDict(hotmodel.HotDict):
+    """
+        A HotDict keeping its data in a PersistentMap. version() returns the
+        current data as an immutable handle in O(1); the versions share
+        their structure. checkout(version) makes the dict equal to a version
+        again, firing insert/update/delete only for the changed keys.
+    """
+    def __init__(self, init_iterable=None, name=None, container=None, ):
+        super(PersistentHotDict, self).__init__(
+            init_iterable, name=name, container=container,
+        )
+        self.data = PersistentMap(self.data.items())
+
+    def version(self):
+        """
+            Returns the current version of the data (a PersistentMap).
+        """
+        self._unshare()
+        return self.data
+
+    def checkout(self, version):
+        """
+            Replaces the data with the version and fires an event for each
+            changed key.
+        """
+        self._unshare()
+        undo = self._get_undo()
+        if undo is not None:
+            undo.record(self, "checkout", self.data)
+        changes = list(self.data.diff(version))
+        self.data = version
+        for (event_name, key) in changes:
+            self._fire(event_name, key)
+
+    def _store(self, key, value):
+        self._unshare()
+        self.data = self.data.set(key, value)
+
+    def _remove(self, key):
+        self._unshare()
+        self.data = self.data.delete(key)
+
+    def _clear(self):
+        self.data = PersistentMap()
+        self._shared = False
+
+    def snapshot(self):
+        """
+            The data are immutable, they are shared without copying.
+        """
+        return self.snapshot_type(self.data)
+
+    def _unshare(self):
+        """
+            Only the data loaded from elsewhere (see hotstore) are converted,
+            the own data are immutable.
+        """
+        if self._shared:
+            self.data = PersistentMap(self.data.items())
+            self._shared = False
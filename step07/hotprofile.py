@@ -0,0 +1,328 @@
+"""
+Profiles the events of the hot models of a script.
+
+    python -m hotprofile [--json FILE] [--limit N] script.py [args...]
+
+Runs the script with every HotContainer._fire and Mapper call of its
+hotmodel module profiled, and when the script ends reports:
+    - the events per second by (fqname, event_name), with the fan-out (the
+      listeners called per event) and the time spent in the listeners,
+    - the time spent per listener and per Mapper route,
+    - the top cascades: the events fired (directly or indirectly) from the
+      listeners of a top-level event, by their total time.
+
+The hotmodel module is the one the script imports (the first one on its
+sys.path), so that the copies in the steps and in examples/ can be profiled
+alike. The listeners added directly to a HotContainee are not profiled.
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import runpy
+import sys
+import time
+
+
+_clock = getattr(time, "perf_counter", time.time)
+
+
+class EventStats(object):
+    """
+        The statistics of one (fqname, event_name).
+    """
+    def __init__(self):
+        self.count = 0
+        self.listener_calls = 0
+        self.seconds = 0.0
+
+
+class CascadeStats(object):
+    """
+        The statistics of the cascades started by one (fqname, event_name):
+        the events fired while its listeners ran, including itself.
+    """
+    def __init__(self):
+        self.count = 0
+        self.events = 0
+        self.max_events = 0
+        self.max_depth = 0
+        self.seconds = 0.0
+
+
+class _Frame(object):
+    __slots__ = ("key", "started", "listener_calls", "events", "depth", )
+
+    def __init__(self, key):
+        self.key = key
+        self.started = _clock()
+        self.listener_calls = 0
+        self.events = 1
+        self.depth = 1
+
+
+class Profiler(object):
+    """
+        Collects the event, listener, route and cascade statistics of a
+        hotmodel module while attached to it.
+    """
+    def __init__(self):
+        self.events = {}
+        self.cascades = {}
+        self.listeners = {}
+        self.routes = {}
+        self.module = None
+        self.started = None
+        self.stopped = None
+        self._stack = []
+        self._originals = None
+
+    def attach(self, module):
+        """
+            Replaces HotContainer._fire and Mapper.__call__ of the hotmodel
+            module with the profiled ones.
+        """
+        # imported here, after the script's hotmodel, which it then uses
+        import hotinstrument
+        self._label = hotinstrument.label_of
+        self._call_stats = hotinstrument.CallStats
+        self.module = module
+        self._logger = getattr(module, "LOGGER", logging.getLogger())
+        self._originals = (module.HotContainer._fire, module.Mapper.__call__)
+        profiler = self
+
+        def _fire(container, model, fqname, event_name, key):
+            profiler.fire(container, model, fqname, event_name, key)
+
+        def __call__(mapper, model, fqname, event_name, key):
+            profiler.route(mapper, model, fqname, event_name, key)
+
+        module.HotContainer._fire = _fire
+        module.Mapper.__call__ = __call__
+        self.started = _clock()
+        self.stopped = None
+
+    def detach(self):
+        if self._originals is None:
+            return
+        (self.module.HotContainer._fire, self.module.Mapper.__call__) = \
+            self._originals
+        self._originals = None
+        self.stopped = _clock()
+
+    def fire(self, container, model, fqname, event_name, key):
+        """
+            HotContainer._fire, profiled.
+        """
+        dirty = getattr(container, "_dirty", None)
+        if dirty is not None:
+            dirty.add(fqname)
+        frame = _Frame((fqname, event_name))
+        if self._stack:
+            root = self._stack[0]
+            root.events += 1
+            root.depth = max(root.depth, len(self._stack) + 1)
+        self._stack.append(frame)
+        try:
+            for listener in container.listeners:
+                frame.listener_calls += 1
+                error = self._timed(
+                    self.listeners, listener, listener,
+                    model, fqname, event_name, key,
+                )
+                if error is not None:
+                    self._logger.error(
+                        "Error firing %s to %s", event_name, listener,
+                        exc_info=error,
+                    )
+        finally:
+            self._stack.pop()
+            self._leave(frame)
+
+    def route(self, mapper, model, fqname, event_name, key):
+        """
+            Mapper.__call__, profiled.
+        """
+        for route in (
+            (fqname, event_name),
+            (fqname, ""),
+            ("", event_name),
+            ("", ""),
+        ):
+            for callable_ in mapper._routes[route]:
+                error = self._timed(
+                    self.routes, (route, callable_), callable_,
+                    model, fqname, event_name, key,
+                )
+                if error is not None:
+                    self._logger.error(
+                        "Error calling %s", callable_, exc_info=error,
+                    )
+
+    def _timed(self, stats_dict, stats_key, callable_,
+               model, fqname, event_name, key):
+        """
+            Calls the callable, returns the sys.exc_info() of the error it
+            has raised, or None.
+        """
+        stats = stats_dict.get(stats_key)
+        if stats is None:
+            label = self._label(callable_)
+            if stats_key is not callable_:
+                label = "%s:%s -> %s" % (stats_key[0] + (label, ))
+            stats = stats_dict[stats_key] = self._call_stats(label)
+        started = _clock()
+        try:
+            callable_(model, fqname, event_name, key)
+            return None
+        except:
+            stats.errors += 1
+            return sys.exc_info()
+        finally:
+            stats.histogram.record(int((_clock() - started) * 1000000))
+
+    def _leave(self, frame):
+        elapsed = _clock() - frame.started
+        stats = self.events.get(frame.key)
+        if stats is None:
+            stats = self.events[frame.key] = EventStats()
+        stats.count += 1
+        stats.listener_calls += frame.listener_calls
+        stats.seconds += elapsed
+        if self._stack:
+            return
+        cascade = self.cascades.get(frame.key)
+        if cascade is None:
+            cascade = self.cascades[frame.key] = CascadeStats()
+        cascade.count += 1
+        cascade.events += frame.events
+        cascade.max_events = max(cascade.max_events, frame.events)
+        cascade.max_depth = max(cascade.max_depth, frame.depth)
+        cascade.seconds += elapsed
+
+    def duration(self):
+        if self.started is None:
+            return 0.0
+        return (self.stopped or _clock()) - self.started
+
+    def as_dict(self, limit=None):
+        """
+            Returns the statistics as JSON-serializable dicts, each list
+            ordered by the time, the most expensive first.
+        """
+        duration = self.duration()
+        events = [
+            {
+                "fqname": fqname,
+                "event": event_name,
+                "count": i.count,
+                "per_second": i.count / duration if duration else 0.0,
+                "fan_out": float(i.listener_calls) / i.count,
+                "total_ms": i.seconds * 1000.0,
+            }
+            for ((fqname, event_name), i) in self.events.items()
+        ]
+        cascades = [
+            {
+                "fqname": fqname,
+                "event": event_name,
+                "count": i.count,
+                "mean_events": float(i.events) / i.count,
+                "max_events": i.max_events,
+                "max_depth": i.max_depth,
+                "total_ms": i.seconds * 1000.0,
+            }
+            for ((fqname, event_name), i) in self.cascades.items()
+        ]
+
+        def calls(stats_dict):
+            ret = []
+            for i in stats_dict.values():
+                ret.append(i.as_dict())
+                ret[-1]["total_ms"] = ret[-1].pop("total_us") / 1000.0
+            return ret
+
+        ret = {
+            "duration_s": duration,
+            "events": events,
+            "listeners": calls(self.listeners),
+            "routes": calls(self.routes),
+            "cascades": cascades,
+        }
+        for items in ret.values():
+            if isinstance(items, list):
+                items.sort(key=lambda i: -i["total_ms"])
+                if limit is not None:
+                    del items[limit:]
+        return ret
+
+    def report(self, limit=20):
+        """
+            Returns the statistics as text tables.
+        """
+        stats = self.as_dict(limit)
+        lines = ["duration: %.3f s" % stats["duration_s"], ""]
+        lines.append("%-40s %8s %10s %8s %10s" % (
+            "events", "count", "per_s", "fan_out", "total_ms",
+        ))
+        for i in stats["events"]:
+            lines.append("%-40s %8d %10.1f %8.2f %10.3f" % (
+                ("%s:%s" % (i["fqname"], i["event"]))[:40],
+                i["count"], i["per_second"], i["fan_out"], i["total_ms"],
+            ))
+        for section in ("listeners", "routes"):
+            lines.append("")
+            lines.append("%-48s %8s %6s %10s %8s" % (
+                section, "count", "errors", "total_ms", "p99_us",
+            ))
+            for i in stats[section]:
+                lines.append("%-48s %8d %6d %10.3f %8d" % (
+                    i["label"][:48], i["count"], i["errors"],
+                    i["total_ms"], i["p99_us"],
+                ))
+        lines.append("")
+        lines.append("%-40s %8s %8s %8s %6s %10s" % (
+            "cascades", "count", "mean_ev", "max_ev", "depth", "total_ms",
+        ))
+        for i in stats["cascades"]:
+            lines.append("%-40s %8d %8.2f %8d %6d %10.3f" % (
+                ("%s:%s" % (i["fqname"], i["event"]))[:40], i["count"],
+                i["mean_events"], i["max_events"], i["max_depth"],
+                i["total_ms"],
+            ))
+        return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m hotprofile",
+        description="Profiles the hot model events of a script.",
+    )
+    parser.add_argument("--json", metavar="FILE",
+                        help="write the statistics as JSON to the file")
+    parser.add_argument("--limit", type=int, default=20,
+                        help="the number of rows of each table")
+    parser.add_argument("script")
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+
+    sys.argv = [args.script] + args.args
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+    profiler = Profiler()
+    profiler.attach(importlib.import_module("hotmodel"))
+    try:
+        runpy.run_path(args.script, run_name="__main__")
+    except SystemExit:
+        pass
+    finally:
+        profiler.detach()
+        sys.stderr.write(profiler.report(args.limit) + "\n")
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(profiler.as_dict(args.limit), f, indent=2)
+    return profiler
+
+
+if "__main__" == __name__:
+    main()
@@ -0,0 +1,356 @@
+"""
+Replication of a HotContainer to other processes over a socket.
+
+The ReplicationServer listens on a TCP (host, port) address or on a Unix
+socket path. It sends every client a snapshot of the model, and then every
+event of the model as a delta, both encoded as the records of hotjournal (a
+header and a marshalled, or pickled, body). A ReplicationClient applies them
+to its mirror model, which fires the same events to its own listeners. The
+mirror is read-only (see HotContainer.set_read_only): changing it other than
+by the client raises TypeError. An UndoManager of the mirror would record
+the replicated changes, undoing them is refused as any other change.
+
+Expected use:
+    # in the process owning the model
+    server = ReplicationServer(model, ("127.0.0.1", 8765))
+    server.start()
+
+    # in a viewer process
+    mirror = production.ProductModel(None)
+    client = ReplicationClient(mirror, ("127.0.0.1", 8765))
+    client.start(wx.CallAfter)
+
+The events are sent from the thread that changes the model, each client has
+a writer thread with a bounded queue; a client which falls behind by more
+than queue_size records is disconnected.
+
+The client decodes the pickled records restricted (see
+hotjournal.loads_record): they may hold only the immutable values and the
+namedtuples, not calls of other code. Still, only connect to a trusted
+server: a malformed record can crash the client, and the server decides the
+state of the mirror.
+"""
+import logging
+import os
+import select
+import socket
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import hotjournal
+
+
+LOGGER = logging.getLogger("hotreplica")
+
+MAGIC = b"HOTR\x01"
+
+
+def _socket_for(address):
+    """
+        Returns a new socket for the address: a Unix socket for a path, a
+        TCP one for a (host, port).
+    """
+    if isinstance(address, str):
+        return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    return socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+
+class _Connection(object):
+    """
+        A client of the server, with its queue of the encoded records and the
+        thread writing them.
+    """
+    def __init__(self, sock, queue_size):
+        self.sock = sock
+        self.closed = False
+        self._queue = queue.Queue(queue_size)
+        self._thread = threading.Thread(target=self._write)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def send(self, data):
+        """
+            Queues the data, returns False if the connection is closed (or
+            has been closed as it fell behind).
+        """
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(data)
+        except queue.Full:
+            LOGGER.warning("Dropping a client, which fell behind")
+            self.close()
+            return False
+        return True
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+
+    def _write(self):
+        try:
+            while True:
+                data = self._queue.get()
+                if data is None or self.closed:
+                    break
+                self.sock.sendall(data)
+        except socket.error:
+            pass
+        finally:
+            self.closed = True
+            self.sock.close()
+
+
+class ReplicationServer(object):
+    """
+        A listener of a model sending its events to the clients.
+    """
+    def __init__(self, model, address, call_soon=None, queue_size=10000):
+        """
+            Params:
+                model: the HotContainer to replicate
+                address: a (host, port) to listen on TCP (the port 0 picks a
+                    free one, see self.address), or a Unix socket path
+                call_soon: called as call_soon(func, *args) to run func in
+                    the thread which changes the model (e.g. wx.CallAfter);
+                    the snapshot of a new client is taken there. None takes
+                    it in the accepting thread, which is right only while the
+                    model does not change concurrently.
+                queue_size: the number of the records a client may lag by
+        """
+        self.model = model
+        self.address = address
+        self.call_soon = call_soon
+        self.queue_size = queue_size
+        self.seq = 0
+        self.lock = threading.Lock()
+        self._clients = []
+        self._sock = None
+        self._thread = None
+
+    @property
+    def clients(self):
+        """
+            Returns the number of the connected clients.
+        """
+        with self.lock:
+            return len([i for i in self._clients if not i.closed])
+
+    def start(self):
+        """
+            Starts listening, and sending the events of the model.
+        """
+        self._sock = _socket_for(self.address)
+        if isinstance(self.address, str):
+            if os.path.exists(self.address):
+                os.unlink(self.address)
+        else:
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(self.address)
+        self._sock.listen(16)
+        self.address = self._sock.getsockname()
+        self.model.add_listener(self)
+        self._thread = threading.Thread(target=self._accept)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+            Stops listening and disconnects the clients.
+        """
+        if self in self.model.listeners:
+            self.model.listeners.remove(self)
+        sock = self._sock
+        self._sock = None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            sock.close()
+        with self.lock:
+            for client in self._clients:
+                client.close()
+            self._clients = []
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def __call__(self, model, fqname, event_name, key):
+        if hotjournal.is_derived(model):
+            return
+        (key, payload) = hotjournal.event_delta(model, event_name, key)
+        with self.lock:
+            data = hotjournal.dumps_record((
+                hotjournal.EVENT, self.seq, time.time(),
+                fqname, event_name, key, payload,
+            ))
+            self.seq += 1
+            self._clients = [i for i in self._clients if i.send(data)]
+
+    def _accept(self):
+        while self._sock is not None:
+            try:
+                (sock, dummy) = self._sock.accept()
+            except (socket.error, AttributeError):
+                # closed by stop()
+                return
+            client = _Connection(sock, self.queue_size)
+            if self.call_soon is None:
+                self._add_client(client)
+            else:
+                self.call_soon(self._add_client, client)
+
+    def _add_client(self, client):
+        """
+            Sends the snapshot to the new client, which then gets the events.
+        """
+        with self.lock:
+            snapshot = hotjournal.dumps_record((
+                hotjournal.SNAPSHOT, self.seq, time.time(),
+                hotjournal.model_state(self.model),
+            ))
+            if client.send(MAGIC + snapshot):
+                self._clients.append(client)
+
+
+class ReplicationClient(object):
+    """
+        Keeps a mirror model in sync with the model of a ReplicationServer.
+        The records are applied by process() in the calling thread, or by
+        the thread of start().
+    """
+    def __init__(self, model, address, timeout=10.0):
+        """
+            Params:
+                model: the mirror, a HotContainer of the replicated type
+                address: the address of the server
+                timeout: the seconds to wait for the connection
+        """
+        self.model = model
+        self.seq = None
+        self.connected = False
+        model.set_read_only()
+        # the bytes received, the records before _offset have been read
+        self._buffer = bytearray()
+        self._offset = 0
+        self._thread = None
+        self._sock = _socket_for(address)
+        self._sock.settimeout(timeout)
+        self._sock.connect(address)
+        magic = b""
+        while len(magic) < len(MAGIC):
+            data = self._sock.recv(len(MAGIC) - len(magic))
+            if not data:
+                raise ValueError("The server has closed the connection")
+            magic += data
+        if MAGIC != magic:
+            raise ValueError("Not a replication server: %r" % magic)
+        self._sock.settimeout(None)
+        self.connected = True
+
+    def process(self, timeout=0):
+        """
+            Waits up to timeout seconds (None for ever) for data, and
+            applies all the records received. Returns their number.
+        """
+        if not self.connected:
+            return 0
+        (readable, dummy, dummy) = select.select([self._sock], [], [], timeout)
+        if not readable:
+            return 0
+        records = self._receive()
+        for record in records:
+            self.apply(record)
+        return len(records)
+
+    def start(self, call_soon=None):
+        """
+            Starts a thread receiving the records. They are applied by
+            call_soon(self.apply, record) (e.g. wx.CallAfter, to change the
+            mirror in the GUI thread), or in the thread if None.
+        """
+        def run():
+            while self.connected:
+                for record in self._receive():
+                    if call_soon is None:
+                        self.apply(record)
+                    else:
+                        call_soon(self.apply, record)
+        self._thread = threading.Thread(target=run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def apply(self, record):
+        """
+            Applies a snapshot or an event record to the mirror.
+        """
+        self.model.set_read_only(False)
+        try:
+            if hotjournal.SNAPSHOT == record[0]:
+                hotjournal.restore_state(self.model, record[3])
+                self.seq = record[1] - 1
+            else:
+                (dummy, seq, dummy, fqname, event_name, key, payload) = record
+                hotjournal.apply_event(
+                    self.model, fqname, event_name, key, payload,
+                )
+                self.seq = seq
+        finally:
+            self.model.set_read_only()
+
+    def close(self):
+        self.connected = False
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self._sock.close()
+
+    def _receive(self):
+        """
+            Reads from the socket, returns the complete records read.
+        """
+        try:
+            data = self._sock.recv(65536)
+        except socket.error:
+            data = b""
+        if not data:
+            self.connected = False
+            return []
+        buf = self._buffer
+        buf.extend(data)
+        records = []
+        pos = self._offset
+        header_size = hotjournal.HEADER.size
+        while len(buf) - pos >= header_size:
+            (codec, length) = hotjournal.HEADER.unpack_from(buf, pos)
+            if len(buf) - pos - header_size < length:
+                break
+            pos += header_size
+            records.append(
+                hotjournal.loads_record(
+                    codec, bytes(buf[pos:pos + length]), restricted=True,
+                ),
+            )
+            pos += length
+        # drops the records read once they are most of the buffer, so that
+        # a long record is not copied for each of its chunks
+        if pos * 2 >= len(buf):
+            del buf[:pos]
+            pos = 0
+        self._offset = pos
+        return records
@@ -0,0 +1,443 @@
+"""
+A shared-memory ring of the events of a HotContainer, for consumers in other
+processes on the same host (Python 3.8+, multiprocessing.shared_memory).
+
+The RingProducer is a listener writing every event of its model to a ring of
+fixed-size records in a shared memory segment; it never waits for the
+consumers. A RingConsumer attached to the segment by its name applies the
+records to its own model (of the same type), which fires the same events.
+
+The segment holds:
+    - the header: the sizes, the number of the records written, the head of
+      the payload arena, the resync request flag and the producer's pid,
+    - the cursors of the consumers: (pid, the next record to read),
+    - the records: (seq, fqname id, event code, key kind, key, payload
+      offset, payload length, seq). The fqname id is the index of the hot
+      property in hotmodel.hot_property_names(model). Integer keys are in
+      the record, the others in the payload.
+    - the payload arena, a byte ring of the hotjournal encoded payloads,
+    - the snapshot of the model, written at the start and on request.
+
+A record is valid when its first and last seq are the one expected: the
+producer writes the first one, the body and then the last one, the consumer
+reads them in the opposite order. A payload is valid if the arena head has
+not passed it by more than the arena size after it has been copied. When a
+consumer falls behind by more than the ring (an overrun), it asks for a
+snapshot, restores it, and continues from there.
+
+A payload larger than the arena is not written: the record is a gap, after
+which the producer writes a snapshot, and the consumers reading the gap
+restore it like after an overrun. A snapshot larger than its area is refused
+when the producer starts; later ones are skipped with a warning, the
+consumers keep the previous one.
+
+Expected use:
+    producer = RingProducer(model)
+    # in another process
+    consumer = RingConsumer(ProductModel(None), producer.name, index=1)
+    while True:
+        consumer.poll()
+"""
+import logging
+import multiprocessing
+import os
+import struct
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python < 3.8
+    shared_memory = None
+
+import hotjournal
+import hotmodel
+
+
+LOGGER = logging.getLogger("hotring")
+
+MAGIC = b"HOTRING1"
+
+# magic, slots, arena size, snapshot size, max consumers, then the counters
+HEADER = struct.Struct("<8sIIII")
+WRITE_SEQ_AT = 24
+ARENA_HEAD_AT = 32
+RESYNC_AT = 40
+PRODUCER_PID_AT = 48
+HEADER_SIZE = 56
+
+COUNTER = struct.Struct("<Q")
+# the pid (0 if unused) and the next seq to read
+CURSOR = struct.Struct("<QQ")
+# seq, body, seq
+RECORD_BODY = struct.Struct("<HBBqQI")
+RECORD_SIZE = COUNTER.size * 2 + RECORD_BODY.size
+# version (odd while written), seq, length
+SNAPSHOT_HEADER = struct.Struct("<QQI4x")
+
+EVENTS = ["reset", "insert", "update", "delete", "move", "permute"]
+EVENT_CODES = dict((name, code) for (code, name) in enumerate(EVENTS))
+# the code of a record whose payload did not fit the arena
+GAP = 255
+
+KEY_NONE = 0
+KEY_INT = 1
+KEY_PAYLOAD = 2
+INT64 = (-2 ** 63, 2 ** 63 - 1)
+
+
+def _require_shared_memory():
+    if shared_memory is None:
+        raise RuntimeError("The ring needs multiprocessing.shared_memory")
+
+
+def _attach(name):
+    """
+        Returns the existing segment, which the process does not own.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    # Before Python 3.13 attaching registers the segment with the resource
+    # tracker, which unlinks it when the process ends. The producer's
+    # process and its forked children share the producer's registration.
+    shm = shared_memory.SharedMemory(name=name)
+    producer_pid = COUNTER.unpack_from(shm.buf, PRODUCER_PID_AT)[0]
+    parent = multiprocessing.parent_process()
+    if producer_pid not in (os.getpid(), parent and parent.pid):
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class _Layout(object):
+    """
+        The offsets of the parts of a segment.
+    """
+    def __init__(self, slots, arena_size, snapshot_size, max_consumers):
+        self.slots = slots
+        self.arena_size = arena_size
+        self.snapshot_size = snapshot_size
+        self.max_consumers = max_consumers
+        self.cursors = HEADER_SIZE
+        self.records = self.cursors + CURSOR.size * max_consumers
+        self.arena = self.records + RECORD_SIZE * slots
+        self.snapshot = self.arena + arena_size
+        self.size = self.snapshot + SNAPSHOT_HEADER.size + snapshot_size
+
+    def record(self, seq):
+        return self.records + RECORD_SIZE * (seq % self.slots)
+
+    def cursor(self, index):
+        return self.cursors + CURSOR.size * index
+
+
+class RingProducer(object):
+    """
+        A listener of a model writing its events to a shared memory ring.
+    """
+    def __init__(self, model, name=None, slots=4096, arena_size=1 << 20,
+                 snapshot_size=1 << 20, max_consumers=16, snapshot_every=None):
+        """
+            Params:
+                model: the HotContainer whose events are written
+                name: the name of the segment, None for a random one
+                slots: the number of the records in the ring
+                arena_size: the bytes of the payload arena
+                snapshot_size: the bytes for the snapshot of the model
+                max_consumers: the number of the consumer cursors
+                snapshot_every: the number of the events between the
+                    snapshots, half of the slots by default, so that a
+                    consumer which overruns finds a usable one
+        """
+        _require_shared_memory()
+        self.model = model
+        self.layout = _Layout(slots, arena_size, snapshot_size, max_consumers)
+        self.shm = shared_memory.SharedMemory(
+            name=name, create=True, size=self.layout.size,
+        )
+        self.buf = self.shm.buf
+        self.buf[:self.layout.arena] = bytes(self.layout.arena)
+        HEADER.pack_into(
+            self.buf, 0,
+            MAGIC, slots, arena_size, snapshot_size, max_consumers,
+        )
+        COUNTER.pack_into(self.buf, PRODUCER_PID_AT, os.getpid())
+        SNAPSHOT_HEADER.pack_into(self.buf, self.layout.snapshot, 0, 0, 0)
+        self.names = hotmodel.hot_property_names(model)
+        self._ids = dict((name, i) for (i, name) in enumerate(self.names))
+        self.snapshot_every = snapshot_every or max(slots // 2, 1)
+        self.seq = 0
+        # the number of the gaps, and of the snapshots which did not fit
+        self.gaps = 0
+        self.skipped_snapshots = 0
+        self._head = 0
+        self._snapshot_seq = 0
+        try:
+            self.snapshot()
+        except ValueError:
+            self.shm.close()
+            self.shm.unlink()
+            raise
+        model.add_listener(self)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def __call__(self, model, fqname, event_name, key):
+        if hotjournal.is_derived(model):
+            return
+        (key, payload) = hotjournal.event_delta(model, event_name, key)
+        if isinstance(key, int) and INT64[0] <= key <= INT64[1] \
+                and not isinstance(key, bool):
+            (key_kind, record_key) = (KEY_INT, key)
+        elif key is None:
+            (key_kind, record_key) = (KEY_NONE, 0)
+        else:
+            (key_kind, record_key) = (KEY_PAYLOAD, 0)
+            payload = (key, payload)
+        (event_code, offset, length) = (EVENT_CODES[event_name], 0, 0)
+        if payload is not None:
+            data = hotjournal.dumps_record(payload)
+            if len(data) > self.layout.arena_size:
+                LOGGER.warning(
+                    "The payload of %s %s needs %d bytes, the arena has %d",
+                    fqname, event_name, len(data), self.layout.arena_size,
+                )
+                self.gaps += 1
+                event_code = GAP
+            else:
+                (offset, length) = self._write_payload(data)
+        position = self.layout.record(self.seq)
+        COUNTER.pack_into(self.buf, position, self.seq)
+        RECORD_BODY.pack_into(
+            self.buf, position + COUNTER.size,
+            self._ids[fqname], event_code, key_kind, record_key,
+            offset, length,
+        )
+        COUNTER.pack_into(
+            self.buf, position + COUNTER.size + RECORD_BODY.size, self.seq,
+        )
+        self.seq += 1
+        COUNTER.pack_into(self.buf, WRITE_SEQ_AT, self.seq)
+        if GAP == event_code or COUNTER.unpack_from(self.buf, RESYNC_AT)[0] \
+                or self.seq - self._snapshot_seq >= self.snapshot_every:
+            COUNTER.pack_into(self.buf, RESYNC_AT, 0)
+            try:
+                self.snapshot()
+            except ValueError as error:
+                # the model listener must not fail, retried when due again
+                LOGGER.warning("%s", error)
+                self.skipped_snapshots += 1
+                self._snapshot_seq = self.seq
+
+    def snapshot(self):
+        """
+            Writes the state of the model, for the consumers which start or
+            have overrun. Raises ValueError if it does not fit.
+        """
+        data = hotjournal.dumps_record(hotjournal.model_state(self.model))
+        if len(data) > self.layout.snapshot_size:
+            raise ValueError(
+                "The snapshot needs %d bytes, the ring has %d"
+                % (len(data), self.layout.snapshot_size),
+            )
+        position = self.layout.snapshot
+        version = COUNTER.unpack_from(self.buf, position)[0]
+        COUNTER.pack_into(self.buf, position, version + 1)
+        start = position + SNAPSHOT_HEADER.size
+        self.buf[start:start + len(data)] = data
+        SNAPSHOT_HEADER.pack_into(
+            self.buf, position, version + 1, self.seq, len(data),
+        )
+        COUNTER.pack_into(self.buf, position, version + 2)
+        self._snapshot_seq = self.seq
+
+    def lags(self):
+        """
+            Returns {consumer index: the number of the records it has not
+            read} of the attached consumers.
+        """
+        ret = {}
+        for index in range(self.layout.max_consumers):
+            (pid, cursor) = CURSOR.unpack_from(
+                self.buf, self.layout.cursor(index),
+            )
+            if pid:
+                ret[index] = self.seq - cursor
+        return ret
+
+    def close(self, unlink=True):
+        """
+            Stops writing, and removes the segment (unless unlink is False).
+        """
+        if self in self.model.listeners:
+            self.model.listeners.remove(self)
+        self.buf = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+    def _write_payload(self, data):
+        """
+            Writes the data to the arena, returns (its offset, length). The
+            head is moved before the data are written, so that the consumers
+            see that the previous data there are gone. The data fit the
+            arena.
+        """
+        length = len(data)
+        arena_size = self.layout.arena_size
+        offset = self._head
+        if offset % arena_size + length > arena_size:
+            # does not wrap, starts over at the beginning
+            offset += arena_size - offset % arena_size
+        self._head = offset + length
+        COUNTER.pack_into(self.buf, ARENA_HEAD_AT, self._head)
+        start = self.layout.arena + offset % arena_size
+        self.buf[start:start + length] = data
+        return (offset, length)
+
+
+class RingConsumer(object):
+    """
+        Applies the events of a RingProducer's ring to a model.
+    """
+    def __init__(self, model, name, index=0):
+        """
+            Params:
+                model: a HotContainer of the producer model's type
+                name: the name of the producer's segment
+                index: the cursor of this consumer, unique among the
+                    consumers of the ring
+        """
+        _require_shared_memory()
+        self.model = model
+        self.shm = _attach(name)
+        self.buf = self.shm.buf
+        (magic, slots, arena_size, snapshot_size, max_consumers) = \
+            HEADER.unpack_from(self.buf, 0)
+        if MAGIC != magic:
+            raise ValueError("%s is not an event ring" % name)
+        if not 0 <= index < max_consumers:
+            raise ValueError("The ring has %d cursors" % max_consumers)
+        self.layout = _Layout(slots, arena_size, snapshot_size, max_consumers)
+        self.index = index
+        self.names = hotmodel.hot_property_names(model)
+        self.cursor = 0
+        # the number of the times the consumer has fallen behind, or read
+        # a gap
+        self.overruns = 0
+        # True until a usable snapshot is restored
+        self._waiting = False
+        # the seq the snapshot must be past, to not read it again
+        self._overrun_seq = -1
+        self._resync()
+
+    def poll(self, limit=None):
+        """
+            Applies the records written since the last call (at most limit
+            of them). Returns the number of the records applied.
+        """
+        if self._waiting and not self._resync():
+            return 0
+        write_seq = COUNTER.unpack_from(self.buf, WRITE_SEQ_AT)[0]
+        if limit is not None:
+            write_seq = min(write_seq, self.cursor + limit)
+        count = 0
+        while self.cursor < write_seq:
+            event = self._read(self.cursor)
+            if event is None:
+                self._overrun()
+                break
+            hotjournal.apply_event(self.model, *event)
+            self.cursor += 1
+            count += 1
+        self._store_cursor()
+        return count
+
+    def close(self):
+        CURSOR.pack_into(self.buf, self.layout.cursor(self.index), 0, 0)
+        self.buf = None
+        self.shm.close()
+
+    def _read(self, seq):
+        """
+            Returns (fqname, event_name, key, payload) of the record, None if
+            it has been overwritten or is a gap.
+        """
+        position = self.layout.record(seq)
+        end = position + COUNTER.size + RECORD_BODY.size
+        if COUNTER.unpack_from(self.buf, end)[0] != seq:
+            return None
+        (fqname_id, event_code, key_kind, key, offset, length) = \
+            RECORD_BODY.unpack_from(self.buf, position + COUNTER.size)
+        if COUNTER.unpack_from(self.buf, position)[0] != seq \
+                or GAP == event_code:
+            return None
+        payload = None
+        if length:
+            start = self.layout.arena + offset % self.layout.arena_size
+            data = bytes(self.buf[start:start + length])
+            head = COUNTER.unpack_from(self.buf, ARENA_HEAD_AT)[0]
+            if head - offset > self.layout.arena_size:
+                return None
+            (codec, size) = hotjournal.HEADER.unpack_from(data)
+            payload = hotjournal.loads_record(
+                codec, data[hotjournal.HEADER.size:],
+            )
+        if KEY_NONE == key_kind:
+            key = None
+        elif KEY_PAYLOAD == key_kind:
+            (key, payload) = payload
+        return (self.names[fqname_id], EVENTS[event_code], key, payload)
+
+    def _overrun(self):
+        self.overruns += 1
+        self._overrun_seq = self.cursor
+        self._resync()
+
+    def _resync(self):
+        """
+            Restores the snapshot if it is past the overrun record and the
+            ring still has the records after it, otherwise asks the producer
+            for a new one. Returns True if restored.
+        """
+        snapshot = self._read_snapshot()
+        write_seq = COUNTER.unpack_from(self.buf, WRITE_SEQ_AT)[0]
+        if snapshot is None or snapshot[0] <= self._overrun_seq \
+                or write_seq - snapshot[0] >= self.layout.slots:
+            COUNTER.pack_into(self.buf, RESYNC_AT, 1)
+            self._waiting = True
+            return False
+        (seq, state) = snapshot
+        hotjournal.restore_state(self.model, state)
+        self.cursor = seq
+        self._waiting = False
+        self._store_cursor()
+        return True
+
+    def _read_snapshot(self):
+        """
+            Returns (seq, state) of the snapshot, None if it is being
+            written.
+        """
+        position = self.layout.snapshot
+        (version, seq, length) = SNAPSHOT_HEADER.unpack_from(
+            self.buf, position,
+        )
+        if version % 2:
+            return None
+        start = position + SNAPSHOT_HEADER.size
+        data = bytes(self.buf[start:start + length])
+        if COUNTER.unpack_from(self.buf, position)[0] != version:
+            return None
+        (codec, size) = hotjournal.HEADER.unpack_from(data)
+        return (seq, hotjournal.loads_record(
+            codec, data[hotjournal.HEADER.size:],
+        ))
+
+    def _store_cursor(self):
+        CURSOR.pack_into(
+            self.buf, self.layout.cursor(self.index), os.getpid(), self.cursor,
+        )
@@ -0,0 +1,377 @@
+"""
+A compact binary snapshot of a HotContainer, loaded through mmap.
+
+save() writes the hot properties of a model to a file. The HotLists,
+HotDicts and HotSets are stored column-packed: a TypedHotList of
+namedtuples as one column per field, the other containees as a column of
+items (and one of values for a HotDict). A column of ints, floats, texts or
+datetimes is packed natively, any other column is marshalled (or pickled)
+item by item.
+
+load() maps the file into memory and assigns the properties; the lists and
+dicts keep reading their items from the mapped file, decoding an item on
+access. The first change of a containee copies its data into memory (like
+the copy-on-write of the snapshots). The indexes of a TypedHotList and the
+keys of a SortedHotList are built on their first use, which decodes the
+items.
+
+A DerivedHotList (a live view) is not stored, it is derived from its source
+again: the views held by the hot properties follow the loaded containees
+which replace their sources, firing "reset".
+
+Layout:
+    MAGIC | columns and values | directory | directory offset, MAGIC
+"""
+import datetime
+import marshal
+import mmap
+import pickle
+import struct
+
+import hotmodel
+
+
+MAGIC = b"HOTS\x01"
+
+FOOTER = struct.Struct("<Q5s")
+OFFSET = struct.Struct("<Q")
+
+# The column kinds and their fixed-size item formats.
+INT = "i"
+FLOAT = "f"
+TEXT = "s"
+DATETIME = "t"
+MARSHAL = "m"
+PICKLE = "p"
+
+FIXED = {
+    INT: struct.Struct("<q"),
+    FLOAT: struct.Struct("<d"),
+    DATETIME: struct.Struct("<q"),
+}
+
+EPOCH = datetime.datetime(1970, 1, 1)
+INT_TYPES = (type(0), type(2 ** 64))
+TEXT_TYPE = type(u"")
+
+
+def _column_kind(values):
+    """
+        Returns the most compact column kind for all the values.
+    """
+    if not values:
+        return MARSHAL
+    types = set(type(i) for i in values)
+    if types <= set(INT_TYPES) \
+            and -2 ** 63 <= min(values) and max(values) < 2 ** 63:
+        return INT
+    if types == set([float]):
+        return FLOAT
+    if types == set([TEXT_TYPE]):
+        return TEXT
+    if types == set([datetime.datetime]) \
+            and all(i.tzinfo is None for i in values):
+        return DATETIME
+    try:
+        marshal.dumps(values, 2)
+        return MARSHAL
+    except ValueError:
+        return PICKLE
+
+
+def _encode_column(values):
+    """
+        Returns (kind, bytes) of the column.
+    """
+    kind = _column_kind(values)
+    if INT == kind or FLOAT == kind:
+        return (kind, struct.pack("<%d%s" % (
+            len(values), "q" if INT == kind else "d",
+        ), *values))
+    if DATETIME == kind:
+        return (kind, struct.pack("<%dq" % len(values), *[
+            ((i - EPOCH).days * 86400 + (i - EPOCH).seconds) * 1000000
+            + i.microsecond
+            for i in values
+        ]))
+    if TEXT == kind:
+        items = [i.encode("utf-8") for i in values]
+    elif MARSHAL == kind:
+        items = [marshal.dumps(i, 2) for i in values]
+    else:
+        items = [pickle.dumps(i, 2) for i in values]
+    offsets = [0]
+    for i in items:
+        offsets.append(offsets[-1] + len(i))
+    return (
+        kind,
+        struct.pack("<%dQ" % len(offsets), *offsets) + b"".join(items),
+    )
+
+
+class _Column(object):
+    """
+        A column of count items in the buffer (the mapped file) at offset.
+    """
+    def __init__(self, buf, kind, offset, count):
+        self.buf = buf
+        self.kind = kind
+        self.offset = offset
+        self.count = count
+        self._fixed = FIXED.get(kind)
+        if self._fixed is None:
+            self._blob = offset + (count + 1) * OFFSET.size
+            self._decode = {
+                TEXT: lambda b: b.decode("utf-8"),
+                MARSHAL: marshal.loads,
+                PICKLE: pickle.loads,
+            }[kind]
+
+    def __getitem__(self, index):
+        if self._fixed is not None:
+            value = self._fixed.unpack_from(
+                self.buf, self.offset + self._fixed.size * index,
+            )[0]
+            if DATETIME == self.kind:
+                value = EPOCH + datetime.timedelta(microseconds=value)
+            return value
+        (start, end) = struct.unpack_from(
+            "<2Q", self.buf, self.offset + OFFSET.size * index,
+        )
+        return self._decode(self.buf[self._blob + start:self._blob + end])
+
+
+class LazyRows(object):
+    """
+        A read-only sequence decoding its items from columns on access. The
+        items are either the items of a single column, or made by the
+        factory (a namedtuple type) from the items of the columns.
+    """
+    def __init__(self, columns, count, factory=None):
+        self._columns = columns
+        self._count = count
+        self._factory = factory
+
+    def __len__(self):
+        return self._count
+
+    def _get(self, index):
+        if self._factory is None:
+            return self._columns[0][index]
+        return self._factory(*[c[index] for c in self._columns])
+
+    def __getitem__(self, key):
+        if type(key) is slice:
+            return [self._get(i) for i in range(*key.indices(self._count))]
+        if key < 0:
+            key += self._count
+        if not 0 <= key < self._count:
+            raise IndexError("list index out of range")
+        return self._get(key)
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self._get(i)
+
+    def index(self, value):
+        for (i, item) in enumerate(self):
+            if item == value:
+                return i
+        raise ValueError("%r is not in list" % (value, ))
+
+    def count(self, value):
+        return sum(1 for i in self if i == value)
+
+    def __str__(self):
+        return str(list(self))
+
+
+class LazyMapping(object):
+    """
+        A read-only mapping decoding its values from a column on access. The
+        keys are decoded (into a dict of their positions) on the first use.
+    """
+    def __init__(self, keys, values, count):
+        self._keys = LazyRows([keys], count)
+        self._values = LazyRows([values], count)
+        self._positions = None
+
+    def _get_positions(self):
+        if self._positions is None:
+            self._positions = dict((k, i) for (i, k) in enumerate(self._keys))
+        return self._positions
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __contains__(self, key):
+        return key in self._get_positions()
+
+    def __getitem__(self, key):
+        return self._values[self._get_positions()[key]]
+
+    def get(self, key, default=None):
+        pos = self._get_positions().get(key)
+        return default if pos is None else self._values[pos]
+
+    def keys(self):
+        return list(self._keys)
+
+    def values(self):
+        return list(self._values)
+
+    def items(self):
+        return list(zip(self._keys, self._values))
+
+    def __str__(self):
+        return str(dict(self.items()))
+
+
+def _row_type(containee):
+    """
+        Returns the namedtuple type of the items of a TypedHotList, or None.
+    """
+    row_type = getattr(containee, "type_constraint", None)
+    if isinstance(row_type, type) and issubclass(row_type, tuple) \
+            and hasattr(row_type, "_fields"):
+        return row_type
+    return None
+
+
+class _Writer(object):
+    def __init__(self, f):
+        self.f = f
+        self.offset = len(MAGIC)
+
+    def write(self, data):
+        offset = self.offset
+        self.f.write(data)
+        self.offset += len(data)
+        return offset
+
+    def column(self, values):
+        (kind, data) = _encode_column(values)
+        return (kind, self.write(data))
+
+
+def save(model, path):
+    """
+        Writes the hot properties of the model to the file.
+    """
+    directory = []
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        writer = _Writer(f)
+        for name in hotmodel.hot_property_names(model):
+            value = getattr(model, name)
+            if isinstance(value, hotmodel.DerivedHotList):
+                continue
+            if isinstance(value, hotmodel.HotList):
+                rows = list(value.data)
+                row_type = _row_type(value)
+                if row_type is None:
+                    columns = [writer.column(rows)]
+                    fields = None
+                else:
+                    columns = [writer.column(list(i)) for i in zip(*rows)] \
+                        or [writer.column([]) for i in row_type._fields]
+                    fields = tuple(row_type._fields)
+                directory.append((name, "list", len(rows), fields, columns))
+            elif isinstance(value, hotmodel.HotDict):
+                items = list(value.data.items())
+                columns = [
+                    writer.column([k for (k, v) in items]),
+                    writer.column([v for (k, v) in items]),
+                ]
+                directory.append((name, "dict", len(items), None, columns))
+            elif isinstance(value, hotmodel.HotSet):
+                items = list(value.data)
+                directory.append(
+                    (name, "set", len(items), None, [writer.column(items)]),
+                )
+            else:
+                (kind, data) = _encode_column([value])
+                directory.append(
+                    (name, "value", 1, None, [(kind, writer.write(data))]),
+                )
+        offset = writer.write(marshal.dumps(directory, 2))
+        f.write(FOOTER.pack(offset, MAGIC))
+
+
+def _empty_containee(model, name, kind):
+    """
+        Returns a new empty containee for the hot property of the model.
+    """
+    descriptor = getattr(type(model), name)
+    current = getattr(model, name)
+    if isinstance(descriptor, hotmodel.HotTypedProperty):
+        klass = descriptor.target_type
+    elif isinstance(current, hotmodel.HotContainee):
+        klass = type(current)
+    else:
+        klass = {
+            "list": hotmodel.HotList,
+            "dict": hotmodel.HotDict,
+            "set": hotmodel.HotSet,
+        }[kind]
+    if klass.__init__ is hotmodel.TypedHotList.__init__:
+        return klass(current.type_constraint, name=name, container=model)
+    return klass(name=name, container=model)
+
+
+def _attach(containee, data):
+    """
+        Makes the (lazy) data the data of the containee, shared, so that they
+        are copied on the first change.
+    """
+    containee.data = data
+    containee._shared = True
+    if isinstance(containee, hotmodel.TypedHotList):
+        containee._invalidate_indexes()
+    if isinstance(containee, hotmodel.SortedHotList):
+        containee._invalidate_keys()
+
+
+def load(path, model):
+    """
+        Maps the file into memory and assigns the hot properties of the model.
+        Each assignment fires "reset".
+    """
+    with open(path, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if buf[:len(MAGIC)] != MAGIC:
+        raise ValueError("%s is not a hot store" % path)
+    (offset, magic) = FOOTER.unpack_from(buf, len(buf) - FOOTER.size)
+    if magic != MAGIC:
+        raise ValueError("%s is truncated" % path)
+    directory = marshal.loads(buf[offset:len(buf) - FOOTER.size])
+    replaced = {}
+    for (name, kind, count, fields, columns) in directory:
+        columns = [
+            _Column(buf, col_kind, col_offset, count)
+            for (col_kind, col_offset) in columns
+        ]
+        if "value" == kind:
+            setattr(model, name, columns[0][0])
+            continue
+        containee = _empty_containee(model, name, kind)
+        if "list" == kind:
+            row_type = None
+            if fields is not None:
+                row_type = _row_type(containee)
+                if row_type is None or tuple(row_type._fields) != fields:
+                    raise ValueError(
+                        "The fields of %s do not match %s" % (name, fields),
+                    )
+            _attach(containee, LazyRows(columns, count, row_type))
+        elif "dict" == kind:
+            _attach(containee, LazyMapping(columns[0], columns[1], count))
+        else:
+            containee.data = set(LazyRows(columns, count))
+        old = getattr(model, name)
+        replaced[id(old)] = (old, containee)
+        setattr(model, name, containee)
+    hotmodel.rebind_views(model, replaced)
@@ -0,0 +1,211 @@
+"""
+Undo/redo of the changes of a HotContainer and its containees.
+"""
+import contextlib
+import itertools
+import sys
+
+import hotmodel
+
+
+# the number of the items whose mean size stands for all the items
+SAMPLE_SIZE = 16
+
+
+def _estimate_size(value):
+    """
+        Estimates the memory held by a recorded value: the object itself and,
+        for containers, their (shallow) items, estimated from a sample. A
+        containee (e.g. the old value of a HotTypedProperty) is counted by
+        its data. Other objects (e.g. a PersistentMap, which shares most of
+        its structure with the current version) count only themselves.
+    """
+    if isinstance(value, hotmodel.HotContainee):
+        value = value.data
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        sample = [
+            sys.getsizeof(k) + sys.getsizeof(v)
+            for (k, v) in itertools.islice(value.items(), SAMPLE_SIZE)
+        ]
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        sample = [
+            sys.getsizeof(i) for i in itertools.islice(value, SAMPLE_SIZE)
+        ]
+    else:
+        return size
+    if sample:
+        size += len(value) * sum(sample) // len(sample)
+    return size
+
+
+class Transaction(object):
+    """
+        A user-level group of changes. Keeps the calls which revert the
+        changes, in the order in which the changes were made.
+    """
+    def __init__(self, label=None):
+        self.label = label
+        self.calls = []
+        self.size = 0
+
+    def add(self, target, method, args):
+        self.calls.append((target, method, args))
+        self.size += sum(_estimate_size(i) for i in args) + 64
+
+    def revert(self):
+        for (target, method, args) in reversed(self.calls):
+            getattr(target, method)(*args)
+
+
+class UndoManager(hotmodel.HotContainer):
+    """
+        Records the changes of a model (a HotContainer): for each change the
+        hot property, HotList, HotDict or HotSet records the call which
+        reverts it, with the old values of the touched items only. The
+        changes are grouped into transactions; undo() reverts the last one,
+        redo() makes it again. The history is limited by its estimated size
+        in bytes; the oldest transactions are forgotten first.
+
+        undo_count and redo_count are hot properties, so that the views can
+        enable their undo/redo commands.
+
+        Expected use:
+            undo = UndoManager(model)
+            with undo.transaction("Next product"):
+                model.set_product(...)
+            undo.undo()
+    """
+    undo_count = hotmodel.HotProperty()
+    redo_count = hotmodel.HotProperty()
+
+    def __init__(self, model, max_bytes=1024 * 1024):
+        super(UndoManager, self).__init__()
+        self.model = model
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._undo_stack = []
+        self._redo_stack = []
+        self._current = None
+        self._depth = 0
+        self._reverting = False
+        self._publish()
+        model._undo = self
+
+    def detach(self):
+        """
+            Stops recording the changes of the model.
+        """
+        self.model._undo = None
+
+    @contextlib.contextmanager
+    def transaction(self, label=None):
+        """
+            Groups the changes made within the with block into a single
+            transaction. Nested transactions join the outer one. The changes
+            made outside of any transaction are transactions on their own.
+        """
+        if 0 == self._depth:
+            self._current = Transaction(label)
+        self._depth += 1
+        try:
+            yield self._current
+        finally:
+            self._depth -= 1
+            if 0 == self._depth:
+                transaction = self._current
+                self._current = None
+                if transaction.calls:
+                    self._push(transaction)
+
+    def record(self, target, method, *args):
+        """
+            Called by the model before a change, with the call (the method
+            of the target and its args) which reverts the change.
+        """
+        if self._current is not None:
+            self._current.add(target, method, args)
+            return
+        transaction = Transaction()
+        transaction.add(target, method, args)
+        self._push(transaction)
+
+    def _push(self, transaction):
+        if self._reverting:
+            # reverting a transaction records the calls which make it again
+            self._reverted = transaction
+            return
+        self._undo_stack.append(transaction)
+        self.size += transaction.size
+        for i in self._redo_stack:
+            self.size -= i.size
+        self._redo_stack = []
+        self._trim()
+        self._publish()
+
+    def _trim(self):
+        """
+            Forgets the oldest transactions until the history fits into
+            max_bytes. Keeps at least the last transaction.
+        """
+        while self.size > self.max_bytes and len(self._undo_stack) > 1:
+            self.size -= self._undo_stack.pop(0).size
+
+    def _revert(self, transaction):
+        """
+            Reverts the transaction, returns the transaction which makes the
+            changes again.
+        """
+        self._reverting = True
+        self._reverted = None
+        try:
+            with self.transaction(transaction.label):
+                transaction.revert()
+        finally:
+            self._reverting = False
+        reverted = self._reverted
+        self._reverted = None
+        if reverted is None:
+            reverted = Transaction(transaction.label)
+        self.size += reverted.size - transaction.size
+        return reverted
+
+    def undo(self):
+        """
+            Reverts the last transaction. Returns its label.
+        """
+        assert 0 == self._depth, "Cannot undo within a transaction"
+        if not self._undo_stack:
+            raise IndexError("Nothing to undo")
+        transaction = self._undo_stack.pop()
+        self._redo_stack.append(self._revert(transaction))
+        self._publish()
+        return transaction.label
+
+    def redo(self):
+        """
+            Makes the last undone transaction again. Returns its label.
+        """
+        assert 0 == self._depth, "Cannot redo within a transaction"
+        if not self._redo_stack:
+            raise IndexError("Nothing to redo")
+        transaction = self._redo_stack.pop()
+        self._undo_stack.append(self._revert(transaction))
+        self._trim()
+        self._publish()
+        return transaction.label
+
+    def clear(self):
+        """
+            Forgets the whole history.
+        """
+        self._undo_stack = []
+        self._redo_stack = []
+        self.size = 0
+        self._publish()
+
+    def _publish(self):
+        if self.undo_count != len(self._undo_stack):
+            self.undo_count = len(self._undo_stack)
+        if self.redo_count != len(self._redo_stack):
+            self.redo_count = len(self._redo_stack)
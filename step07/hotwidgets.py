@@ -1,10 +1,55 @@
 """
 Widgets handling events from hotmodel objects.
 """
-import wx
+import bisect
 
+import hotmodel
 
-class MVCList(wx.ListView):
+
+# imported by the first widget created, see LazyWidget
+wx = None
+
+
+def import_toolkit():
+    """
+        Returns the wx module, importing it on the first call.
+    """
+    global wx
+    if wx is None:
+        import wx as toolkit
+        wx = toolkit
+    return wx
+
+
+class LazyWidget(object):
+    """
+        The base of the widgets, so that importing this module does not
+        import wx: a widget class derives from its wx base class (named by
+        wx_base) only when first instantiated, by creating (once) a subclass
+        of both, whose instance is returned. The instances are wx windows,
+        but issubclass(MVCList, wx.ListView) is False.
+    """
+    wx_base = "ListView"
+
+    def __new__(cls, *args, **kwargs):
+        try:
+            wx_class = cls.__dict__["_wx_class"]
+        except KeyError:
+            wx_class = cls._wx_class = type(
+                cls.__name__,
+                (cls, getattr(import_toolkit(), cls.wx_base)),
+                {
+                    "_wx_class": None,
+                    "__doc__": cls.__doc__,
+                    "__module__": cls.__module__,
+                },
+            )
+        if wx_class is None:
+            wx_class = cls
+        return super(LazyWidget, wx_class).__new__(wx_class)
+
+
+class MVCList(LazyWidget):
     """
         A list that takes a list of column names as a parameter. The value
         updates are not set directly, instead the view responds to event
@@ -44,6 +89,20 @@ class MVCList(wx.ListView):
         mapper.add_route(fqname, "update", self.handle_update,)
         mapper.add_route(fqname, "insert", self.handle_insert,)
         mapper.add_route(fqname, "delete", self.handle_delete,)
+        mapper.add_route(fqname, "move", self.handle_move,)
+        mapper.add_route(fqname, "permute", self.handle_permute,)
+
+    def bind(self, hotlist):
+        """
+            Listen directly to the hotlist (e.g. a HotList.filtered view),
+            which does not have to be a part of any container. Fills the
+            list with the hotlist's current content.
+        """
+        mapper = hotmodel.Mapper()
+        self.add_routes(mapper, "")
+        hotlist.add_listener(mapper)
+        self.handle_reset(hotlist, None, "reset", None)
+        return mapper
 
     def handle_reset(self, model, fqname, event_name, key):
         """
@@ -71,6 +130,28 @@ class MVCList(wx.ListView):
         """
         self.DeleteItem(key)
 
+    def handle_move(self, model, fqname, event_name, key):
+        """
+            The item on the position key[0] moved to key[1] (and maybe
+            changed).
+        """
+        (src, dst) = key
+        self.DeleteItem(src)
+        self.add_item(dst, model[dst])
+
+    def handle_permute(self, model, fqname, event_name, key):
+        """
+            Reorder the rows, so that the i-th row is the one which was on the
+            position key[i]. The rows are sorted natively, their texts are not
+            formatted again.
+        """
+        new_position = [0] * len(key)
+        for (new, old) in enumerate(key):
+            new_position[old] = new
+        for (row, position) in enumerate(new_position):
+            self.SetItemData(row, position)
+        self.SortItems(lambda a, b: (a > b) - (a < b))
+
     def add_item(self, index, data):
         """
             Inserts an item at the desired position.
@@ -87,7 +168,7 @@ class MVCList(wx.ListView):
             self.SetStringItem(index, i, str(data[i]))
 
 
-class MVCDict(wx.ListView):
+class MVCDict(LazyWidget):
     """
         A table view that shows content of an underlying HotDict. The value
         updates are not set directly, instead the view responds to event
@@ -179,3 +260,90 @@ class MVCDict(wx.ListView):
     def DeleteAllItems(self):
         super(MVCDict, self).DeleteAllItems()
         self.data_mapping[:] = []
+
+
+class MVCSet(LazyWidget):
+    """
+        A list that shows the sorted elements of an underlying HotSet, one
+        per row. The set's "insert" and "delete" events carry frozensets of
+        the elements; only their rows are inserted or deleted.
+    """
+    def __init__(self, parent, id, style, columns,):
+        """
+            Set up the list with a list of columns (the first one shows the
+            element, the following ones the members of a tuple element).
+        Params:
+            parent  The parent window
+            id      The window id
+            style   As this is a "report" style view, you should probably
+                    specify at least LC_REPORT
+            columns A list of column names.
+        """
+        super(MVCSet, self).__init__(parent, id, style=style,)
+        self.columns = columns
+        self.column_mapping = {}
+        for (idx, column_info) in enumerate(columns):
+            self.InsertColumn(idx, column_info[1])
+            self.column_mapping[column_info[0]] = idx
+        self.data_mapping = []
+
+    def add_routes(self, mapper, fqname):
+        """
+            Map the events to this view.
+        Params:
+            mapper      The Mapper object the routes are added to.
+            fqname      The routes are added under this fqname.
+        """
+        mapper.add_route(fqname, "reset", self.handle_reset,)
+        mapper.add_route(fqname, "insert", self.handle_insert,)
+        mapper.add_route(fqname, "delete", self.handle_delete,)
+
+    def bind(self, hotset):
+        """
+            Listen directly to the hotset, which does not have to be a part
+            of any container. Fills the list with the set's current content.
+        """
+        mapper = hotmodel.Mapper()
+        self.add_routes(mapper, "")
+        hotset.add_listener(mapper)
+        self.handle_reset(hotset, None, "reset", None)
+        return mapper
+
+    def handle_reset(self, model, fqname, event_name, key):
+        """
+            Rebuild the list's contents.
+        """
+        self.DeleteAllItems()
+        for element in sorted(model):
+            self.add_item(element)
+
+    def handle_insert(self, model, fqname, event_name, key):
+        """
+            Insert the added elements to their sorted positions.
+        """
+        for element in sorted(key):
+            self.add_item(element)
+
+    def handle_delete(self, model, fqname, event_name, key):
+        """
+            Delete the rows of the removed elements.
+        """
+        for element in key:
+            index = bisect.bisect_left(self.data_mapping, element)
+            del self.data_mapping[index]
+            self.DeleteItem(index)
+
+    def add_item(self, element):
+        """
+            Inserts the element at its sorted position.
+        """
+        index = bisect.bisect_left(self.data_mapping, element)
+        self.data_mapping.insert(index, element)
+        data = element if isinstance(element, tuple) else (element, )
+        self.InsertStringItem(index, str(data[0]))
+        for i in range(1, len(data)):
+            self.SetStringItem(index, i, str(data[i]))
+
+    def DeleteAllItems(self):
+        super(MVCSet, self).DeleteAllItems()
+        self.data_mapping[:] = []
@@ -1,8 +1,15 @@
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
 import datetime
 import logging
 import random
 import sys
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 import hotmodel
 
@@ -21,6 +28,8 @@ class ProcessList(hotmodel.TypedHotList):
     """
         A hot list that can have only ProcessOperation assigned as members
     """
+    hash_indexes = ("operation", )
+
     def __init__(self, init_iterable=None, name=None, container=None):
         super(ProcessList, self).__init__(
             ProcessOperation, init_iterable,
@@ -31,6 +40,9 @@ class OperationsList(hotmodel.TypedHotList):
     """
         A hot list that can have only ProductOperation assigned as members
     """
+    hash_indexes = ("operation", "workplace", )
+    sorted_indexes = ("tm", )
+
     def __init__(self, init_iterable=None, name=None, container=None):
         super(OperationsList, self).__init__(
             ProductOperation, init_iterable,
@@ -76,18 +88,37 @@ class Server(object):
             dt0 += datetime.timedelta(0, random.randint(10, 14400))
         return ret
 
+    def get_products_ops(self, products):
+        """
+            Returns the lists of the operations done of the (article,
+            serial_num) products, in one call.
+        """
+        return [self.get_product_ops(*i) for i in products]
+
+    def article_class(self, article):
+        """
+            Returns the key of the article's family: the articles of a
+            family have the same process.
+        """
+        if article[-1] in ("0", "1", "2", "3", ):
+            return "SMT2"
+        if article[-1] in ("4", "5", "6", ):
+            return "SMT1-THT"
+        return "SMT1-THT-SEL"
+
     def get_process(self, article, dummy_sn):
         """
             Returns a list of operations (operation number, act) for this
             article/sn. For the articles ending with an even number, returns
             one set of operations, another set for all of the rest.
         """
-        if article[-1] in ("0", "1", "2", "3", ):
+        article_class = self.article_class(article)
+        if "SMT2" == article_class:
             return [ # SMT both sides
                 ProcessOperation(op*10, self.ACTS[act])
                 for (op, act) in enumerate((0, 1, 2, 3, 1, 3,))
             ]
-        if article[-1] in ("4", "5", "6", ):
+        if "SMT1-THT" == article_class:
             return [ # SMT one side and THT
                 ProcessOperation(op*10, self.ACTS[act])
                 for (op, act) in enumerate((0, 1, 3, 4, 7, 5, 8, 5,))
@@ -98,6 +129,368 @@ class Server(object):
         ]
 
 
+class _Pending(object):
+    """
+        The result of a server call, which the requesting threads wait for.
+    """
+    def __init__(self):
+        self._event = threading.Event()
+        self.result = None
+        self.error = None
+
+    def set(self, result, error=None):
+        self.result = result
+        self.error = error
+        self._event.set()
+
+    def wait(self):
+        self._event.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class ServerClient(object):
+    """
+        A client in front of a Server, with the same methods:
+            - the processes are cached by the article class (see
+              Server.article_class),
+            - the concurrent requests for the same process, or the same
+              product's operations, share one server call,
+            - the requests for the operations made while a call is running
+              (and within window seconds, if given) are sent as one
+              Server.get_products_ops call,
+            - get_product fetches the process and the operations
+              concurrently, on a worker thread.
+        The client can be used from many threads.
+    """
+    def __init__(self, server, window=0, workers=2):
+        """
+            Params:
+                server: a Server
+                window: the seconds the first request of a batch waits for
+                    the others, 0 to send it at once
+                workers: the number of the threads fetching the operations
+                    for get_product
+        """
+        self.server = server
+        self.window = window
+        self._lock = threading.Lock()
+        self._processes = {}
+        self._process_pending = {}
+        self._ops_pending = {}
+        self._batch = []
+        # True while a thread sends the batches
+        self._flushing = False
+        self._queue = queue.Queue()
+        self.stats = {
+            "process_calls": 0,
+            "process_hits": 0,
+            "ops_calls": 0,
+            "ops_requests": 0,
+            "coalesced": 0,
+        }
+        self._workers = []
+        for dummy in range(workers):
+            worker = threading.Thread(target=self._work)
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def get_process(self, article, serial_num):
+        """
+            Returns the process of the article's class, from the cache if
+            possible.
+        """
+        key = self.server.article_class(article)
+        with self._lock:
+            if key in self._processes:
+                self.stats["process_hits"] += 1
+                return list(self._processes[key])
+            pending = self._process_pending.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._process_pending[key] = _Pending()
+                self.stats["process_calls"] += 1
+            else:
+                self.stats["coalesced"] += 1
+        if owner:
+            (result, error) = (None, None)
+            try:
+                result = self.server.get_process(article, serial_num)
+            except Exception as e:
+                error = e
+            with self._lock:
+                del self._process_pending[key]
+                if error is None:
+                    self._processes[key] = result
+            pending.set(result, error)
+        return list(pending.wait())
+
+    def get_product_ops(self, article, serial_num):
+        """
+            Returns the operations done of the product. A request when no
+            call is running waits for the window, then makes the call for
+            the batch, and the next ones for the requests made meanwhile.
+        """
+        key = (article, serial_num)
+        with self._lock:
+            self.stats["ops_requests"] += 1
+            pending = self._ops_pending.get(key)
+            leader = False
+            if pending is None:
+                pending = self._ops_pending[key] = _Pending()
+                self._batch.append(key)
+                leader = not self._flushing
+                self._flushing = True
+            else:
+                self.stats["coalesced"] += 1
+        if leader:
+            if self.window:
+                time.sleep(self.window)
+            self._flush()
+        return pending.wait()
+
+    def get_product(self, article, serial_num):
+        """
+            Returns (the process, the operations done) of the product,
+            fetched concurrently.
+        """
+        ops = _Pending()
+        self._queue.put((ops, (article, serial_num)))
+        process = self.get_process(article, serial_num)
+        return (process, ops.wait())
+
+    def invalidate(self):
+        """
+            Forgets the cached processes.
+        """
+        with self._lock:
+            self._processes.clear()
+
+    def close(self):
+        """
+            Stops the worker threads.
+        """
+        for dummy in self._workers:
+            self._queue.put(None)
+        self._workers = []
+
+    def _flush(self):
+        """
+            Sends the batches until none is left.
+        """
+        while True:
+            with self._lock:
+                (keys, self._batch) = (self._batch, [])
+                if not keys:
+                    self._flushing = False
+                    return
+                self.stats["ops_calls"] += 1
+            self._run_batch(keys)
+
+    def _run_batch(self, keys):
+        (results, error) = ([None] * len(keys), None)
+        try:
+            if hasattr(self.server, "get_products_ops"):
+                results = list(self.server.get_products_ops(keys))
+            else:
+                results = [self.server.get_product_ops(*i) for i in keys]
+        except Exception as e:
+            error = e
+        with self._lock:
+            pendings = [self._ops_pending.pop(key) for key in keys]
+        for (i, pending) in enumerate(pendings):
+            if i < len(results):
+                pending.set(results[i], error)
+            else:
+                pending.set(None, error or LookupError(
+                    "The server returned no operations of %s %s" % keys[i],
+                ))
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            (pending, key) = item
+            try:
+                result = self.get_product_ops(*key)
+            except Exception as e:
+                pending.set(None, e)
+            else:
+                pending.set(result)
+
+
+def predict_next(article, serial_num, depth):
+    """
+        Returns the products expected to follow: the next serial numbers of
+        the same article.
+    """
+    try:
+        return [(article, serial_num + i) for i in range(1, depth + 1)]
+    except TypeError:
+        return []
+
+
+class Prefetcher(object):
+    """
+        A server (see ServerClient) which loads the products predicted to
+        follow the requested one in the background, so that set_product of
+        the predicted product needs no server call. The results are kept in
+        a bounded cache for at most max_age seconds (the operations done
+        change).
+
+        stats() reports the hit rate and the latency saved.
+    """
+    def __init__(self, server, depth=1, workers=2, cache_size=16,
+                 max_age=30.0, predict=predict_next, clock=time.time):
+        """
+            Params:
+                server: a Server, or a ServerClient
+                depth: the number of the products to prefetch
+                workers: the number of the prefetching threads
+                cache_size: the number of the results kept
+                max_age: the seconds a result is used for
+                predict: predict(article, serial_num, depth) returns the
+                    (article, serial_num) to prefetch
+                clock: returns the time in seconds
+        """
+        self.server = server
+        self.depth = depth
+        self.cache_size = cache_size
+        self.max_age = max_age
+        self.predict = predict
+        self.clock = clock
+        self._lock = threading.Lock()
+        # (article, serial_num): (_Pending of (process, ops), the time the
+        # prefetch was started), the least recently used first
+        self._cache = OrderedDict()
+        self._queue = queue.Queue()
+        self.requests = 0
+        self.hits = 0
+        self.saved = 0.0
+        self.miss_seconds = 0.0
+        self._workers = []
+        for dummy in range(workers):
+            worker = threading.Thread(target=self._work)
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def get_process(self, article, serial_num):
+        return self.server.get_process(article, serial_num)
+
+    def get_product_ops(self, article, serial_num):
+        return self.server.get_product_ops(article, serial_num)
+
+    def get_product(self, article, serial_num):
+        """
+            Returns (the process, the operations done) of the product, the
+            prefetched ones if possible, and starts prefetching the next
+            products.
+        """
+        key = (article, serial_num)
+        started = self.clock()
+        with self._lock:
+            self.requests += 1
+            entry = self._cache.pop(key, None)
+        result = None
+        if entry is not None and started - entry[1] <= self.max_age:
+            try:
+                result = entry[0].wait()
+            except Exception:
+                # a failed prefetch is retried as a miss
+                pass
+        if result is None:
+            result = _fetch(self.server, article, serial_num)
+            with self._lock:
+                self.miss_seconds += self.clock() - started
+        else:
+            # a prefetch still running saves only the rest of the fetch
+            waited = self.clock() - started
+            with self._lock:
+                self.hits += 1
+                self.saved += max(entry[0].seconds - waited, 0.0)
+        for next_key in self.predict(article, serial_num, self.depth):
+            self._prefetch(next_key)
+        return result
+
+    def stats(self):
+        """
+            Returns the requests, hits, hit_rate, saved_seconds (the latency
+            the hits did not wait for) and mean_miss_seconds.
+        """
+        with self._lock:
+            misses = self.requests - self.hits
+            return {
+                "requests": self.requests,
+                "hits": self.hits,
+                "hit_rate":
+                    float(self.hits) / self.requests if self.requests else 0.0,
+                "saved_seconds": self.saved,
+                "mean_miss_seconds":
+                    self.miss_seconds / misses if misses else 0.0,
+            }
+
+    def join(self):
+        """
+            Waits until the prefetches started have finished.
+        """
+        self._queue.join()
+
+    def close(self):
+        """
+            Stops the prefetching threads.
+        """
+        for dummy in self._workers:
+            self._queue.put(None)
+        self._workers = []
+
+    def _prefetch(self, key):
+        with self._lock:
+            if key in self._cache:
+                self._cache[key] = self._cache.pop(key)
+                return
+            pending = _Pending()
+            pending.seconds = 0.0
+            self._cache[key] = (pending, self.clock())
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        self._queue.put((key, pending))
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                (key, pending) = item
+                started = self.clock()
+                try:
+                    result = _fetch(self.server, *key)
+                except Exception as e:
+                    pending.set(None, e)
+                else:
+                    # the fetch time is what a hit saves
+                    pending.seconds = self.clock() - started
+                    pending.set(result)
+            finally:
+                self._queue.task_done()
+
+
+def _fetch(server, article, serial_num):
+    """
+        Returns (the process, the operations done) from the server.
+    """
+    if hasattr(server, "get_product"):
+        return server.get_product(article, serial_num)
+    return (
+        server.get_process(article, serial_num),
+        server.get_product_ops(article, serial_num),
+    )
+
+
 class ProductModel(hotmodel.HotContainer):
     """
         Holds information about a product (article/serial number). When told
@@ -120,14 +513,23 @@ class ProductModel(hotmodel.HotContainer):
         super(ProductModel, self).__init__()
         self.server = server
 
+    def enable_prefetch(self, **kwargs):
+        """
+            Makes set_product prefetch the products predicted to follow,
+            returns the Prefetcher (see it for the kwargs and the stats).
+        """
+        self.server = Prefetcher(self.server, **kwargs)
+        return self.server
+
     def set_product(self, article, sn):
         """
             Set the current product.
         """
+        (process, operations) = _fetch(self.server, article, sn)
         self.article = article
         self.sn = sn
-        self.process = self.server.get_process(article, sn)
-        self.operations = self.server.get_product_ops(article, sn)
+        self.process = process
+        self.operations = operations
         self.operation_selection = -1
         self.process_selection = -1
 
@@ -148,11 +550,129 @@ class ProductModel(hotmodel.HotContainer):
         self.process_selection = index
 
 
+class ProcessDoneJoin(hotmodel.HotContainer):
+    """
+        A live join of the process and the performed operations of a
+        ProductModel on the operation. Keeps the number of the performed
+        operations per operation, and done, a HotList with 1 for each process
+        row whose operation has been performed (0 otherwise).
+
+        The done list follows the process list (inserts, deletes, moves and
+        resets), and an "update" is fired only for the rows whose status has
+        flipped. The join should be added after the views of the process
+        rows, so that they have the rows when the done events come.
+    """
+    done = hotmodel.HotTypedProperty(hotmodel.HotList)
+
+    def __init__(self, model):
+        super(ProcessDoneJoin, self).__init__()
+        self.model = model
+        self.done = []
+        self._reset_operations()
+        self._reset_process()
+        model.add_listener(self.on_model_event)
+
+    def on_model_event(self, model, fqname, event_name, key):
+        if "operations" == fqname:
+            self.on_operations_event(event_name, key)
+        elif "process" == fqname:
+            self.on_process_event(event_name, key)
+
+    def on_operations_event(self, event_name, key):
+        operations = self.model.operations
+        if "insert" == event_name:
+            operation = operations[key].operation
+            self._operations.insert(key, operation)
+            self._count(operation, 1)
+        elif "delete" == event_name:
+            self._count(self._operations.pop(key), -1)
+        elif "update" == event_name:
+            old = self._operations[key]
+            new = self._operations[key] = operations[key].operation
+            if old != new:
+                self._count(old, -1)
+                self._count(new, 1)
+        elif "move" == event_name:
+            (src, dst) = key
+            self._operations.insert(dst, self._operations.pop(src))
+        elif "permute" == event_name:
+            self._operations = [self._operations[i] for i in key]
+        else:
+            self._reset_operations()
+            for (row, operation) in enumerate(self._process):
+                self._set_done(row, operation)
+
+    def on_process_event(self, event_name, key):
+        process = self.model.process
+        if "insert" == event_name:
+            operation = process[key].operation
+            self._process.insert(key, operation)
+            self.done.insert(key, self._is_done(operation))
+        elif "delete" == event_name:
+            del self._process[key]
+            del self.done[key]
+        elif "update" == event_name:
+            self._process[key] = process[key].operation
+            self._set_done(key, self._process[key])
+        elif "move" == event_name:
+            (src, dst) = key
+            self._process.insert(dst, self._process.pop(src))
+            self.done.move(src, dst)
+            self._set_done(dst, self._process[dst])
+        elif "permute" == event_name:
+            self._process = [self._process[i] for i in key]
+            self.done._permute(key)
+        else:
+            self._reset_process()
+            return
+        self._rows = None
+
+    def _reset_operations(self):
+        self._operations = [i.operation for i in self.model.operations or ()]
+        self.done_counts = {}
+        for operation in self._operations:
+            self.done_counts[operation] = \
+                self.done_counts.get(operation, 0) + 1
+
+    def _reset_process(self):
+        self._process = [i.operation for i in self.model.process or ()]
+        self._rows = None
+        self.done = [self._is_done(i) for i in self._process]
+
+    def _is_done(self, operation):
+        return 1 if self.done_counts.get(operation) else 0
+
+    def _set_done(self, row, operation):
+        status = self._is_done(operation)
+        if self.done[row] != status:
+            self.done[row] = status
+
+    def _count(self, operation, delta):
+        """
+            Changes the count of the operation, updates the rows of the
+            process with the operation if it has become done or not done.
+        """
+        count = self.done_counts.get(operation, 0) + delta
+        if count:
+            self.done_counts[operation] = count
+        else:
+            del self.done_counts[operation]
+        if count - delta and count:
+            return
+        if self._rows is None:
+            self._rows = {}
+            for (row, i) in enumerate(self._process):
+                self._rows.setdefault(i, []).append(row)
+        for row in self._rows.get(operation, ()):
+            self._set_done(row, operation)
+
+
 def sample_handler(handler_name, model, fqname, event_name, key):
     print(handler_name, "-->", fqname, event_name, key)
 
 
 if "__main__" == __name__:
+    hotmodel.log_to_stderr()
     MODEL = ProductModel(Server())
 
     MAPPER = hotmodel.Mapper()
@@ -0,0 +1,161 @@
+import pytest
+
+import hotaggregate
+import hotmodel
+from test_hotmodel import get_event_func
+
+
+class C1(hotmodel.HotContainer):
+    lst = hotmodel.HotTypedProperty(hotmodel.HotList)
+    dct = hotmodel.HotTypedProperty(hotmodel.HotDict)
+
+
+def prepare(clazz, *args):
+    c = C1()
+    c.lst = [3, 1, 4, 1, 5]
+    l = []
+    agg = clazz(c.lst, *args)
+    agg.add_listener(get_event_func(l))
+    return (l, c, agg)
+
+
+def test_sum_01():
+    (l, c, agg) = prepare(hotaggregate.SumAggregate)
+    assert 14 == agg.value
+    c.lst.append(2)
+    c.lst[0] = 1
+    del c.lst[1]
+    assert 13 == agg.value
+    c.lst[0] = 1
+    c.lst[1] = 4
+    assert l == [
+        ("value", "reset", None),
+        ("value", "reset", None),
+        ("value", "reset", None),
+    ]
+
+
+def test_count_01():
+    " The count fires only when it changes. "
+    (l, c, agg) = prepare(hotaggregate.CountAggregate, lambda i: i > 2)
+    assert 3 == agg.value
+    c.lst[0] = 10
+    assert [] == l
+    c.lst[1] = 10
+    assert 4 == agg.value
+    del c.lst[:]
+    assert 0 == agg.value
+    assert 2 == len(l)
+
+
+def test_count_02():
+    " Aggregating a HotDict. "
+    c = C1()
+    c.dct = {"a": 1, "b": 2}.items()
+    agg = hotaggregate.SumAggregate(c.dct)
+    c.dct["c"] = 3
+    c.dct["a"] = 10
+    del c.dct["b"]
+    assert 13 == agg.value
+    c.dct.clear()
+    assert 0 == agg.value
+    assert 1 == hotaggregate.CountAggregate(
+        hotmodel.HotDict([(1, 1), (2, 0)]), lambda i: i,
+    ).value
+
+
+def test_min_max_01():
+    (l, c, agg_min) = prepare(hotaggregate.MinAggregate)
+    agg_max = hotaggregate.MaxAggregate(c.lst)
+    assert (1, 5) == (agg_min.value, agg_max.value)
+    c.lst[1] = 7
+    assert (1, 7) == (agg_min.value, agg_max.value)
+    del c.lst[3]
+    assert (3, 7) == (agg_min.value, agg_max.value)
+    c.lst[1] = 2
+    assert (2, 5) == (agg_min.value, agg_max.value)
+    del c.lst[:]
+    assert (None, None) == (agg_min.value, agg_max.value)
+    assert [i[1] for i in l] == ["reset"] * 3
+
+
+def test_min_max_02():
+    " The heap is compacted. "
+    c = C1()
+    c.lst = [0]
+    agg = hotaggregate.MaxAggregate(c.lst, lambda i: -i)
+    for i in range(1, 1000):
+        c.lst[0] = i
+    assert -999 == agg.value
+    assert len(agg._heap) < 100
+
+
+def test_none_skipped():
+    c = C1()
+    c.lst = [1, 2, 3]
+    agg = hotaggregate.MinAggregate(
+        c.lst, lambda i: None if 1 == i else i,
+    )
+    assert 2 == agg.value
+
+
+def test_group_count_01():
+    c = C1()
+    c.lst = ["a", "b", "a"]
+    l = []
+    agg = hotaggregate.GroupCountAggregate(c.lst, lambda i: i)
+    agg.add_listener(get_event_func(l))
+    assert {"a": 2, "b": 1} == agg.counts.data
+    assert 2 == agg.value
+    c.lst[0] = "a"
+    assert [] == l
+    c.lst[1] = "c"
+    assert {"a": 2, "c": 1} == agg.counts.data
+    c.lst.append("a")
+    assert {"a": 3, "c": 1} == agg.counts.data
+    assert l == [
+        ("counts", "delete", "b"),
+        ("counts", "insert", "c"),
+        ("counts", "update", "a"),
+    ]
+    counts = agg.counts
+    del c.lst[:]
+    assert counts is agg.counts
+    assert {} == agg.counts.data
+    assert 0 == agg.value
+
+
+def test_permute():
+    " Reordering does not change the result, the shadow values follow. "
+    (l, c, agg) = prepare(hotaggregate.MinAggregate)
+    c.lst.sort()
+    c.lst.move(0, 4)
+    c.lst[0] = 0
+    assert 0 == agg.value
+    del c.lst[0]
+    assert 1 == agg.value
+    assert agg._values == c.lst.data
+    assert 2 == len(l)
+
+
+def test_detach():
+    (l, c, agg) = prepare(hotaggregate.SumAggregate)
+    agg.detach()
+    c.lst.append(100)
+    assert 14 == agg.value
+
+
+def test_hooks():
+    " An aggregate without its hooks cannot be created. "
+    class Partial(hotaggregate.Aggregate):
+        def _clear(self):
+            pass
+
+    with pytest.raises(TypeError) as error:
+        Partial(hotmodel.HotList([1]))
+    assert "Partial does not implement _add, _remove, _result" == \
+        str(error.value)
+
+
+if "__main__" == __name__:
+    pytest.main()
@@ -0,0 +1,106 @@
+import threading
+
+import pytest
+
+import hotinstrument
+import hotmodel
+
+
+class C1(hotmodel.HotContainer):
+    p1 = hotmodel.HotProperty()
+    lst = hotmodel.HotTypedProperty(hotmodel.HotList)
+
+
+class View(object):
+    def __init__(self):
+        self.calls = 0
+
+    def on_event(self, model, fqname, event_name, key):
+        self.calls += 1
+
+
+def failing(model, fqname, event_name, key):
+    raise ValueError("failing")
+
+
+@pytest.fixture
+def instrumentation():
+    instrumentation = hotinstrument.Instrumentation()
+    instrumentation.enable()
+    yield instrumentation
+    instrumentation.disable()
+    instrumentation.stop_dump()
+
+
+def test_histogram_01():
+    " The percentiles are within the bucket precision. "
+    histogram = hotinstrument.LatencyHistogram()
+    for i in range(1, 10001):
+        histogram.record(i)
+    assert 10000 == histogram.count
+    assert 10000 == histogram.max
+    assert abs(histogram.percentile(50) - 5000) <= 5000 / 16
+    assert abs(histogram.percentile(99) - 9900) <= 9900 / 16
+    assert 10000 == histogram.percentile(100)
+    assert 1 == histogram.percentile(0)
+    other = hotinstrument.LatencyHistogram()
+    other.record(20000)
+    histogram.merge(other)
+    assert (10001, 20000) == (histogram.count, histogram.max)
+
+
+def test_instrumentation_01(instrumentation):
+    " The listeners and routes are counted, the errors too. "
+    c = C1()
+    view = View()
+    mapper = hotmodel.Mapper()
+    mapper.add_route("p1", "", view.on_event)
+    mapper.add_route("", "reset", failing)
+    c.add_listener(mapper)
+    c.add_listener(view.on_event)
+    c.lst = [1]
+    c.lst.add_listener(view.on_event)
+    c.p1 = 1
+    c.lst.append(2)
+    assert 5 == view.calls
+    listeners = dict(
+        (i["label"], i) for i in instrumentation.stats()["listeners"]
+    )
+    assert 3 == listeners["Mapper"]["count"]
+    assert 4 == listeners["View.on_event"]["count"]
+    assert 0 == listeners["View.on_event"]["errors"]
+    routes = dict((i["label"], i) for i in instrumentation.stats()["routes"])
+    assert 1 == routes["p1: -> View.on_event"]["count"]
+    assert (2, 2) == (
+        routes[":reset -> failing"]["count"],
+        routes[":reset -> failing"]["errors"],
+    )
+    assert "View.on_event" in instrumentation.report()
+
+
+def test_instrumentation_02(instrumentation):
+    " Disabling takes effect immediately, the dump is periodic. "
+    c = C1()
+    view = View()
+    c.add_listener(view.on_event)
+    c.p1 = 1
+    instrumentation.disable()
+    assert not instrumentation.enabled
+    c.p1 = 2
+    assert 2 == view.calls
+    assert 1 == instrumentation.stats()["listeners"][0]["count"]
+    dumped = []
+    done = threading.Event()
+
+    def dump(report):
+        dumped.append(report)
+        if 2 == len(dumped):
+            done.set()
+    instrumentation.start_dump(0.01, dump)
+    assert done.wait(5)
+    instrumentation.stop_dump()
+    assert "View.on_event" in dumped[0]
+
+
+if "__main__" == __name__:
+    pytest.main()
@@ -0,0 +1,206 @@
+import datetime
+import os
+import pickle
+
+import pytest
+
+import hotjournal
+import hotmodel
+import production
+from test_hotmodel import get_event_func
+
+
+class ByValue(hotmodel.SortedHotList):
+    pass
+
+
+class C1(hotmodel.HotContainer):
+    p1 = hotmodel.HotProperty()
+    lst = hotmodel.HotTypedProperty(hotmodel.HotList)
+    dct = hotmodel.HotTypedProperty(hotmodel.HotDict)
+    tags = hotmodel.HotTypedProperty(hotmodel.HotSet)
+    srt = hotmodel.HotTypedProperty(ByValue)
+    ops = hotmodel.HotTypedProperty(production.OperationsList)
+
+
+class Viewed(C1):
+    odd = hotmodel.HotProperty()
+    tens = hotmodel.HotProperty()
+
+
+def prepare(clazz=C1):
+    c = clazz()
+    c.p1 = 1
+    c.lst = [1, 2, 3, 4, 5]
+    c.dct = {"a": 1}.items()
+    c.tags = ["x"]
+    c.srt = [3, 1, 2]
+    c.ops = []
+    return c
+
+
+def state(c):
+    return (
+        c.p1, list(c.lst), dict(c.dct.data), set(c.tags.data), list(c.srt),
+        list(c.ops),
+    )
+
+
+CHANGES = [
+    lambda c: setattr(c, "p1", "new"),
+    lambda c: c.lst.append(6),
+    lambda c: c.lst.insert(1, 7),
+    lambda c: c.lst.__setitem__(2, 8),
+    lambda c: c.lst.__delitem__(-1),
+    lambda c: c.lst.__setitem__(slice(1, 3), [10, 11, 12]),
+    lambda c: c.lst.move(0, 3),
+    lambda c: c.lst.sort(key=lambda i: -i),
+    lambda c: c.lst.reverse(),
+    lambda c: c.dct.__setitem__("a", 2),
+    lambda c: c.dct.__setitem__("b", (3, 4)),
+    lambda c: c.dct.__delitem__("a"),
+    lambda c: c.tags.add("y"),
+    lambda c: c.tags.symmetric_difference_update(["x", "w"]),
+    lambda c: c.srt.add(0),
+    lambda c: c.srt.__setitem__(0, 5),
+    lambda c: c.srt.__delitem__(1),
+    lambda c: c.ops.append(production.ProductOperation(
+        10, datetime.datetime(2015, 1, 2, 3, 4), "SMT",
+    )),
+    lambda c: setattr(c, "lst", [9]),
+    lambda c: c.dct.clear(),
+]
+
+
+def record(path, snapshot_every=1000):
+    c = prepare()
+    journal = hotjournal.Journal(c, path, snapshot_every)
+    states = [state(c)]
+    for change in CHANGES:
+        change(c)
+        states.append(state(c))
+    journal.close()
+    return states
+
+
+def test_journal_01(tmpdir):
+    " The replay rebuilds the model after each event. "
+    path = str(tmpdir.join("j"))
+    states = record(path, snapshot_every=3)
+    replayer = hotjournal.Replayer(path)
+    # symmetric_difference_update fires two events, setattr of a list one
+    assert len(CHANGES) + 1 == len(replayer)
+    points = [0]
+    for (dummy, seq, dummy, fqname, event_name, key, dummy) \
+            in replayer.events:
+        if ("tags", "delete") != (fqname, event_name):
+            points.append(seq + 1)
+    for (point, expected) in zip(points, states):
+        c = prepare()
+        replayer.replay(c, until=point)
+        assert expected == state(c)
+
+
+def test_journal_02(tmpdir):
+    " The replay fires the recorded events. "
+    path = str(tmpdir.join("j"))
+    record(path)
+    replayer = hotjournal.Replayer(path)
+    l = []
+    c = prepare()
+    c.add_listener(get_event_func(l))
+    assert len(replayer) == replayer.replay(c)
+    recorded = [
+        (fqname, event_name, key)
+        for (dummy, dummy, dummy, fqname, event_name, key, dummy)
+        in replayer.events
+        if "reset" != event_name
+    ]
+    # the resets are fired by restoring the snapshot too
+    assert recorded == [i for i in l if "reset" != i[1]]
+    assert 0 < replayer.benchmark(prepare, repeat=1)
+
+
+def test_journal_03(tmpdir):
+    " Appending to a journal continues the numbering, a torn end is ignored. "
+    path = str(tmpdir.join("j"))
+    c = prepare()
+    journal = hotjournal.Journal(c, path)
+    c.p1 = 2
+    journal.close()
+    journal = hotjournal.Journal(c, path)
+    c.p1 = 3
+    c.lst.append(1)
+    journal.close()
+    with open(path, "ab") as f:
+        f.write(b"\x00\xff\x00")
+    replayer = hotjournal.Replayer(path)
+    assert [0, 1, 2] == [i[1] for i in replayer.events]
+    assert [0, 1] == [i[1] for i in replayer.snapshots]
+    c2 = prepare()
+    replayer.replay(c2, until=2)
+    assert 3 == c2.p1
+    assert [1, 2, 3, 4, 5] == list(c2.lst)
+    with pytest.raises(ValueError):
+        next(hotjournal.read_journal(__file__))
+
+
+class Calling(object):
+    " Unpickling calls os.getcwd. "
+    def __reduce__(self):
+        return (os.getcwd, ())
+
+
+def prepare_views(c):
+    c.odd = c.lst.filtered(lambda i: i % 2)
+    c.tens = c.odd.mapped(lambda i: i * 10)
+    return c
+
+
+def test_journal_04(tmpdir):
+    " The views are not replayed, the replayed model's own follow the data. "
+    path = str(tmpdir.join("j"))
+    c = prepare_views(prepare(Viewed))
+    journal = hotjournal.Journal(c, path, snapshot_every=3)
+    for change in CHANGES:
+        change(c)
+    prepare_views(c)
+    c.lst.append(7)
+    journal.close()
+    replayer = hotjournal.Replayer(path)
+    for c2 in (prepare_views(prepare(Viewed)), prepare(Viewed)):
+        replayer.replay(c2)
+        assert state(c) == state(c2)
+    assert [9, 7] == list(c2.lst)
+    assert (None, None) == (c2.odd, c2.tens)
+    c2 = prepare_views(prepare(Viewed))
+    replayer.replay(c2)
+    assert [9, 7] == list(c2.odd)
+    assert [90, 70] == list(c2.tens)
+    assert not [i for i in replayer.events if i[3] in ("odd", "tens")]
+
+
+def test_restricted_01():
+    " A restricted record holds only the values, not other globals. "
+    c = prepare()
+    for change in CHANGES:
+        change(c)
+    state = hotjournal.model_state(c)
+    for record in (
+        (hotjournal.SNAPSHOT, 0, 0.0, state),
+        (hotjournal.EVENT, 1, 0.0, "tags", "insert", frozenset([1]), None),
+    ):
+        data = hotjournal.dumps_record(record)
+        (codec, dummy) = hotjournal.HEADER.unpack_from(data)
+        body = data[hotjournal.HEADER.size:]
+        assert record == hotjournal.loads_record(codec, body, True)
+    data = hotjournal.dumps_record((hotjournal.EVENT, Calling()))
+    assert hotjournal.CODEC_PICKLE == hotjournal.HEADER.unpack_from(data)[0]
+    with pytest.raises(pickle.UnpicklingError):
+        hotjournal.loads_record(
+            hotjournal.CODEC_PICKLE, data[hotjournal.HEADER.size:], True,
+        )
+
+
+if "__main__" == __name__:
+    pytest.main()
@@ -1,5 +1,9 @@
+from collections import namedtuple
+import threading
+
 import pytest
 
+import hotaggregate
 import hotmodel
 
 
@@ -9,6 +13,13 @@ def get_gather_func(l):
     return gather_firing
 
 
+def get_event_func(l):
+    " Gathers the events without the model. "
+    def gather_event(*args):
+        l.append(args[1:])
+    return gather_event
+
+
 def test_container_01():
     " add_listener, _fire "
     l = []
@@ -52,6 +63,22 @@ def test_property_01():
     assert "p1" == C1.p1._get_name_within_parent(c)
 
 
+def test_property_none_01():
+    "None, the value never assigned, clears the property."
+    (l, c) = prepare_c(C1)
+    assert None is c.p1
+    c.p1 = "HELLO"
+    c.p1 = None
+    assert None is c.p1
+    assert l == [
+        ("HELLO", "p1", "reset", None),
+        (None, "p1", "reset", None),
+    ]
+    for val in ([None], {}, object()):
+        with pytest.raises(TypeError):
+            c.p1 = val
+
+
 def test_property_02():
     "Firing an event."
     (l, c) = prepare_c(C1)
@@ -211,6 +238,792 @@ def test_hotdict_04():
     assert 4 == len(c.p1)
 
 
+def test_hotlist_move_01():
+    (l, c) = prepare_c(C2)
+    c.p1 = [1, 2, 3, 4]
+    l[:] = []
+    c.p1.move(0, 2)
+    c.p1.move(-1, 0)
+    c.p1.move(1, 1)
+    assert [4, 2, 3, 1] == c.p1.data
+    assert l == [
+        (c.p1, "p1", "move", (0, 2)),
+        (c.p1, "p1", "move", (3, 0)),
+    ]
+    with pytest.raises(IndexError):
+        c.p1.move(0, 4)
+
+
+def test_hotlist_sort_01():
+    " sort and reverse fire a single permute "
+    (l, c) = prepare_c(C2)
+    c.p1 = [3, 1, 2]
+    l[:] = []
+    c.p1.sort()
+    assert [1, 2, 3] == c.p1.data
+    c.p1.sort()
+    c.p1.sort(key=lambda i: i % 2, reverse=True)
+    assert [1, 3, 2] == c.p1.data
+    c.p1.reverse()
+    assert [2, 3, 1] == c.p1.data
+    assert l == [
+        (c.p1, "p1", "permute", (1, 2, 0)),
+        (c.p1, "p1", "permute", (0, 2, 1)),
+        (c.p1, "p1", "permute", (2, 1, 0)),
+    ]
+
+
+def test_property_unchanged_01():
+    " Assigning the current value fires nothing, a change of type fires. "
+    (l, c) = prepare_c(C1)
+    c.p1 = None
+    c.p1 = None
+    c.p1 = 1
+    c.p1 = 1
+    c.p1 = 1.0
+    lst = c.p1 = hotmodel.HotList()
+    c.p1 = lst
+    assert l == [
+        (None, "p1", "reset", None),
+        (1, "p1", "reset", None),
+        (1.0, "p1", "reset", None),
+        (lst, "p1", "reset", None),
+    ]
+
+
+def test_property_unchanged_02():
+    " A comparator per type "
+    (l, c) = prepare_c(C1)
+    hotmodel.set_comparator(float, lambda a, b: abs(a - b) < 0.01)
+    try:
+        c.p1 = 1.0
+        c.p1 = 1.001
+        assert 1.0 == c.p1
+        c.p1 = 1.1
+    finally:
+        hotmodel.set_comparator(float, None)
+    c.p1 = 1.1
+    assert [1.0, 1.1] == [i[0] for i in l]
+
+
+def test_take_dirty_01():
+    " The fqnames fired since the last take_dirty "
+    (l, c) = prepare_c(C2)
+    with pytest.raises(ValueError):
+        c.take_dirty()
+    c.track_dirty()
+    c.p1 = [1]
+    c.p1.append(2)
+    assert set(["p1"]) == c.take_dirty()
+    assert set() == c.take_dirty()
+    c.track_dirty(False)
+    c.p1.append(3)
+    assert 3 == len(l)
+
+
+class CView(hotmodel.HotContainer):
+    source = hotmodel.HotTypedProperty(hotmodel.HotList)
+    view = hotmodel.HotProperty()
+
+
+def prepare_view(func):
+    l = []
+    c = CView()
+    c.source = [1, 2, 3, 4, 5, 6]
+    c.view = func(c.source)
+    c.add_listener(get_event_func(l))
+    return (l, c)
+
+
+def even(i):
+    return 0 == i % 2
+
+
+def check_filtered(c):
+    assert c.view.data == [i for i in c.source if even(i)]
+    assert c.view.data == [c.source[i] for i in c.view.source_index]
+
+
+def test_containee_listener_01():
+    " Containee's own listeners are called before the container's. "
+    l = []
+    c = CView()
+    c.source = []
+    c.add_listener(lambda *args: l.append("container"))
+    c.source.add_listener(lambda *args: l.append(args))
+    c.source.append(1)
+    assert l == [(c.source, "source", "insert", 0), "container"]
+
+    free = hotmodel.HotList()
+    free.add_listener(get_event_func(l))
+    free.append(1)
+    assert l[-1] == (None, "insert", 0)
+
+
+def test_derived_insert_01():
+    " The insert event carries the actual position. "
+    (l, c) = prepare_view(lambda s: s.mapped(str))
+    c.source.insert(100, 7)
+    c.source.insert(-100, 0)
+    assert l == [
+        ("view", "insert", 6),
+        ("source", "insert", 6),
+        ("view", "insert", 0),
+        ("source", "insert", 0),
+    ]
+
+
+def test_filtered_01():
+    " Inserts and deletes translate the indexes. "
+    (l, c) = prepare_view(lambda s: s.filtered(even))
+    assert c.view.data == [2, 4, 6]
+    c.source.insert(0, 8)
+    c.source.insert(1, 9)
+    check_filtered(c)
+    del c.source[3]
+    check_filtered(c)
+    del c.source[0]
+    check_filtered(c)
+    assert [i for i in l if "view" == i[0]] == [
+        ("view", "insert", 0),
+        ("view", "delete", 1),
+        ("view", "delete", 0),
+    ]
+
+
+def test_filtered_02():
+    " Updates can move an item in or out of the view. "
+    (l, c) = prepare_view(lambda s: s.filtered(even))
+    c.source[1] = 12
+    c.source[0] = 10
+    c.source[3] = 7
+    c.source[2] = 5
+    check_filtered(c)
+    assert [i for i in l if "view" == i[0]] == [
+        ("view", "update", 0),
+        ("view", "insert", 0),
+        ("view", "delete", 2),
+    ]
+
+
+def test_filtered_03():
+    " Slice operations reset the view. "
+    (l, c) = prepare_view(lambda s: s.filtered(even))
+    c.source[1:3] = [10, 20, 30]
+    check_filtered(c)
+    del c.source[:2]
+    check_filtered(c)
+    assert ("view", "reset", None) in l
+
+
+def test_mapped_01():
+    (l, c) = prepare_view(lambda s: s.mapped(lambda i: i * 10))
+    c.source.append(7)
+    c.source[0] = 0
+    del c.source[1]
+    assert c.view.data == [0, 30, 40, 50, 60, 70]
+    assert [i for i in l if "view" == i[0]] == [
+        ("view", "insert", 6),
+        ("view", "update", 0),
+        ("view", "delete", 1),
+    ]
+
+
+def test_derived_chained_01():
+    " A view of a view. "
+    (l, c) = prepare_view(lambda s: s.filtered(even).mapped(str))
+    c.source.append(8)
+    c.source.append(9)
+    assert c.view.data == ["2", "4", "6", "8"]
+
+
+def test_derived_permute_01():
+    " Moves and permutations of the source. "
+    (l, c) = prepare_view(lambda s: s.filtered(even))
+    mapped = c.source.mapped(lambda i: -i)
+    c.source.move(1, 4)
+    check_filtered(c)
+    c.source.reverse()
+    check_filtered(c)
+    assert ("view", "permute", (2, 1, 0)) == l[-2]
+    c.source.sort()
+    check_filtered(c)
+    assert mapped.data == [-i for i in c.source]
+    c.source.sort(key=lambda i: i % 2)
+    check_filtered(c)
+    assert mapped.data == [-i for i in c.source]
+    with pytest.raises(TypeError):
+        c.view.sort()
+
+
+def test_derived_read_only_01():
+    (l, c) = prepare_view(lambda s: s.filtered(even))
+    with pytest.raises(TypeError):
+        c.view.append(2)
+    with pytest.raises(TypeError):
+        c.view[0] = 2
+    with pytest.raises(TypeError):
+        del c.view[0]
+
+
+def test_derived_detach_01():
+    (l, c) = prepare_view(lambda s: s.filtered(even))
+    c.view.detach()
+    c.source.append(8)
+    assert c.view.data == [2, 4, 6]
+
+
+class CSet(hotmodel.HotContainer):
+    tags = hotmodel.HotTypedProperty(hotmodel.HotSet)
+
+
+def prepare_set():
+    l = []
+    c = CSet()
+    c.tags = ["a", "b"]
+    c.add_listener(get_event_func(l))
+    return (l, c)
+
+
+def test_hotset_01():
+    " add, discard, remove "
+    (l, c) = prepare_set()
+    c.tags.add("c")
+    c.tags.add("c")
+    c.tags.discard("a")
+    c.tags.discard("a")
+    with pytest.raises(KeyError):
+        c.tags.remove("a")
+    c.tags.remove("b")
+    assert set(["c"]) == c.tags.data
+    assert "c" in c.tags
+    assert 1 == len(c.tags)
+    assert l == [
+        ("tags", "insert", frozenset(["c"])),
+        ("tags", "delete", frozenset(["a"])),
+        ("tags", "delete", frozenset(["b"])),
+    ]
+    with pytest.raises(TypeError):
+        c.tags.add([1])
+
+
+def test_hotset_02():
+    " The bulk operations fire once per kind. "
+    (l, c) = prepare_set()
+    c.tags.update(["a", "c"], "de")
+    c.tags.update(["a"])
+    c.tags.difference_update(["a", "x"], ["d"])
+    c.tags.intersection_update(["b", "c", "y"])
+    c.tags.symmetric_difference_update(["c", "z"])
+    assert set(["b", "z"]) == c.tags.data
+    assert l == [
+        ("tags", "insert", frozenset(["c", "d", "e"])),
+        ("tags", "delete", frozenset(["a", "d"])),
+        ("tags", "delete", frozenset(["e"])),
+        ("tags", "delete", frozenset(["c"])),
+        ("tags", "insert", frozenset(["z"])),
+    ]
+    l[:] = []
+    c.tags.clear()
+    c.tags.clear()
+    assert l == [("tags", "delete", frozenset(["b", "z"]))]
+    with pytest.raises(TypeError):
+        c.tags.update([[1]])
+    assert 0 == len(c.tags)
+
+
+def test_hotset_03():
+    " Replacing the set. "
+    (l, c) = prepare_set()
+    c.tags = [1, 2, 2]
+    assert set([1, 2]) == c.tags.data
+    assert l == [("tags", "reset", None)]
+
+
+class CSnap(hotmodel.HotContainer):
+    lst = hotmodel.HotTypedProperty(hotmodel.HotList)
+    dct = hotmodel.HotTypedProperty(hotmodel.HotDict)
+    tags = hotmodel.HotTypedProperty(hotmodel.HotSet)
+
+
+def test_list_snapshot_01():
+    " The snapshot shares the data until the next change. "
+    c = CSnap()
+    c.lst = [1, 2, 3]
+    snap = c.lst.snapshot()
+    assert snap._data is c.lst.data
+    assert [1, 2, 3] == list(snap)
+    c.lst.append(4)
+    assert snap._data is not c.lst.data
+    data = c.lst.data
+    c.lst[0] = 0
+    assert data is c.lst.data
+    assert [1, 2, 3] == list(snap)
+    assert 3 == len(snap)
+    assert 2 == snap[1]
+    assert [2, 3] == snap[1:]
+    assert 2 in snap
+    assert 1 == snap.index(2)
+    with pytest.raises(TypeError):
+        snap[0] = 1
+
+
+def test_list_snapshot_02():
+    " Every mutation copies the shared data. "
+    c = CSnap()
+    c.lst = [3, 1, 2]
+    for change in (
+        lambda l: l.insert(0, 1),
+        lambda l: l.__delitem__(0),
+        lambda l: l.__delitem__(slice(0, 1)),
+        lambda l: l.__setitem__(slice(0, 1), [5]),
+        lambda l: l.move(0, 1),
+        lambda l: l.sort(),
+        lambda l: l.reverse(),
+    ):
+        before = list(c.lst)
+        snap = c.lst.snapshot()
+        change(c.lst)
+        assert before == list(snap)
+
+
+def test_derived_snapshot_01():
+    c = CSnap()
+    c.lst = [1, 2, 3]
+    view = c.lst.filtered(lambda i: i % 2)
+    snap = view.snapshot()
+    c.lst.append(5)
+    c.lst[0] = 7
+    assert [1, 3] == list(snap)
+    assert [7, 3, 5] == view.data
+
+
+def test_dict_snapshot_01():
+    c = CSnap()
+    c.dct = {"a": 1}.items()
+    snap = c.dct.snapshot()
+    c.dct["b"] = 2
+    c.dct["a"] = 3
+    del c.dct["a"]
+    assert {"a": 1} == dict(snap.items())
+    assert 1 == snap["a"]
+    assert snap.get("b") is None
+    snap = c.dct.snapshot()
+    c.dct.clear()
+    assert ["b"] == list(snap.keys())
+
+
+def test_set_snapshot_01():
+    c = CSnap()
+    c.tags = ["a"]
+    snap = c.tags.snapshot()
+    c.tags.update(["b", "c"])
+    c.tags.discard("a")
+    assert ["a"] == list(snap)
+
+
+def test_snapshot_threaded_01():
+    " A reader on another thread sees an unchanging snapshot. "
+    c = CSnap()
+    c.lst = list(range(1000))
+    snap = c.lst.snapshot()
+    results = []
+
+    def read():
+        for dummy in range(50):
+            results.append(sum(snap))
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    for i in range(2000):
+        c.lst[i % 1000] = -1
+        if 0 == i % 100:
+            c.lst.snapshot()
+    reader.join()
+    assert set(results) == set([sum(range(1000))])
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class Scheduler(object):
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, delay, callback):
+        self.calls.append((delay, callback))
+
+    def run(self, clock):
+        calls = self.calls
+        self.calls = []
+        for (delay, callback) in calls:
+            clock.now += delay
+            callback()
+
+
+CLOCK = Clock()
+
+
+class CRate(hotmodel.HotContainer):
+    throttled = hotmodel.ThrottledHotProperty(1.0, clock=CLOCK)
+    debounced = hotmodel.DebouncedHotProperty(0.5, clock=CLOCK)
+    deadband = hotmodel.DeadbandHotProperty(0.5)
+
+
+def prepare_rate():
+    c = CRate()
+    l = []
+    c.add_listener(get_event_func(l))
+    return (c, l)
+
+
+def test_throttled_01():
+    " The first value fires, the rest within the interval trail. "
+    (c, l) = prepare_rate()
+    c.throttled = 1
+    c.throttled = 2
+    c.throttled = 3
+    assert 3 == c.throttled
+    assert [("throttled", "reset", None)] == l
+    assert CRate.throttled.pending(c)
+    assert not CRate.throttled.poll(c)
+    CLOCK.now += 1.0
+    assert CRate.throttled.poll(c)
+    assert not CRate.throttled.pending(c)
+    assert 2 == len(l)
+    assert not CRate.throttled.poll(c)
+
+
+def test_throttled_02():
+    " An assignment after the interval fires at once. "
+    (c, l) = prepare_rate()
+    c.throttled = 1
+    c.throttled = 2
+    CLOCK.now += 1.5
+    c.throttled = 3
+    assert 2 == len(l)
+    assert not CRate.throttled.pending(c)
+    c.throttled = 4
+    CRate.throttled.flush(c)
+    assert 3 == len(l)
+
+
+def test_throttled_03():
+    " The trailing event is scheduled once. "
+    scheduler = Scheduler()
+    prop = hotmodel.ThrottledHotProperty(2.0, clock=CLOCK, schedule=scheduler)
+
+    class CValue(hotmodel.HotContainer):
+        value = prop
+
+    c = CValue()
+    values = []
+    c.add_listener(lambda model, *args: values.append(model))
+    c.value = 1
+    CLOCK.now += 0.5
+    c.value = 2
+    c.value = 3
+    assert [1] == values
+    assert [1.5] == [i[0] for i in scheduler.calls]
+    scheduler.run(CLOCK)
+    assert [1, 3] == values
+    assert [] == scheduler.calls
+
+
+def test_debounced_01():
+    " Fires once the assignments stop for the wait. "
+    (c, l) = prepare_rate()
+    c.debounced = 1
+    CLOCK.now += 0.3
+    c.debounced = 2
+    CLOCK.now += 0.3
+    assert not CRate.debounced.poll(c)
+    assert 2 == c.debounced
+    CLOCK.now += 0.2
+    assert CRate.debounced.poll(c)
+    assert [("debounced", "reset", None)] == l
+
+
+def test_debounced_02():
+    " The scheduled callback reschedules after a later assignment. "
+    scheduler = Scheduler()
+    prop = hotmodel.DebouncedHotProperty(1.0, clock=CLOCK, schedule=scheduler)
+
+    class CValue(hotmodel.HotContainer):
+        value = prop
+
+    c = CValue()
+    values = []
+    c.add_listener(lambda model, *args: values.append(model))
+    c.value = 1
+    (delay, callback) = scheduler.calls.pop()
+    assert 1.0 == delay
+    CLOCK.now += 0.5
+    c.value = 2
+    assert [] == scheduler.calls
+    CLOCK.now += 0.5
+    callback()
+    assert [] == values
+    assert [0.5] == [i[0] for i in scheduler.calls]
+    scheduler.run(CLOCK)
+    assert [2] == values
+
+
+def test_deadband_01():
+    " Fires when the change since the last event exceeds the threshold. "
+    (c, l) = prepare_rate()
+    for value in (20, 20.3, 20.5, 20.6, 20.2, 19.9, None, 1, "x", "y"):
+        c.deadband = value
+    assert "y" == c.deadband
+    # 20, 20.6, 19.9, None, 1, "x", "y"
+    assert 7 == len(l)
+
+
+def test_rate_limited_01():
+    " The base, or a subclass without the hooks, cannot be created. "
+    with pytest.raises(TypeError):
+        hotmodel.RateLimitedHotProperty()
+
+    class NoDelay(hotmodel.RateLimitedHotProperty):
+        def _on_assign(self, state, val, now):
+            return True
+
+        def _is_due(self, state, now):
+            return True
+    with pytest.raises(TypeError) as info:
+        NoDelay()
+    assert "_delay" in str(info.value)
+
+
+def test_rate_property_names_01():
+    assert ["deadband", "debounced", "throttled"] == \
+        sorted(hotmodel.hot_property_names(CRate))
+
+
+Op = namedtuple("Op", ["operation", "tm", ])
+
+
+class OpList(hotmodel.TypedHotList):
+    hash_indexes = ("operation", )
+    sorted_indexes = ("tm", )
+
+    def __init__(self, init_iterable=None, name=None, container=None):
+        super(OpList, self).__init__(Op, init_iterable, name, container)
+
+
+class COps(hotmodel.HotContainer):
+    ops = hotmodel.HotTypedProperty(OpList)
+
+
+def check_indexes(lst):
+    " The indexes must match the indexes built from scratch. "
+    for i in lst:
+        assert lst.find_by("operation", i.operation).count(i) == \
+            lst.data.count(i)
+        if i.tm is not None:
+            assert sorted(lst.find_by("tm", i.tm)) == \
+                sorted(j for j in lst if j.tm == i.tm)
+    assert sum(len(i) for i in lst._hash_index["operation"].values()) == \
+        len(lst)
+    by_tm = lst.range_by("tm")
+    assert sorted(by_tm) == sorted(i for i in lst if i.tm is not None)
+    assert [i.tm for i in by_tm] == sorted(i.tm for i in by_tm)
+
+
+def prepare_ops():
+    c = COps()
+    c.ops = [Op(10, 5), Op(20, 3), Op(30, 4), Op(20, 1)]
+    return c
+
+
+def test_typed_01():
+    lst = hotmodel.TypedHotList(int, [1, 2])
+    with pytest.raises(TypeError):
+        lst.append("a")
+    with pytest.raises(KeyError):
+        lst.find_by("real", 1)
+
+
+def test_typed_none_01():
+    " None is a field without a value, the items themselves are not None. "
+    lst = OpList([Op(10, None), Op(None, 1), Op((20, None), 2)])
+    assert [Op(10, None)] == lst.find_by("operation", 10)
+    assert [Op(None, 1), Op((20, None), 2)] == lst.range_by("tm")
+    for val in (None, Op(10, [None]), (10, None)):
+        with pytest.raises(TypeError):
+            lst.append(val)
+    assert 3 == len(lst)
+
+
+def test_index_01():
+    c = prepare_ops()
+    check_indexes(c.ops)
+    assert [Op(30, 4)] == c.ops.find_by("operation", 30)
+    assert [] == c.ops.find_by("operation", 40)
+    assert [Op(20, 3), Op(20, 1)] == c.ops.find_by("operation", 20)
+    assert [Op(20, 3), Op(30, 4)] == c.ops.range_by("tm", 2, 5)
+    assert [Op(20, 1)] == c.ops.range_by("tm", high=3)
+    with pytest.raises(KeyError):
+        c.ops.range_by("operation")
+
+
+def test_index_02():
+    " insert/update/delete "
+    c = prepare_ops()
+    c.ops.append(Op(40, 2))
+    c.ops.insert(0, Op(50, None))
+    c.ops[2] = Op(60, 3)
+    del c.ops[1]
+    c.ops.extend([Op(10, 7), Op(10, 8)])
+    check_indexes(c.ops)
+    assert 2 == len(c.ops.find_by("operation", 10))
+    assert [Op(50, None)] == c.ops.find_by("operation", 50)
+
+
+def test_index_03():
+    " Slices "
+    c = prepare_ops()
+    c.ops[1:3] = [Op(70, 1), Op(80, 2), Op(90, 3)]
+    check_indexes(c.ops)
+    del c.ops[::2]
+    check_indexes(c.ops)
+    with pytest.raises(ValueError):
+        c.ops[::2] = [Op(1, 1), Op(2, 2), Op(3, 3)]
+    check_indexes(c.ops)
+
+
+def test_index_04():
+    " A failed change keeps the indexes. "
+    c = prepare_ops()
+    with pytest.raises(TypeError):
+        c.ops.append((10, 1))
+    with pytest.raises(IndexError):
+        c.ops[10] = Op(1, 1)
+    with pytest.raises(IndexError):
+        del c.ops[10]
+    check_indexes(c.ops)
+    assert 4 == len(c.ops)
+
+
+def test_index_05():
+    " The indexes survive a reset of the list. "
+    l = []
+    c = prepare_ops()
+    c.add_listener(lambda *args: l.append(c.ops.find_by("operation", 30)))
+    c.ops = [Op(30, 1), Op(40, 2)]
+    assert [[Op(30, 1)]] == l
+    check_indexes(c.ops)
+    c.ops[:] = [Op(30, 5)]
+    check_indexes(c.ops)
+    assert [Op(30, 5)] == c.ops.find_by("operation", 30)
+    del c.ops[:]
+    assert [] == c.ops.find_by("operation", 30)
+    assert [] == c.ops.range_by("tm")
+
+
+def test_index_06():
+    " The listeners see the updated indexes. "
+    l = []
+    c = prepare_ops()
+    c.add_listener(lambda *args: l.append(c.ops.find_by("operation", 40)))
+    c.ops.append(Op(40, 1))
+    assert [[Op(40, 1)]] == l
+
+
+class ByTens(hotmodel.SortedHotList):
+    def sort_key(self, item):
+        return item // 10
+
+
+class CSorted(hotmodel.HotContainer):
+    lst = hotmodel.HotTypedProperty(ByTens)
+
+
+def prepare_sorted():
+    l = []
+    c = CSorted()
+    c.lst = [31, 12, 25, 11]
+    c.add_listener(get_event_func(l))
+    return (l, c)
+
+
+def test_sorted_01():
+    " Sorted and stable. "
+    (l, c) = prepare_sorted()
+    assert [12, 11, 25, 31] == c.lst.data
+    assert 3 == c.lst.add(27)
+    c.lst.append(10)
+    c.lst.extend([40, 1])
+    assert [1, 12, 11, 10, 25, 27, 31, 40] == c.lst.data
+    assert l == [
+        ("lst", "insert", 3),
+        ("lst", "insert", 2),
+        ("lst", "insert", 6),
+        ("lst", "insert", 0),
+    ]
+    assert 1 == c.lst.index_of_key(1)
+    with pytest.raises(TypeError):
+        c.lst.insert(0, 1)
+    with pytest.raises(TypeError):
+        c.lst[0:1] = [1]
+    with pytest.raises(TypeError):
+        c.lst.reverse()
+    with pytest.raises(TypeError):
+        c.lst.move(0, 1)
+
+
+def test_sorted_02():
+    lst = hotmodel.SortedHotList([3, 1, 2], key=lambda i: -i)
+    assert [3, 2, 1] == lst.data
+
+
+def test_sorted_03():
+    " An update either stays, or fires a single move. "
+    (l, c) = prepare_sorted()
+    c.lst[1] = 13
+    c.lst[0] = 33
+    c.lst[3] = 5
+    c.lst[-1] = 34
+    assert [5, 13, 25, 34] == c.lst.data
+    assert l == [
+        ("lst", "update", 1),
+        ("lst", "move", (0, 2)),
+        ("lst", "move", (3, 0)),
+        ("lst", "update", 3),
+    ]
+
+
+def test_sorted_04():
+    (l, c) = prepare_sorted()
+    del c.lst[0]
+    del c.lst[-1]
+    c.lst.add(15)
+    assert [11, 15, 25] == c.lst.data
+    del c.lst[:2]
+    c.lst.add(1)
+    assert [1, 25] == c.lst.data
+    assert [0, 2] == c.lst._keys
+
+
+def test_sorted_05():
+    " Derived views and aggregates follow the moves. "
+    (l, c) = prepare_sorted()
+    view = c.lst.filtered(lambda i: i % 2)
+    mapped = c.lst.mapped(str)
+    agg = hotaggregate.MaxAggregate(c.lst)
+    c.lst[0] = 45
+    c.lst[2] = 3
+    assert [3, 11, 25, 45] == c.lst.data
+    assert view.data == [i for i in c.lst if i % 2]
+    assert mapped.data == [str(i) for i in c.lst]
+    assert 45 == agg.value
+
+
 if "__main__" == __name__:
     pytest.main()
 
@@ -0,0 +1,162 @@
+import random
+
+import pytest
+
+import hotmodel
+import hotpersist
+import hotundo
+from test_hotmodel import get_event_func
+
+
+class C1(hotmodel.HotContainer):
+    attrs = hotmodel.HotTypedProperty(hotpersist.PersistentHotDict)
+
+
+class Colliding(object):
+    " A key with a fixed hash "
+    def __init__(self, name, key_hash):
+        self.name = name
+        self.key_hash = key_hash
+
+    def __hash__(self):
+        return self.key_hash
+
+    def __eq__(self, other):
+        return self.name == other.name
+
+    def __ne__(self, other):
+        return not self == other
+
+
+def prepare():
+    l = []
+    c = C1()
+    c.attrs = [("a", 1), ("b", 2)]
+    c.add_listener(get_event_func(l))
+    return (l, c)
+
+
+def test_persistentmap_01():
+    " set, delete and lookup against a dict "
+    rnd = random.Random(7)
+    m = hotpersist.PersistentMap()
+    d = {}
+    for dummy in range(3000):
+        key = rnd.randint(0, 500)
+        if key in d and rnd.random() < 0.4:
+            m = m.delete(key)
+            del d[key]
+        else:
+            value = rnd.randint(0, 10)
+            m = m.set(key, value)
+            d[key] = value
+        assert len(d) == len(m)
+    assert d == dict(m.items())
+    for key in range(501):
+        assert (key in d) == (key in m)
+        assert d.get(key) == m.get(key)
+    with pytest.raises(KeyError):
+        m.delete(1000)
+
+
+def test_persistentmap_02():
+    " the old versions are not changed "
+    m1 = hotpersist.PersistentMap([("a", 1)])
+    m2 = m1.set("a", 2).set("b", 3)
+    m3 = m2.delete("a")
+    assert {"a": 1} == dict(m1.items())
+    assert {"a": 2, "b": 3} == dict(m2.items())
+    assert {"b": 3} == dict(m3.items())
+
+
+def test_persistentmap_03():
+    " colliding hashes "
+    keys = [Colliding(i, 42) for i in "abcd"]
+    m = hotpersist.PersistentMap((k, k.name) for k in keys)
+    assert 4 == len(m)
+    assert "c" == m[Colliding("c", 42)]
+    m2 = m.delete(keys[0]).delete(keys[2]).set(keys[1], "B")
+    assert 2 == len(m2)
+    assert "B" == m2[keys[1]]
+    assert not keys[0] in m2
+    assert sorted(m.diff(m2), key=lambda i: i[1].name) == [
+        ("delete", keys[0]),
+        ("update", keys[1]),
+        ("delete", keys[2]),
+    ]
+
+
+def test_persistentmap_04():
+    " diff reports only the changed keys "
+    m1 = hotpersist.PersistentMap((i, i) for i in range(1000))
+    m2 = m1.set(5, -5).delete(7).set(2000, 1).set(9, 9)
+    assert sorted(m1.diff(m2), key=lambda i: i[1]) == [
+        ("update", 5),
+        ("delete", 7),
+        ("insert", 2000),
+    ]
+    assert [] == list(m1.diff(m1))
+
+
+def test_persistenthotdict_01():
+    " the dict interface and events "
+    (l, c) = prepare()
+    c.attrs["c"] = 3
+    c.attrs["a"] = 0
+    del c.attrs["b"]
+    assert {"a": 0, "c": 3} == dict(c.attrs.items())
+    assert 0 == c.attrs["a"]
+    assert 2 == len(c.attrs)
+    with pytest.raises(TypeError):
+        c.attrs["d"] = []
+    c.attrs.clear()
+    assert 0 == len(c.attrs)
+    assert l == [
+        ("attrs", "insert", "c"),
+        ("attrs", "update", "a"),
+        ("attrs", "delete", "b"),
+        ("attrs", "reset", ""),
+    ]
+
+
+def test_persistenthotdict_02():
+    " checkout fires the changed keys only "
+    (l, c) = prepare()
+    v1 = c.attrs.version()
+    c.attrs["c"] = 3
+    c.attrs["a"] = 0
+    del c.attrs["b"]
+    v2 = c.attrs.version()
+    del l[:]
+    c.attrs.checkout(v1)
+    assert {"a": 1, "b": 2} == dict(c.attrs.items())
+    assert sorted(l) == [
+        ("attrs", "delete", "c"),
+        ("attrs", "insert", "b"),
+        ("attrs", "update", "a"),
+    ]
+    c.attrs.checkout(v2)
+    assert {"a": 0, "c": 3} == dict(c.attrs.items())
+
+
+def test_persistenthotdict_03():
+    " snapshots and undo "
+    (l, c) = prepare()
+    undo = hotundo.UndoManager(c)
+    snap = c.attrs.snapshot()
+    v1 = c.attrs.version()
+    c.attrs["a"] = 5
+    c.attrs.checkout(v1.set("x", 1))
+    assert {"a": 1, "b": 2} == dict(snap.items())
+    assert {"a": 1, "b": 2, "x": 1} == dict(c.attrs.items())
+    undo.undo()
+    assert {"a": 5, "b": 2} == dict(c.attrs.items())
+    undo.undo()
+    assert {"a": 1, "b": 2} == dict(c.attrs.items())
+    undo.redo()
+    undo.redo()
+    assert {"a": 1, "b": 2, "x": 1} == dict(c.attrs.items())
+
+
+if "__main__" == __name__:
+    pytest.main()
@@ -0,0 +1,109 @@
+import json
+
+import pytest
+
+import hotmodel
+import hotprofile
+
+
+class C1(hotmodel.HotContainer):
+    p1 = hotmodel.HotProperty()
+    p2 = hotmodel.HotProperty()
+
+
+SCRIPT = """
+import hotmodel
+
+class C1(hotmodel.HotContainer):
+    p1 = hotmodel.HotProperty()
+
+c = C1()
+c.add_listener(lambda *args: None)
+for i in range(10):
+    c.p1 = i
+"""
+
+
+def prepare():
+    c = C1()
+    mapper = hotmodel.Mapper()
+
+    def cascade(model, fqname, event_name, key):
+        c.p2 = c.p1 * 2
+
+    def failing(model, fqname, event_name, key):
+        raise ValueError("failing")
+    mapper.add_route("p1", "", cascade)
+    mapper.add_route("p2", "", failing)
+    c.add_listener(mapper)
+    c.add_listener(lambda *args: None)
+    return c
+
+
+def test_profiler_01():
+    " Events, fan-out, routes and cascades "
+    c = prepare()
+    profiler = hotprofile.Profiler()
+    profiler.attach(hotmodel)
+    try:
+        for i in range(5):
+            c.p1 = i
+    finally:
+        profiler.detach()
+    c.p1 = 10
+    stats = profiler.as_dict()
+    events = dict(((i["fqname"], i["event"]), i) for i in stats["events"])
+    assert 5 == events[("p1", "reset")]["count"]
+    assert 5 == events[("p2", "reset")]["count"]
+    assert 2.0 == events[("p1", "reset")]["fan_out"]
+    routes = dict((i["label"], i) for i in stats["routes"])
+    assert 5 == routes["p1: -> cascade"]["count"]
+    assert 5 == routes["p2: -> failing"]["errors"]
+    assert [("p1", "reset", 5, 2.0, 2)] == [
+        (i["fqname"], i["event"], i["count"], i["mean_events"],
+         i["max_depth"])
+        for i in stats["cascades"]
+    ]
+    assert "p1:reset" in profiler.report()
+    assert 1 == len(profiler.as_dict(limit=1)["events"])
+
+
+def test_profiler_03(caplog):
+    " The errors are logged with their tracebacks. "
+    c = prepare()
+
+    def failing_listener(*args):
+        raise KeyError("listener")
+    c.add_listener(failing_listener)
+    profiler = hotprofile.Profiler()
+    profiler.attach(hotmodel)
+    try:
+        c.p1 = 1
+    finally:
+        profiler.detach()
+    errors = set(
+        (i.name, i.exc_info[0]) for i in caplog.records if i.exc_info
+    )
+    name = hotmodel.LOGGER.name
+    assert set([(name, ValueError), (name, KeyError)]) == errors
+    assert "failing_listener" in caplog.text
+    assert "NoneType: None" not in caplog.text
+
+
+def test_profiler_02(tmpdir, monkeypatch, capsys):
+    " The entry point runs a script "
+    script = tmpdir.join("script.py")
+    script.write(SCRIPT)
+    out = tmpdir.join("out.json")
+    monkeypatch.setattr("sys.argv", ["hotprofile"])
+    monkeypatch.setattr("sys.path", list(__import__("sys").path))
+    original = hotmodel.HotContainer.__dict__["_fire"]
+    hotprofile.main(["--json", str(out), str(script), "-x"])
+    stats = json.loads(out.read())
+    assert 10 == stats["events"][0]["count"]
+    assert "p1:reset" in capsys.readouterr().err
+    assert original is hotmodel.HotContainer.__dict__["_fire"]
+
+
+if "__main__" == __name__:
+    pytest.main()
@@ -0,0 +1,209 @@
+import os
+import pickle
+import socket
+import threading
+import time
+
+import pytest
+
+import hotjournal
+import hotreplica
+import hotundo
+from test_hotjournal import C1, CHANGES, Calling, prepare, state
+from test_hotmodel import get_event_func
+
+
+def sync(server, clients):
+    """
+        Processes the records until the clients have all the events.
+    """
+    deadline = time.time() + 10
+    for client in clients:
+        while client.seq != server.seq - 1:
+            assert time.time() < deadline
+            client.process(0.5)
+
+
+def connect(server, count):
+    clients = []
+    for i in range(count):
+        clients.append(hotreplica.ReplicationClient(C1(), server.address))
+    sync(server, clients)
+    return clients
+
+
+def test_replica_01():
+    " Many clients mirror the model and fire its events. "
+    c = prepare()
+    server = hotreplica.ReplicationServer(c, ("127.0.0.1", 0))
+    server.start()
+    try:
+        clients = connect(server, 5)
+        assert 5 == server.clients
+        assert all(state(c) == state(i.model) for i in clients)
+        l = []
+        c.add_listener(get_event_func(l))
+        mirrored = []
+        for client in clients:
+            mirrored.append([])
+            client.model.add_listener(get_event_func(mirrored[-1]))
+        for change in CHANGES:
+            change(c)
+        sync(server, clients)
+        for (client, events) in zip(clients, mirrored):
+            assert state(c) == state(client.model)
+            assert [i[:2] for i in l] == [i[:2] for i in events]
+            assert [i for i in l if "reset" != i[1]] == \
+                [i for i in events if "reset" != i[1]]
+    finally:
+        server.stop()
+
+
+def test_replica_02(tmpdir):
+    " A Unix socket, a client joining late gets the current state. "
+    path = str(tmpdir.join("replica.sock"))
+    c = prepare()
+    server = hotreplica.ReplicationServer(c, path)
+    server.start()
+    try:
+        (first, ) = connect(server, 1)
+        for change in CHANGES[:5]:
+            change(c)
+        (second, ) = connect(server, 1)
+        for change in CHANGES[5:]:
+            change(c)
+        sync(server, [first, second])
+        assert state(c) == state(first.model) == state(second.model)
+    finally:
+        server.stop()
+    assert not os.path.exists(path)
+    assert 0 == first.process(1.0)
+    assert not first.connected
+
+
+def test_replica_03():
+    " The mirror is read-only. "
+    c = prepare()
+    server = hotreplica.ReplicationServer(c, ("127.0.0.1", 0))
+    server.start()
+    try:
+        mirror = C1()
+        undo = hotundo.UndoManager(mirror)
+        client = hotreplica.ReplicationClient(mirror, server.address)
+        sync(server, [client])
+        assert undo is mirror._undo
+        for change in (
+            lambda: setattr(mirror, "p1", 2),
+            lambda: setattr(mirror, "lst", [6]),
+            lambda: mirror.lst.append(6),
+            lambda: mirror.srt.__setitem__(0, 9),
+            lambda: mirror.srt.__delitem__(0),
+            lambda: mirror.ops.append(
+                mirror.ops.type_constraint(10, None, "SMT"),
+            ),
+        ):
+            with pytest.raises(TypeError):
+                change()
+        assert state(c) == state(mirror)
+        assert [1, 2, 3] == list(mirror.srt)
+        assert 0 == mirror.srt.index_of_key(1)
+        c.p1 = 3
+        sync(server, [client])
+        assert 3 == mirror.p1
+        with pytest.raises(TypeError):
+            undo.undo()
+        assert state(c) == state(mirror)
+        client.close()
+    finally:
+        server.stop()
+
+
+def test_replica_04():
+    " The thread of start() applies the records through call_soon. "
+    c = prepare()
+    server = hotreplica.ReplicationServer(c, ("127.0.0.1", 0))
+    server.start()
+    try:
+        client = hotreplica.ReplicationClient(C1(), server.address)
+        calls = []
+
+        def call_soon(func, *args):
+            calls.append(args[0][1])
+            func(*args)
+        client.start(call_soon)
+        c.p1 = 5
+        deadline = time.time() + 10
+        while client.seq != server.seq - 1:
+            assert time.time() < deadline
+            time.sleep(0.01)
+        assert 5 == client.model.p1
+        assert [0] == calls[1:]
+    finally:
+        server.stop()
+
+
+def test_replica_05():
+    " A record calling other code is refused. "
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+
+    def serve():
+        (sock, dummy) = listener.accept()
+        sock.sendall(hotreplica.MAGIC + hotjournal.dumps_record(
+            (hotjournal.EVENT, 0, 0.0, "p1", "reset", None, Calling()),
+        ))
+        sock.close()
+    server = threading.Thread(target=serve)
+    server.start()
+    client = hotreplica.ReplicationClient(C1(), listener.getsockname())
+    server.join()
+    with pytest.raises(pickle.UnpicklingError):
+        client.process(5)
+    client.close()
+    listener.close()
+
+
+class Trickle(object):
+    """
+        A socket receiving at most size bytes at a time.
+    """
+    def __init__(self, sock, size):
+        self.sock = sock
+        self.size = size
+
+    def recv(self, size):
+        return self.sock.recv(min(size, self.size))
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+
+def test_replica_06():
+    " A snapshot received in many chunks is gathered in one buffer. "
+    c = prepare()
+    c.lst = range(5000)
+    server = hotreplica.ReplicationServer(c, ("127.0.0.1", 0))
+    server.start()
+    try:
+        client = hotreplica.ReplicationClient(C1(), server.address)
+        client._sock = Trickle(client._sock, 1024)
+        buffers = []
+        deadline = time.time() + 10
+        while client.seq != server.seq - 1:
+            assert time.time() < deadline
+            client.process(0.5)
+            buffers.append(client._buffer)
+        assert 10 < len(buffers)
+        assert all(i is client._buffer for i in buffers)
+        c.lst.append(1)
+        sync(server, [client])
+        assert state(c) == state(client.model)
+        assert 0 == len(client._buffer)
+        client.close()
+    finally:
+        server.stop()
+
+
+if "__main__" == __name__:
+    pytest.main()
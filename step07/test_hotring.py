@@ -0,0 +1,174 @@
+import multiprocessing
+import time
+
+import pytest
+
+import hotring
+from test_hotjournal import C1, CHANGES, Viewed, prepare, prepare_views, state
+from test_hotmodel import get_event_func
+
+
+pytestmark = pytest.mark.skipif(
+    hotring.shared_memory is None, reason="needs shared_memory",
+)
+
+
+@pytest.fixture
+def producer(request):
+    producers = []
+
+    def make(model, **kw):
+        producers.append(hotring.RingProducer(model, **kw))
+        return producers[-1]
+    yield make
+    for i in producers:
+        i.close()
+
+
+def test_ring_01(producer):
+    " The consumers mirror the model and fire its events. "
+    c = prepare()
+    ring = producer(c)
+    consumers = [hotring.RingConsumer(C1(), ring.name, i) for i in range(3)]
+    assert all(state(c) == state(i.model) for i in consumers)
+    l = []
+    c.add_listener(get_event_func(l))
+    mirrored = []
+    for consumer in consumers:
+        mirrored.append([])
+        consumer.model.add_listener(get_event_func(mirrored[-1]))
+    for change in CHANGES:
+        change(c)
+    assert {0: len(l), 1: len(l), 2: len(l)} == ring.lags()
+    for (consumer, events) in zip(consumers, mirrored):
+        assert len(l) == consumer.poll()
+        assert 0 == consumer.poll()
+        assert state(c) == state(consumer.model)
+        assert [i for i in l if "reset" != i[1]] == \
+            [i for i in events if "reset" != i[1]]
+        assert 0 == consumer.overruns
+    assert {0: 0, 1: 0, 2: 0} == ring.lags()
+    consumers[1].close()
+    assert [0, 2] == sorted(ring.lags())
+
+
+def test_ring_02(producer):
+    " An overrun restores the periodic snapshot. "
+    c = prepare()
+    ring = producer(c, slots=8, snapshot_every=4)
+    consumer = hotring.RingConsumer(C1(), ring.name)
+    for i in range(5):
+        c.lst.append(i)
+    assert 2 == consumer.poll(limit=2)
+    for i in range(20):
+        c.lst.append(i)
+    assert 0 == consumer.poll()
+    assert 1 == consumer.overruns
+    assert 0 < consumer.poll()
+    assert state(c) == state(consumer.model)
+    assert ring.seq == consumer.cursor
+
+
+def test_ring_03(producer):
+    " Without a usable snapshot, the consumer asks for one. "
+    c = prepare()
+    ring = producer(c, slots=8, snapshot_every=1000)
+    consumer = hotring.RingConsumer(C1(), ring.name)
+    for i in range(20):
+        c.lst.append(i)
+    assert 0 == consumer.poll()
+    assert 1 == consumer.overruns
+    assert 0 == consumer.poll()
+    c.p1 = "next"
+    assert 0 == consumer.poll()
+    assert state(c) == state(consumer.model)
+
+
+def test_ring_04(producer):
+    " An overwritten payload is an overrun. "
+    c = prepare()
+    ring = producer(c, slots=1000, arena_size=200)
+    consumer = hotring.RingConsumer(C1(), ring.name)
+    for i in range(30):
+        c.dct[i] = "payload %d" % i
+    consumer.poll()
+    assert 1 == consumer.overruns
+    # the snapshot is older than the overrun record
+    assert 0 == consumer.poll()
+    c.p1 = "next"
+    consumer.poll()
+    assert state(c) == state(consumer.model)
+
+
+def test_ring_06(producer):
+    " A payload larger than the arena is a gap, followed by a snapshot. "
+    c = prepare()
+    ring = producer(c, arena_size=200)
+    consumer = hotring.RingConsumer(C1(), ring.name)
+    c.p1 = "x" * 300
+    c.lst.append(1)
+    assert 1 == ring.gaps
+    consumer.poll()
+    assert 1 == consumer.overruns
+    consumer.poll()
+    assert state(c) == state(consumer.model)
+    assert ring.seq == consumer.cursor
+
+
+def test_ring_07(producer):
+    " A snapshot larger than its area is refused up front, skipped later. "
+    with pytest.raises(ValueError):
+        producer(prepare(), snapshot_size=100)
+    c = prepare()
+    ring = producer(c, snapshot_size=300, snapshot_every=2)
+    consumer = hotring.RingConsumer(C1(), ring.name)
+    for i in range(10):
+        c.dct[i] = "payload %d" % i
+    assert 0 < ring.skipped_snapshots
+    assert 10 == consumer.poll()
+    assert state(c) == state(consumer.model)
+
+
+def test_ring_08(producer):
+    " The views are not written, the consumer's own follow its data. "
+    c = prepare_views(prepare(Viewed))
+    ring = producer(c)
+    consumer = hotring.RingConsumer(
+        prepare_views(prepare(Viewed)), ring.name,
+    )
+    for change in CHANGES:
+        change(c)
+    c.lst.append(7)
+    consumer.poll()
+    assert state(c) == state(consumer.model)
+    assert [9, 7] == list(consumer.model.odd)
+    assert [90, 70] == list(consumer.model.tens)
+
+
+def consume(name, count, results):
+    consumer = hotring.RingConsumer(C1(), name, 1)
+    deadline = time.time() + 10
+    while consumer.cursor < count and time.time() < deadline:
+        if not consumer.poll():
+            time.sleep(0.001)
+    results.put(state(consumer.model))
+    consumer.close()
+
+
+def test_ring_05(producer):
+    " A consumer in another process "
+    c = prepare()
+    ring = producer(c)
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=consume, args=(ring.name, len(CHANGES) + 1, results),
+    )
+    process.start()
+    for change in CHANGES:
+        change(c)
+    assert state(c) == results.get(timeout=10)
+    process.join(10)
+
+
+if "__main__" == __name__:
+    pytest.main()
@@ -0,0 +1,153 @@
+import datetime
+
+import pytest
+
+import hotmodel
+import hotpersist
+import hotstore
+import production
+from test_hotmodel import get_event_func
+
+
+class ByValue(hotmodel.SortedHotList):
+    pass
+
+
+class C1(hotmodel.HotContainer):
+    p1 = hotmodel.HotProperty()
+    p2 = hotmodel.HotProperty()
+    lst = hotmodel.HotTypedProperty(hotmodel.HotList)
+    dct = hotmodel.HotTypedProperty(hotmodel.HotDict)
+    tags = hotmodel.HotTypedProperty(hotmodel.HotSet)
+    srt = hotmodel.HotTypedProperty(ByValue)
+    ops = hotmodel.HotTypedProperty(production.OperationsList)
+    pers = hotmodel.HotTypedProperty(hotpersist.PersistentHotDict)
+
+
+def prepare(clazz=C1):
+    c = clazz()
+    c.p1 = datetime.datetime(2015, 1, 2)
+    c.p2 = None
+    c.lst = [1, -2, 2 ** 40]
+    c.dct = [("a", 1.5), (2, (3, u"ž"))]
+    c.tags = ["x", "y"]
+    c.srt = [3, 1, 2]
+    c.ops = [
+        production.ProductOperation(
+            i * 10, datetime.datetime(2015, 1, 2, 3, i, 5, 123), u"WP%d" % i,
+        )
+        for i in range(50)
+    ]
+    c.pers = [("k", 1)]
+    return c
+
+
+def state(c):
+    return (
+        c.p1, c.p2, list(c.lst), dict(c.dct.items()), set(c.tags),
+        list(c.srt), list(c.ops), dict(c.pers.items()),
+    )
+
+
+def test_hotstore_01(tmpdir):
+    " A saved model is loaded back, lazily, firing a reset per property. "
+    path = str(tmpdir.join("s"))
+    c = prepare()
+    hotstore.save(c, path)
+    l = []
+    c2 = C1()
+    c2.add_listener(get_event_func(l))
+    hotstore.load(path, c2)
+    assert state(c) == state(c2)
+    assert isinstance(c2.ops.data, hotstore.LazyRows)
+    assert isinstance(c2.dct.data, hotstore.LazyMapping)
+    assert [("p1", "reset", None), ("p2", "reset", None)] == l[:2]
+    assert 8 == len(l)
+    assert [c.ops[3]] == c2.ops.find_by("operation", 30)
+    assert c.ops[-1] == c2.ops[-1]
+    assert c.ops[2:5] == c2.ops.snapshot()[2:5]
+    assert 2 == c2.lst.data.index(2 ** 40)
+
+
+def test_hotstore_02(tmpdir):
+    " The loaded data are copied on the first change. "
+    path = str(tmpdir.join("s"))
+    hotstore.save(prepare(), path)
+    c = C1()
+    hotstore.load(path, c)
+    snap = c.lst.snapshot()
+    c.lst.append(4)
+    c.dct["b"] = 2
+    c.srt.add(0)
+    c.pers["m"] = 2
+    assert type(c.lst.data) is list
+    assert type(c.dct.data) is dict
+    assert [1, -2, 2 ** 40] == list(snap)
+    assert [1, -2, 2 ** 40, 4] == list(c.lst)
+    assert 2 == c.dct["b"]
+    assert [0, 1, 2, 3] == list(c.srt)
+    assert {"k": 1, "m": 2} == dict(c.pers.version().items())
+
+
+def test_hotstore_03(tmpdir):
+    " Empty containees, mismatching fields and bad files "
+    path = str(tmpdir.join("s"))
+    c = C1()
+    c.lst = []
+    c.dct = []
+    c.tags = []
+    c.srt = []
+    c.ops = []
+    c.pers = []
+    hotstore.save(c, path)
+    c2 = C1()
+    hotstore.load(path, c2)
+    assert state(c) == state(c2)
+
+    class C2(C1):
+        ops = hotmodel.HotTypedProperty(production.ProcessList)
+    with pytest.raises(ValueError):
+        hotstore.load(path, C2())
+    with pytest.raises(ValueError):
+        hotstore.load(__file__, C1())
+
+
+class Viewed(C1):
+    odd = hotmodel.HotProperty()
+    tens = hotmodel.HotProperty()
+
+
+def prepare_views(c):
+    c.odd = c.lst.filtered(lambda i: i % 2)
+    c.tens = c.odd.mapped(lambda i: i * 10)
+    return c
+
+
+def test_hotstore_04(tmpdir):
+    " The indexes are built on use, the live views follow the loaded data. "
+    path = str(tmpdir.join("s"))
+    hotstore.save(prepare_views(prepare(Viewed)), path)
+    c = Viewed()
+    c.lst = [1, 3, 4]
+    c.ops = []
+    c.srt = []
+    prepare_views(c)
+    l = []
+    c.add_listener(get_event_func(l))
+    hotstore.load(path, c)
+    assert c.ops._hash_index is None
+    assert c.srt._keys is None
+    assert ("odd", "reset", None) in l
+    assert ("tens", "reset", None) in l
+    assert [1] == c.odd.data
+    assert [10] == c.tens.data
+    c.lst.append(7)
+    assert [10, 70] == c.tens.data
+    assert [prepare().ops[3]] == c.ops.find_by("operation", 30)
+    assert 0 == c.srt.index_of_key(1)
+    c.srt.add(0)
+    assert [0, 1, 2, 3] == list(c.srt)
+
+
+if "__main__" == __name__:
+    pytest.main()
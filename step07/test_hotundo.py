@@ -0,0 +1,183 @@
+import pytest
+
+import hotundo
+import test_hotjournal
+from test_hotjournal import Viewed, state
+from test_hotmodel import get_event_func
+
+
+def prepare(max_bytes=1024 * 1024):
+    c = test_hotjournal.prepare()
+    return (c, hotundo.UndoManager(c, max_bytes))
+
+
+CHANGES = [
+    lambda c: setattr(c, "p1", "new"),
+    lambda c: setattr(c, "lst", [9]),
+    lambda c: c.lst.append(6),
+    lambda c: c.lst.insert(1, 7),
+    lambda c: c.lst.__setitem__(2, 8),
+    lambda c: c.lst.__delitem__(-1),
+    lambda c: c.lst.__setitem__(slice(1, 3), [10, 11, 12]),
+    lambda c: c.lst.__setitem__(slice(0, 4, 2), [13, 14]),
+    lambda c: c.lst.__delitem__(slice(1, 4)),
+    lambda c: c.lst.__delitem__(slice(None, None, -2)),
+    lambda c: c.lst.move(0, 3),
+    lambda c: c.lst.sort(key=lambda i: -i),
+    lambda c: c.lst.reverse(),
+    lambda c: c.dct.__setitem__("a", 2),
+    lambda c: c.dct.__setitem__("b", 3),
+    lambda c: c.dct.__delitem__("a"),
+    lambda c: c.dct.clear(),
+    lambda c: c.tags.add("y"),
+    lambda c: c.tags.discard("x"),
+    lambda c: c.tags.update(["x", "z"]),
+    lambda c: c.tags.symmetric_difference_update(["x", "w"]),
+    lambda c: c.tags.clear(),
+    lambda c: c.srt.add(0),
+    lambda c: c.srt.__setitem__(0, 5),
+    lambda c: c.srt.__delitem__(1),
+    lambda c: c.srt.__delitem__(slice(0, 2)),
+]
+
+
+@pytest.mark.parametrize("change", CHANGES)
+def test_undo_redo_01(change):
+    " Each change can be undone and redone. "
+    (c, undo) = prepare()
+    before = state(c)
+    change(c)
+    after = state(c)
+    assert before != after
+    assert 1 == undo.undo_count
+    undo.undo()
+    assert before == state(c)
+    assert (0, 1) == (undo.undo_count, undo.redo_count)
+    undo.redo()
+    assert after == state(c)
+    assert (1, 0) == (undo.undo_count, undo.redo_count)
+
+
+def test_transaction_01():
+    " A transaction is undone at once, all the changes fire. "
+    (c, undo) = prepare()
+    before = state(c)
+    with undo.transaction("all") as transaction:
+        for change in CHANGES:
+            change(c)
+            if not len(c.lst):
+                c.lst.extend([1, 2, 3, 4])
+        with undo.transaction("inner"):
+            c.p1 = 2
+    after = state(c)
+    assert "all" == transaction.label
+    assert 1 == undo.undo_count
+    l = []
+    c.add_listener(get_event_func(l))
+    assert "all" == undo.undo()
+    assert before == state(c)
+    assert ("p1", "reset", None) == l[0]
+    assert "all" == undo.redo()
+    assert after == state(c)
+    with pytest.raises(IndexError):
+        undo.redo()
+
+
+def test_redo_cleared():
+    " A new change forgets the redo history. "
+    (c, undo) = prepare()
+    c.lst.append(1)
+    c.lst.append(2)
+    undo.undo()
+    assert 1 == undo.redo_count
+    c.lst.append(3)
+    assert (2, 0) == (undo.undo_count, undo.redo_count)
+    undo.undo()
+    undo.undo()
+    assert [1, 2, 3, 4, 5] == list(c.lst)
+    with pytest.raises(IndexError):
+        undo.undo()
+
+
+def test_rejected_01():
+    " A change refused by the validation is not recorded. "
+    (c, undo) = prepare()
+    c.lst.append(1)
+    undo.undo()
+    for change in (
+        lambda: c.lst.append([]),
+        lambda: c.lst.insert(0, {}),
+        lambda: c.lst.__setitem__(0, []),
+        lambda: c.tags.add(frozenset([()]) | frozenset([object()])),
+        lambda: setattr(c, "p1", []),
+    ):
+        with pytest.raises(TypeError):
+            change()
+    assert (0, 1) == (undo.undo_count, undo.redo_count)
+    assert 5 == len(c.lst)
+
+
+def test_derived_01():
+    " Reordering a source with views is one step, undone with the views. "
+    c = test_hotjournal.prepare(Viewed)
+    c.odd = c.lst.filtered(lambda i: i % 2)
+    c.tens = c.lst.mapped(lambda i: i * 10)
+    undo = hotundo.UndoManager(c)
+    c.lst.sort(key=lambda i: -i)
+    c.lst.reverse()
+    assert 2 == undo.undo_count
+    undo.undo()
+    undo.undo()
+    assert [1, 2, 3, 4, 5] == list(c.lst)
+    assert [1, 3, 5] == list(c.odd)
+    assert [10, 20, 30, 40, 50] == list(c.tens)
+
+
+def test_memory_bound():
+    " The history is limited by bytes, not by steps. "
+    (c, undo) = prepare(max_bytes=2000)
+    for i in range(100):
+        c.lst[0] = i
+    assert 5 < undo.undo_count < 100
+    assert undo.size <= 2000
+    c.lst[:] = list(range(10000))
+    assert 5 < undo.undo_count
+    del c.lst[:]
+    assert 1 == undo.undo_count
+    undo.undo()
+    assert list(range(10000)) == list(c.lst)
+
+
+def test_memory_bound_02():
+    " A replaced containee is counted with its data. "
+    (c, undo) = prepare(max_bytes=1024 * 1024)
+    for i in range(20):
+        c.lst = list(range(i, i + 10000))
+    assert undo.undo_count < 5
+    assert 1024 * 1024 / 2 < undo.size <= 1024 * 1024
+    undo.undo()
+    assert list(range(18, 10018)) == list(c.lst)
+
+
+def test_counts_fire():
+    (c, undo) = prepare()
+    l = []
+    undo.add_listener(get_event_func(l))
+    c.p1 = 5
+    undo.undo()
+    assert l == [
+        ("undo_count", "reset", None),
+        ("undo_count", "reset", None),
+        ("redo_count", "reset", None),
+    ]
+
+
+def test_detach():
+    (c, undo) = prepare()
+    undo.detach()
+    c.p1 = 5
+    assert 0 == undo.undo_count
+
+
+if "__main__" == __name__:
+    pytest.main()
@@ -0,0 +1,82 @@
+import os
+import subprocess
+import sys
+import types
+
+import pytest
+
+import hotmodel
+import hotwidgets
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class ListView(object):
+    """
+        Stands for wx.ListView.
+    """
+    def __init__(self, parent, id, style=0):
+        self.calls = [("init", parent, id, style)]
+
+    def InsertColumn(self, idx, name):
+        self.calls.append(("column", idx, name))
+
+
+@pytest.fixture
+def fake_wx(monkeypatch):
+    module = types.ModuleType("wx")
+    module.ListView = ListView
+    module.LC_SINGLE_SEL = 0x20
+    monkeypatch.setitem(sys.modules, "wx", module)
+    monkeypatch.setattr(hotwidgets, "wx", None)
+    for cls in (hotwidgets.MVCList, hotwidgets.MVCDict, hotwidgets.MVCSet):
+        if "_wx_class" in cls.__dict__:
+            monkeypatch.delattr(cls, "_wx_class")
+    return module
+
+
+def test_import_side_effects():
+    output = subprocess.check_output(
+        [
+            sys.executable, "-c",
+            "import logging, sys; import hotmodel, hotwidgets; "
+            "print(len(logging.getLogger('hotlist').handlers), "
+            "'wx' in sys.modules)",
+        ],
+        cwd=HERE,
+    )
+    assert "0 False" == output.decode("ascii").strip()
+
+
+def test_log_to_stderr():
+    handler = hotmodel.log_to_stderr()
+    try:
+        assert handler in hotmodel.LOGGER.handlers
+    finally:
+        hotmodel.LOGGER.removeHandler(handler)
+        hotmodel.LOGGER.setLevel(0)
+
+
+def test_lazy_widget(fake_wx):
+    class View(hotwidgets.MVCList):
+        pass
+
+    view = View("parent", 5, 1, [("a", "A"), ("b", "B")])
+    assert fake_wx is hotwidgets.wx
+    assert isinstance(view, View)
+    assert isinstance(view, ListView)
+    assert not issubclass(View, ListView)
+    assert [
+        ("init", "parent", 5, 0x21), ("column", 0, "A"), ("column", 1, "B"),
+    ] == view.calls
+    assert {"a": 0, "b": 1} == view.column_mapping
+    # the wx class is created once per widget class
+    assert type(view) is type(View("parent", 6, 0, []))
+    assert type(view) is not type(hotwidgets.MVCList("parent", 7, 0, []))
+    # an instance of the wx class creates no other subclass
+    assert type(view) is type(type(view)("parent", 8, 0, []))
+
+
+if "__main__" == __name__:
+    pytest.main()
@@ -0,0 +1,426 @@
+import datetime
+import threading
+import time
+
+import pytest
+
+import production
+from test_hotmodel import get_event_func
+
+
+def op(operation):
+    return production.ProductOperation(
+        operation, datetime.datetime(2015, 1, 2), 100,
+    )
+
+
+def prepare():
+    model = production.ProductModel(production.Server(op_done_rate=-1))
+    model.set_product("AAAQA1", 1)
+    model.operations = [op(10), op(10), op(30)]
+    join = production.ProcessDoneJoin(model)
+    l = []
+    join.add_listener(get_event_func(l))
+    return (model, join, l)
+
+
+def expected_done(model):
+    done = set(i.operation for i in model.operations)
+    return [1 if i.operation in done else 0 for i in model.process]
+
+
+def test_join_01():
+    " Only the flipped rows fire. "
+    (model, join, l) = prepare()
+    assert [0, 1, 0, 1, 0, 0] == list(join.done)
+    assert {10: 2, 30: 1} == join.done_counts
+    model.operations.append(op(20))
+    model.operations.append(op(20))
+    del model.operations[0]
+    del model.operations[0]
+    model.operations[0] = op(40)
+    assert expected_done(model) == list(join.done)
+    assert l == [
+        ("done", "update", 2),
+        ("done", "update", 1),
+        ("done", "update", 3),
+        ("done", "update", 4),
+    ]
+
+
+def test_join_02():
+    " The done list follows the process list. "
+    (model, join, l) = prepare()
+    model.process.move(1, 4)
+    model.process.insert(0, production.ProcessOperation(30, "X"))
+    del model.process[2]
+    model.process.reverse()
+    model.process[0] = production.ProcessOperation(10, "Y")
+    assert expected_done(model) == list(join.done)
+    assert [i[1] for i in l] == [
+        "move", "insert", "delete", "permute", "update",
+    ]
+    model.operations.sort(key=lambda i: -i.operation)
+    model.operations.append(op(50))
+    assert expected_done(model) == list(join.done)
+
+
+def test_join_03():
+    " A new product resets the process and updates the flipped rows. "
+    (model, join, l) = prepare()
+    model.set_product("AAAQA2", 2)
+    assert [0, 0, 0, 0, 0, 0] == list(join.done)
+    # the process is reset first, then the operations done before go away
+    assert l == [
+        ("done", "reset", None),
+        ("done", "update", 1),
+        ("done", "update", 3),
+    ]
+
+
+class FakeClock(object):
+    """
+        The time, which only the calls of a server move on.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        with self._lock:
+            self.now += seconds
+
+
+class CountingServer(production.Server):
+    """
+        Counts the calls, each takes a second of the clock, if given.
+    """
+    def __init__(self, clock=None):
+        super(CountingServer, self).__init__(op_done_rate=-1)
+        self.clock = clock
+        self.calls = []
+
+    def _spend(self):
+        if self.clock is not None:
+            self.clock.advance(1.0)
+
+    def get_process(self, article, serial_num):
+        self.calls.append(("process", article))
+        self._spend()
+        return super(CountingServer, self).get_process(article, serial_num)
+
+    def get_products_ops(self, products):
+        self.calls.append(("ops", tuple(products)))
+        self._spend()
+        return [
+            [op(serial_num)] for (article, serial_num) in products
+        ]
+
+    def get_product_ops(self, article, serial_num):
+        return self.get_products_ops([(article, serial_num)])[0]
+
+
+def in_threads(func, args_list):
+    results = [None] * len(args_list)
+
+    def run(i):
+        results[i] = func(*args_list[i])
+    threads = [
+        threading.Thread(target=run, args=(i, ))
+        for i in range(len(args_list))
+    ]
+    for i in threads:
+        i.start()
+    for i in threads:
+        i.join()
+    return results
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.001)
+    return predicate()
+
+
+class GatedServer(CountingServer):
+    """
+        The calls wait for the gate, the ops calls record their threads.
+    """
+    def __init__(self):
+        super(GatedServer, self).__init__()
+        self.started = threading.Event()
+        self.gate = threading.Event()
+        self.threads = []
+
+    def get_process(self, article, serial_num):
+        self.started.set()
+        self.gate.wait(10)
+        return super(GatedServer, self).get_process(article, serial_num)
+
+    def get_products_ops(self, products):
+        self.threads.append(threading.current_thread())
+        self.started.set()
+        self.gate.wait(10)
+        return super(GatedServer, self).get_products_ops(products)
+
+
+def test_client_01():
+    " The processes are cached by the article class. "
+    server = CountingServer()
+    client = production.ServerClient(server)
+    process = client.get_process("AAAQA1", 1)
+    assert process == server.get_process("AAAQA1", 1)
+    assert process == client.get_process("AAAQA3", 2)
+    client.get_process("AAAQA4", 3)
+    assert [("process", "AAAQA1"), ("process", "AAAQA1"),
+            ("process", "AAAQA4")] == server.calls
+    assert 1 == client.stats["process_hits"]
+    client.invalidate()
+    client.get_process("AAAQA1", 1)
+    assert 4 == len(server.calls)
+
+
+def start_gated(server, func, args_list):
+    """
+        Starts a thread calling func for each args, the others after the
+        first has reached the server.
+    """
+    threads = [threading.Thread(target=func, args=i) for i in args_list]
+    threads[0].start()
+    assert server.started.wait(10)
+    for i in threads[1:]:
+        i.start()
+    return threads
+
+
+def finish_gated(server, threads):
+    server.gate.set()
+    for i in threads:
+        i.join(10)
+
+
+def test_client_02():
+    " The concurrent requests share the calls, the ops are batched. "
+    server = GatedServer()
+    client = production.ServerClient(server)
+    threads = start_gated(
+        server, client.get_process, [("AAAQA1", i) for i in range(5)],
+    )
+    assert wait_for(lambda: 4 == client.stats["coalesced"])
+    finish_gated(server, threads)
+    assert [("process", "AAAQA1")] == server.calls
+    server = GatedServer()
+    client = production.ServerClient(server)
+    results = {}
+
+    def get(*key):
+        results.setdefault(key, []).append(client.get_product_ops(*key))
+    threads = start_gated(server, get, [
+        ("AAAQA1", 1), ("AAAQA1", 2), ("AAAQA1", 1), ("AAAQA1", 3),
+    ])
+    assert wait_for(lambda: 2 == len(client._batch))
+    assert wait_for(lambda: 1 == client.stats["coalesced"])
+    finish_gated(server, threads)
+    assert {
+        ("AAAQA1", 1): [[op(1)], [op(1)]],
+        ("AAAQA1", 2): [[op(2)]],
+        ("AAAQA1", 3): [[op(3)]],
+    } == results
+    assert ("ops", (("AAAQA1", 1), )) == server.calls[0]
+    assert [("AAAQA1", 2), ("AAAQA1", 3)] == sorted(server.calls[1][1])
+    assert 2 == len(server.calls)
+
+
+class MeetingServer(CountingServer):
+    """
+        The process and the ops calls wait for each other, so they succeed
+        only if made concurrently.
+    """
+    def __init__(self):
+        super(MeetingServer, self).__init__()
+        self.process_started = threading.Event()
+        self.ops_started = threading.Event()
+        self.met = []
+
+    def get_process(self, article, serial_num):
+        self.process_started.set()
+        self.met.append(self.ops_started.wait(10))
+        return super(MeetingServer, self).get_process(article, serial_num)
+
+    def get_products_ops(self, products):
+        self.ops_started.set()
+        self.met.append(self.process_started.wait(10))
+        return super(MeetingServer, self).get_products_ops(products)
+
+
+def test_client_03():
+    " The model gets the process and the operations concurrently. "
+    server = MeetingServer()
+    client = production.ServerClient(server)
+    try:
+        model = production.ProductModel(client)
+        model.set_product("AAAQA1", 7)
+        assert [True, True] == server.met
+        assert [op(7)] == list(model.operations)
+        assert server.get_process("AAAQA1", 7) == list(model.process)
+    finally:
+        client.close()
+
+
+def test_client_04():
+    " A batch is sent at once, the requests made meanwhile are the next. "
+    server = GatedServer()
+    client = production.ServerClient(server)
+    threads = start_gated(
+        server, client.get_product_ops, [("AAAQA1", i) for i in (1, 2, 3)],
+    )
+    assert wait_for(lambda: 2 == len(client._batch))
+    finish_gated(server, threads)
+    assert ("ops", (("AAAQA1", 1), )) == server.calls[0]
+    assert [("AAAQA1", 2), ("AAAQA1", 3)] == sorted(server.calls[1][1])
+    assert 2 == len(server.calls)
+    assert 2 == client.stats["ops_calls"]
+
+
+def test_client_05():
+    " The requests without a result fail, none is left waiting. "
+    server = GatedServer()
+    get_products_ops = server.get_products_ops
+    server.get_products_ops = lambda products: get_products_ops(products)[:1]
+    client = production.ServerClient(server)
+    results = {}
+
+    def get(serial_num):
+        try:
+            results[serial_num] = client.get_product_ops("AAAQA1", serial_num)
+        except LookupError as e:
+            results[serial_num] = e
+    threads = start_gated(server, get, [(1, ), (2, ), (3, )])
+    assert wait_for(lambda: 2 == len(client._batch))
+    finish_gated(server, threads)
+    assert [op(1)] == results[1]
+    assert [LookupError, list] == sorted(
+        (type(results[i]) for i in (2, 3)), key=lambda i: i.__name__,
+    )
+    server.get_products_ops = lambda products: []
+    with pytest.raises(LookupError):
+        client.get_product_ops("AAAQA1", 4)
+
+
+def test_client_06():
+    " get_product fetches the operations on the client's workers. "
+    server = GatedServer()
+    server.gate.set()
+    client = production.ServerClient(server, workers=1)
+    try:
+        for i in range(3):
+            assert [op(i)] == client.get_product("AAAQA1", i)[1]
+        assert client._workers * 3 == server.threads
+    finally:
+        client.close()
+
+
+def ops_keys(calls):
+    " The products whose operations the calls asked for. "
+    return set(key for i in calls if "ops" == i[0] for key in i[1])
+
+
+def test_prefetch_01():
+    " The next product is prefetched, its set_product calls no server. "
+    clock = FakeClock()
+    server = CountingServer(clock)
+    model = production.ProductModel(production.ServerClient(server))
+    # one worker, so that a prefetch is timed alone
+    prefetcher = model.enable_prefetch(depth=2, workers=1, clock=clock)
+    try:
+        model.set_product("AAAQA1", 7)
+        prefetcher.join()
+        assert set([("AAAQA1", 7), ("AAAQA1", 8), ("AAAQA1", 9)]) \
+            == ops_keys(server.calls)
+        calls = len(server.calls)
+        model.set_product("AAAQA1", 8)
+        assert [op(8)] == list(model.operations)
+        prefetcher.join()
+        # only the product 10 is new, the process is cached
+        assert set([("AAAQA1", 10)]) == ops_keys(server.calls[calls:])
+        assert all("ops" == i[0] for i in server.calls[calls:])
+        # the miss made the process and the ops calls, the hit
+        # saved the ops call of its prefetch
+        assert {
+            "requests": 2,
+            "hits": 1,
+            "hit_rate": 0.5,
+            "saved_seconds": 1.0,
+            "mean_miss_seconds": 2.0,
+        } == prefetcher.stats()
+    finally:
+        prefetcher.close()
+
+
+def test_prefetch_02():
+    " The cache is bounded, the results expire. "
+    now = [0.0]
+    server = CountingServer()
+    prefetcher = production.Prefetcher(
+        server, depth=3, cache_size=2, max_age=10, clock=lambda: now[0],
+    )
+    try:
+        prefetcher.get_product("AAAQA1", 1)
+        prefetcher.join()
+        assert [("AAAQA1", 3), ("AAAQA1", 4)] == list(prefetcher._cache)
+        calls = len(server.calls)
+        prefetcher.get_product("AAAQA1", 4)
+        prefetcher.join()
+        # the prefetches of 5, 6, 7 only
+        assert set([("AAAQA1", 5), ("AAAQA1", 6), ("AAAQA1", 7)]) \
+            == ops_keys(server.calls[calls:])
+        assert [("AAAQA1", 6), ("AAAQA1", 7)] == list(prefetcher._cache)
+        # 7 has expired, 5 was dropped from the cache
+        now[0] = 11.0
+        calls = len(server.calls)
+        for i in (7, 5):
+            prefetcher.get_product("AAAQA1", i)
+        prefetcher.join()
+        assert set([("AAAQA1", i) for i in (5, 6, 7, 8, 9, 10)]) \
+            == ops_keys(server.calls[calls:])
+        assert 1 == prefetcher.stats()["hits"]
+    finally:
+        prefetcher.close()
+
+
+def test_prefetch_03():
+    " A failed prefetch is a miss, unpredictable products are not. "
+    server = CountingServer()
+    failing = set([1])
+
+    def get_products_ops(products):
+        if failing.intersection(i[1] for i in products):
+            raise IOError("down")
+        return CountingServer.get_products_ops(server, products)
+    server.get_products_ops = get_products_ops
+    prefetcher = production.Prefetcher(
+        production.ServerClient(server, window=0),
+    )
+    try:
+        with pytest.raises(IOError):
+            prefetcher.get_product("AAAQA1", 1)
+        prefetcher.get_product("AAAQA1", "X1")
+        prefetcher.join()
+        assert [] == list(prefetcher._cache)
+        failing.add(3)
+        prefetcher.get_product("AAAQA1", 2)
+        prefetcher.join()
+        failing.remove(3)
+        (process, ops) = prefetcher.get_product("AAAQA1", 3)
+        assert [op(3)] == ops
+        assert 0 == prefetcher.stats()["hits"]
+    finally:
+        prefetcher.close()
+
+
+if "__main__" == __name__:
+    pytest.main()
@@ -130,6 +130,7 @@ class ProductionView(wx.Frame):
 
 
 if "__main__" == __name__:
+    hotmodel.log_to_stderr()
     MODEL = production.ProductModel(production.Server())
     APP = wx.App(redirect=False)
     FRAME = ProductionView(None, APP, "Sample Frame", MODEL)
@@ -31,17 +31,33 @@ class ProcView(hotwidgets.MVCList):
     def indicate_operation_status(self, row, status):
         self.SetStringItem(row, 2, "YES" if status else "NO",)
 
+    def add_done_routes(self, mapper):
+        """
+            Map the events of a production.ProcessDoneJoin's done list to
+            the "Done" column. The rows are reordered (permuted) with the
+            process, the deleted ones need no update.
+        """
+        mapper.add_route("done", "reset", self.update_indication)
+        mapper.add_route("done", "update", self.update_row_indication)
+        mapper.add_route("done", "insert", self.update_row_indication)
+        mapper.add_route("done", "move", self.update_row_indication)
+
     def update_indication(self, model, fqname, event_name, key):
         """
             Marks those operations that have been done as done and those that
             have not been done as not done.
         """
-        done_ops = set([i.operation for i in self.model.operations])
-        for (i, op) in enumerate(self.model.process):
-            self.indicate_operation_status(
-                i,
-                op.operation in done_ops,
-            )
+        for (i, status) in enumerate(model):
+            self.indicate_operation_status(i, status)
+
+    def update_row_indication(self, model, fqname, event_name, key):
+        """
+            Marks the row (the destination one for a move) as done or not
+            done.
+        """
+        if "move" == event_name:
+            key = key[1]
+        self.indicate_operation_status(key, model[key])
 
 
 class ProductionView(wx.Frame):
@@ -76,21 +92,17 @@ class ProductionView(wx.Frame):
         self.model = model
         self.mapper = hotmodel.Mapper()
         self.proc_view.add_routes(self.mapper, "process")
-        self.mapper.add_route(
-            "process",
-            "",
-            self.proc_view.update_indication,
-        )
-        self.mapper.add_route(
-            "operations",
-            "",
-            self.proc_view.update_indication,
-        )
 
         self.mapper.add_route("sn", "", self.on_product,)
         self.mapper.add_route("article", "", self.on_product,)
         self.model.add_listener(self.mapper)
 
+        # after the mapper, so that the process rows exist when it fires
+        self.join = production.ProcessDoneJoin(self.model)
+        self.join_mapper = hotmodel.Mapper()
+        self.proc_view.add_done_routes(self.join_mapper)
+        self.join.add_listener(self.join_mapper)
+
         wx.CallAfter(lambda: self.model.set_product("FIRST8", 1))
 
     def on_product(self, model, fqname, event_name, key):
@@ -121,6 +133,7 @@ class ProductionView(wx.Frame):
 
 
 if "__main__" == __name__:
+    hotmodel.log_to_stderr()
     MODEL = production.ProductModel(production.Server(op_done_rate=10))
     APP = wx.App(redirect=False)
     FRAME = ProductionView(None, APP, "Sample Frame", MODEL)